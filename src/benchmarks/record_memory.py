@@ -0,0 +1,74 @@
+"""
+Memory held per email record: plain dicts as parsed from the processors'
+JSON output, against EmailRecord with interned senders and integer dates,
+with and without compacted bodies.
+
+    python src/benchmarks/record_memory.py --emails 100000 --duplicate-ratio 0.9 --body-length 2000
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import tracemalloc
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(benchmarks_dir))
+
+from synthetic_mailbox import generate_records
+from email_record import EmailRecord
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def retained_bytes(lines, build):
+    """Bytes still allocated after building one object per JSON line and keeping them all"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [build(json.loads(line)) for line in lines]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return after - before
+
+def measure(emails, duplicate_ratio=0.9, body_length=2000, seed=0):
+    """Per-record bytes of each representation, and the reduction against dicts"""
+    # Serialized first, so every representation starts from freshly parsed strings like the deduplicator does
+    lines = [json.dumps(record, ensure_ascii=False)
+             for record in generate_records(emails, duplicate_ratio, body_length, seed)]
+    variants = {
+        "dict": lambda email: email,
+        "record": EmailRecord.from_dict,
+        "compact_record": lambda email: EmailRecord.from_dict(email).compact()
+    }
+    result = {}
+    for name, build in variants.items():
+        result[name] = round(retained_bytes(lines, build) / emails)
+    for name in ("record", "compact_record"):
+        result[f"{name}_reduction"] = round(1 - result[name] / result["dict"], 3)
+    return result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the memory held per email record")
+    parser.add_argument("--emails", type=int, default=100000, help="Synthetic emails to hold")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.9,
+                        help="Share of emails from an already seen sender")
+    parser.add_argument("--body-length", type=int, default=2000, help="Approximate body length in chars")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = measure(args.emails, args.duplicate_ratio, args.body_length, args.seed)
+    logger.info(f"{args.emails} emails, bodies of about {args.body_length} chars, bytes per record:")
+    logger.info(f"  dict            {result['dict']:>8}")
+    logger.info(f"  EmailRecord     {result['record']:>8}  {result['record_reduction']:.0%} less")
+    logger.info(f"  compacted       {result['compact_record']:>8}  {result['compact_record_reduction']:.0%} less")
+    print(json.dumps(result))
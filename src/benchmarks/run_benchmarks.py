@@ -0,0 +1,270 @@
+"""
+Offline benchmark suite for the email processing stages.
+
+Each repetition runs sorting, PST/MSG parsing, deduplication, signature
+reduction, contact extraction and CSV export over a synthetic mailbox in a
+scratch directory, with contact extraction served by the local fake Ollama
+server. Per-stage medians are appended to a JSONL history and compared with
+the last run that used the same options.
+
+    python src/benchmarks/run_benchmarks.py --pst-emails 50000 --duplicate-ratio 0.9 --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(benchmarks_dir)
+sys.path.append(src_dir)
+sys.path.append(os.path.join(src_dir, 'contacts-extractor'))
+
+from synthetic_mailbox import generate_records, build_pst_tree, SyntheticMsg, write_mailbox_files
+from run_metrics import RunMetrics
+from jsonl_stream import JsonlShardWriter
+from pipeline import load_processor
+from file_sorter import sort_files
+from email_deduplicator import process_deduplication
+from signature_extractor import process_signature_extraction
+from contact_extractor import process_contact_extraction
+from csv_converter import convert_contacts_to_csv, create_detailed_csv
+from fake_ollama_server import start_fake_ollama
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+RESULTS_FILE = Path(benchmarks_dir) / "results" / "benchmark_history.jsonl"
+
+# Stage slowdowns below this many seconds are treated as noise
+NOISE_FLOOR_SECONDS = 0.05
+
+# Options that must match for two runs to be compared
+WORKLOAD_OPTIONS = ("pst_emails", "msg_emails", "duplicate_ratio", "body_length", "files", "llm_latency",
+                    "eval_latency", "max_in_flight", "batch_size", "rules", "seed")
+
+@contextmanager
+def scratch_directory():
+    """Run in an empty directory, as the stages read and write relative src/ paths"""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="email_benchmark_") as directory:
+        os.chdir(directory)
+        try:
+            yield Path(directory)
+        finally:
+            os.chdir(previous)
+
+def load_processors():
+    """PST and MSG processor modules, None where pypff or extract_msg is not installed"""
+    processors = {}
+    for source, folder, filename in (("pst", 'pst-processor', 'pst.processor.py'),
+                                     ("msg", 'msg-processor', 'msg.processor.py')):
+        try:
+            processors[source] = load_processor(folder, filename, f"{source}_processor")
+        except ImportError as e:
+            logger.warning(f"{source.upper()} parsing is not benchmarked: {str(e)}")
+            processors[source] = None
+    return processors
+
+def parse_records(source, records, processor, metrics):
+    """Write the records as processor output, timing the processor's message extraction if available"""
+    output_dir = Path(f"src/{source}-processor/output")
+    with JsonlShardWriter(output_dir, f"{source}_emails") as writer:
+        if processor is None:
+            for record in records:
+                writer.write(record)
+            return
+
+        # Build the stand-in messages outside of the measured stage
+        on_email = metrics.counting(source, writer.write)
+        if source == "pst":
+            root = build_pst_tree(records)
+            with metrics.stage(source):
+                for folder, _, folder_name in processor.iter_pst_folders(root):
+                    for _, email_data in processor.iter_folder_messages(folder, folder_name):
+                        on_email(email_data)
+        else:
+            messages = [SyntheticMsg(record) for record in records]
+            with metrics.stage(source):
+                for message in messages:
+                    email_data = processor.extract_message(message)
+                    if email_data:
+                        on_email(email_data)
+
+def run_once(options, processors, server):
+    """One pass over every stage in a scratch directory; returns the run report"""
+    metrics = RunMetrics()
+    records = {
+        "pst": list(generate_records(options.pst_emails, options.duplicate_ratio, options.body_length,
+                                     options.seed, "pst")),
+        "msg": list(generate_records(options.msg_emails, options.duplicate_ratio, options.body_length,
+                                     options.seed, "msg"))
+    }
+
+    with scratch_directory():
+        write_mailbox_files(Path("src/input/unsorted"), options.files, max(1, options.files // 100))
+        with metrics.stage("sort"):
+            sort_files()
+
+        for source in ("pst", "msg"):
+            parse_records(source, records[source], processors[source], metrics)
+
+        with metrics.stage("dedup"):
+            process_deduplication(metrics=metrics)
+        with metrics.stage("signatures"):
+            process_signature_extraction()
+        with metrics.stage("extraction"):
+            process_contact_extraction(base_url=server.url, max_in_flight=options.max_in_flight,
+                                       cache_mode="off", batch_size=options.batch_size,
+                                       rules=options.rules, metrics=metrics)
+        with metrics.stage("csv"):
+            convert_contacts_to_csv()
+            create_detailed_csv()
+
+    return metrics.report()
+
+def summarize(reports):
+    """Per-stage medians over the repetitions, counters of the last one"""
+    stages = {}
+    for name, last in reports[-1]["stages"].items():
+        runs = [report["stages"][name] for report in reports if name in report["stages"]]
+
+        def median(key):
+            values = [run[key] for run in runs if run.get(key) is not None]
+            return round(statistics.median(values), 3) if values else None
+
+        stages[name] = {
+            "wall_seconds": median("wall_seconds"),
+            "wall_seconds_min": min((run["wall_seconds"] for run in runs if "wall_seconds" in run), default=None),
+            "cpu_seconds": median("cpu_seconds"),
+            "peak_rss_mb": max((run["peak_rss_mb"] for run in runs if run.get("peak_rss_mb")), default=None),
+            "messages_per_second": median("messages_per_second"),
+            "counters": last["counters"]
+        }
+        if "dedup_ratio" in last:
+            stages[name]["dedup_ratio"] = last["dedup_ratio"]
+    return stages
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=src_dir, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def load_history(results_file):
+    if not results_file.exists():
+        return []
+    with open(results_file, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(result, history, threshold):
+    """Log each stage against the last comparable run; returns the regressed stages"""
+    previous = next((entry for entry in reversed(history)
+                     if entry["options"] == result["options"] and entry.get("parsed") == result["parsed"]), None)
+    if previous is None:
+        logger.info("No earlier run with the same options to compare with")
+        return []
+
+    logger.info(f"Compared with {previous['timestamp']} (commit {previous.get('commit')}):")
+    regressions = []
+    for name, stage in result["stages"].items():
+        before = previous["stages"].get(name, {}).get("wall_seconds")
+        now = stage["wall_seconds"]
+        if not before or now is None:
+            logger.info(f"  {name:<11} {now}s (new)")
+            continue
+        change = (now - before) / before
+        flag = ""
+        if change > threshold and now - before > NOISE_FLOOR_SECONDS:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        logger.info(f"  {name:<11} {now:>8.3f}s  was {before:>8.3f}s  {change:+.0%}{flag}")
+    return regressions
+
+def run_benchmarks(options):
+    processors = load_processors()
+    server = start_fake_ollama(latency=options.llm_latency, eval_latency=options.eval_latency)
+    # Per-file and per-call log lines would dominate the timings
+    if not options.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    reports = []
+    try:
+        for repetition in range(options.repeat):
+            reports.append(run_once(options, processors, server))
+    finally:
+        server.shutdown()
+        logging.getLogger().setLevel(logging.INFO)
+
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {key: getattr(options, key) for key in WORKLOAD_OPTIONS},
+        "parsed": {source: processor is not None for source, processor in processors.items()},
+        "stages": summarize(reports),
+        "histograms": reports[-1]["histograms"]
+    }
+
+    for name, stage in result["stages"].items():
+        rate = f", {stage['messages_per_second']} msg/s" if stage.get("messages_per_second") else ""
+        logger.info(f"{name:<11} wall {stage['wall_seconds']}s, cpu {stage['cpu_seconds']}s, "
+                    f"peak RSS {stage['peak_rss_mb']} MB{rate}")
+
+    results_file = Path(options.results_file)
+    regressions = compare(result, load_history(results_file), options.regression_threshold)
+
+    if options.save:
+        results_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(results_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        logger.info(f"Appended results to {results_file}")
+
+    return result, regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every stage on a synthetic mailbox, offline")
+    parser.add_argument("--pst-emails", type=int, default=10000, help="Synthetic emails in PST records")
+    parser.add_argument("--msg-emails", type=int, default=1000, help="Synthetic emails in MSG records")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.9,
+                        help="Share of emails sent by an already seen sender")
+    parser.add_argument("--body-length", type=int, default=2000, help="Approximate body length in chars")
+    parser.add_argument("--files", type=int, default=1000, help="Files to sort")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake Ollama seconds per call")
+    parser.add_argument("--eval-latency", type=float, default=0.0005, help="Fake Ollama seconds per token")
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--no-rules", dest="rules", action="store_false",
+                        help="Send every sender to the fake Ollama server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions; stage times are medians")
+    parser.add_argument("--results-file", default=str(RESULTS_FILE))
+    parser.add_argument("--no-save", dest="save", action="store_false",
+                        help="Compare with the history without appending this run")
+    parser.add_argument("--regression-threshold", type=float, default=0.2,
+                        help="Flag stages at least this much slower than the last comparable run")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Exit with status 1 when a stage regressed")
+    parser.add_argument("--verbose", action="store_true", help="Keep the stages' INFO logging")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    _, regressed = run_benchmarks(args)
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
@@ -0,0 +1,243 @@
+"""
+Synthetic mailbox generator for benchmarks.
+
+Produces email records shaped like the PST and MSG processor output, and
+duck-typed stand-ins for pypff messages/folders and extract_msg messages,
+so every stage can be measured without real mailboxes. Output is fully
+determined by the seed.
+"""
+
+import os
+import sys
+import random
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Shared helpers live in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonl_stream import JsonlShardWriter
+
+FIRST_NAMES = ["Marie", "Jean", "Pierre", "Sophie", "Nicolas", "Camille", "Julien", "Elodie", "Thomas", "Claire",
+               "Antoine", "Laura", "Mathieu", "Julie", "Olivier", "Sarah", "Lucas", "Manon", "Hugo", "Emma"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
+              "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier"]
+COMPANIES = ["Acme Industrie", "Batiplus", "Nordtech", "Logisud", "Eurofret", "Atelier Durand", "Solvia",
+             "Transalpes", "Qualimetal", "Hexagone Conseil", "Provencia", "Breizh Emballage"]
+STREETS = ["rue de la République", "avenue Jean Jaurès", "boulevard Gambetta", "place de la Gare",
+           "rue Victor Hugo", "chemin des Vignes", "allée des Tilleuls", "quai de la Marine"]
+CITIES = [("69003", "Lyon"), ("13002", "Marseille"), ("31000", "Toulouse"), ("33000", "Bordeaux"),
+          ("44000", "Nantes"), ("59000", "Lille"), ("67000", "Strasbourg"), ("35000", "Rennes")]
+DEPARTMENTS = ["Service commercial", "Direction des achats", "Service informatique", "Comptabilité",
+               "Logistique", "Marketing"]
+SUBJECTS = ["Devis n°{n}", "Commande {n}", "Relance facture {n}", "RE: Livraison semaine {n}",
+            "Réunion du {n}", "TR: Proposition commerciale {n}", "Question sur le dossier {n}"]
+FILLER = ("Bonjour, suite à notre échange de ce matin je vous transmets les éléments demandés. "
+          "Merci de me confirmer la bonne réception du dossier et les délais de livraison prévus. "
+          "Nous restons à votre disposition pour toute information complémentaire. ")
+
+class SyntheticSender:
+    def __init__(self, rng, index):
+        self.first_name = rng.choice(FIRST_NAMES)
+        self.last_name = rng.choice(LAST_NAMES)
+        self.company = rng.choice(COMPANIES)
+        domain = self.company.lower().replace(" ", "-")
+        self.email = f"{self.first_name.lower()}.{self.last_name.lower()}{index}@{domain}.fr"
+        self.name = f"{self.first_name} {self.last_name}"
+        self.department = rng.choice(DEPARTMENTS)
+        self.phone = f"+33 {rng.randint(1, 5)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}"
+        self.mobile = f"06 {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}"
+        postcode, city = rng.choice(CITIES)
+        self.address = [f"{rng.randint(1, 150)} {rng.choice(STREETS)}", f"{postcode} {city}"]
+        # About a third of the signatures lack a phone number and need the LLM
+        self.complete = index % 3 != 0
+
+    def signature(self):
+        lines = ["Cordialement,", "", self.name, self.department, self.company]
+        if self.complete:
+            lines += [f"Tél : {self.phone}", f"Mobile : {self.mobile}"]
+        return "\n".join(lines + self.address)
+
+def make_body(sender, rng, body_length):
+    """Message text, a signature and quoted history, padded to about body_length chars"""
+    signature = sender.signature()
+    quoted = (f"\n\nLe {rng.randint(1, 28)}/0{rng.randint(1, 9)}/2024 à 10:{rng.randint(10, 59)}, "
+              f"Service client a écrit :\n> {FILLER.strip()}")
+    text_length = max(body_length - len(signature) - len(quoted), 40)
+    text = (FILLER * (text_length // len(FILLER) + 1))[:text_length]
+    return f"{text}\n\n{signature}{quoted}"
+
+def generate_records(count, duplicate_ratio=0.5, body_length=2000, seed=0, source="pst"):
+    """
+    Yield count email records with about duplicate_ratio of them sent by an
+    already seen sender, in the format of the processors' output.
+    """
+    rng = random.Random(f"{seed}-{source}")
+    unique = max(1, round(count * (1 - duplicate_ratio)))
+    order = list(range(unique)) + [rng.randrange(unique) for _ in range(count - unique)]
+    rng.shuffle(order)
+    # Distinct mailboxes for PST and MSG senders
+    offset = 0 if source == "pst" else 1000000
+    senders = {}
+    start = datetime(2024, 1, 1)
+    for index, sender_index in enumerate(order):
+        if sender_index not in senders:
+            senders[sender_index] = SyntheticSender(rng, sender_index + offset)
+        sender = senders[sender_index]
+        sent = start + timedelta(minutes=index * 7)
+        yield {
+            "subject": rng.choice(SUBJECTS).format(n=rng.randint(100, 9999)),
+            "messageId": f"<{source}.{seed}.{index}@synthetic.local>",
+            "senderName": sender.name,
+            "senderEmail": sender.email,
+            "body": make_body(sender, rng, body_length),
+            "sentAt": sent.strftime("%d/%m/%Y - %Hh%M")
+        }
+
+class SyntheticEntry:
+    """Stand-in for a pypff record entry holding a UTF-16 string property"""
+
+    def __init__(self, entry_type, value):
+        self.entry_type = entry_type
+        self.value = value
+
+    def get_entry_type(self):
+        return self.entry_type
+
+    def get_value_type(self):
+        return 0x001F
+
+    def get_data_as_string(self):
+        return self.value
+
+class SyntheticRecordSet:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def get_number_of_entries(self):
+        return len(self.entries)
+
+    def get_entry(self, index):
+        return self.entries[index]
+
+class SyntheticPstMessage:
+    """Stand-in for a pypff message, answering the getters pst.processor uses"""
+
+    def __init__(self, record):
+        self.record = record
+
+    def get_number_of_record_sets(self):
+        return 1
+
+    def get_record_set(self, index):
+        # Message class, sender address type and SMTP address, Internet message id
+        return SyntheticRecordSet([
+            SyntheticEntry(0x001A, "IPM.Note"),
+            SyntheticEntry(0x0064, "SMTP"),
+            SyntheticEntry(0x0065, self.record["senderEmail"]),
+            SyntheticEntry(0x1035, self.record["messageId"])
+        ])
+
+    def get_subject(self):
+        return self.record["subject"]
+
+    def get_sender_name(self):
+        return self.record["senderName"]
+
+    def get_delivery_time(self):
+        return datetime.strptime(self.record["sentAt"], "%d/%m/%Y - %Hh%M")
+
+    def get_transport_headers(self):
+        return (f"Message-ID: {self.record['messageId']}\r\n"
+                f"From: \"{self.record['senderName']}\" <{self.record['senderEmail']}>\r\n"
+                f"Subject: {self.record['subject']}\r\n")
+
+    def get_plain_text_body(self):
+        return self.record["body"].encode("utf-8")
+
+class SyntheticPstFolder:
+    """Stand-in for a pypff folder holding messages and subfolders"""
+
+    def __init__(self, name, messages=(), folders=()):
+        self.name = name
+        self.messages = list(messages)
+        self.folders = list(folders)
+
+    def get_name(self):
+        return self.name
+
+    def get_number_of_sub_messages(self):
+        return len(self.messages)
+
+    def get_sub_message(self, index):
+        return self.messages[index]
+
+    def get_number_of_sub_folders(self):
+        return len(self.folders)
+
+    def get_sub_folder(self, index):
+        return self.folders[index]
+
+def build_pst_tree(records, folder_size=500):
+    """Root folder with the records spread over subfolders of folder_size messages"""
+    messages = [SyntheticPstMessage(record) for record in records]
+    folders = [SyntheticPstFolder(f"Dossier {n}", messages[start:start + folder_size])
+               for n, start in enumerate(range(0, len(messages), folder_size))]
+    return SyntheticPstFolder("", folders=[SyntheticPstFolder("Boîte de réception", folders=folders)])
+
+class SyntheticPstFile:
+    """Stand-in for a pypff file serving root; the file names in broken fail to open"""
+
+    def __init__(self, root, broken=()):
+        self.root = root
+        self.broken = set(broken)
+
+    def open(self, path):
+        if Path(path).name in self.broken:
+            raise IOError(f"Unable to open {path}")
+
+    def get_root_folder(self):
+        return self.root
+
+    def close(self):
+        pass
+
+class SyntheticMsg:
+    """Stand-in for an extract_msg.Message, with the attributes msg.processor uses"""
+
+    def __init__(self, record):
+        self.subject = record["subject"]
+        self.messageId = record["messageId"]
+        self.sender = f"{record['senderName']} <{record['senderEmail']}>"
+        self.body = record["body"]
+        self.date = datetime.strptime(record["sentAt"], "%d/%m/%Y - %Hh%M")
+        self.headerDict = {"From": self.sender}
+
+    def close(self):
+        pass
+
+def write_mailbox_files(directory, msg_files, pst_files):
+    """Create empty .msg and .pst files, e.g. to benchmark file sorting"""
+    directory.mkdir(parents=True, exist_ok=True)
+    for index in range(msg_files):
+        (directory / f"message_{index:06d}.msg").touch()
+    for index in range(pst_files):
+        (directory / f"mailbox_{index:04d}.pst").touch()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic processor output for benchmarks")
+    parser.add_argument("--count", type=int, default=10000, help="Number of emails")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.5,
+                        help="Share of emails sent by an already seen sender")
+    parser.add_argument("--body-length", type=int, default=2000, help="Approximate body length in chars")
+    parser.add_argument("--source", choices=["pst", "msg"], default="pst")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory of the JSONL shards (default: the processor's output directory)")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir or f"src/{args.source}-processor/output")
+    with JsonlShardWriter(output_dir, f"{args.source}_emails") as writer:
+        for record in generate_records(args.count, args.duplicate_ratio, args.body_length, args.seed, args.source):
+            writer.write(record)
+    print(f"Wrote {writer.count} synthetic {args.source.upper()} emails to {output_dir}")
@@ -0,0 +1,628 @@
+import os
+import re
+import sys
+import json
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# Shared helpers live in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonl_stream import iter_email_file
+from email_deduplicator import write_json_array
+from structured_contacts import load_structured_contacts
+from email_store import EmailStore, DEFAULT_STORE_PATH
+from signature_extractor import estimate_tokens
+from ollama_client import OllamaClient, OllamaError, LOCAL_OLLAMA_URL, DEFAULT_OLLAMA_MODEL
+from extraction_cache import ExtractionCache, DEFAULT_CACHE_PATH, CACHE_MODES, cache_key
+from rule_extractor import extract_with_rules, missing_fields, REQUIRED_FIELDS
+from prompt import (get_prompt, get_batch_prompt, PROMPT_VERSION, PROMPT_PREFIX,
+                    BATCH_PROMPT, BATCH_PROMPT_PREFIX, BATCH_PROMPT_VERSION)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CONTACTS_DIR = Path("src/contacts-extractor")
+
+# Room left in the context window for each contact object the model writes back
+OUTPUT_TOKENS_PER_CONTACT = 160
+
+def sanitize_body(body):
+    """Collapse line breaks and repeated whitespace like the TS extractor does"""
+    cleaned = (body or "").replace("\r\n", " ")
+    return re.sub(r"\s{2,}", " ", cleaned).strip()
+
+def analysis_input(email):
+    return {
+        "body": sanitize_body(email.get("body")),
+        "senderEmail": email.get("senderEmail", ""),
+        "senderName": email.get("senderName", ""),
+        "subject": email.get("subject", "")
+    }
+
+def build_object_to_analyze(email):
+    return json.dumps(analysis_input(email), ensure_ascii=False)
+
+def parse_model_json(text):
+    """Parse the model output as JSON, tolerating text around the object"""
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        pass
+
+    start = (text or "").find("{")
+    end = (text or "").rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+def parse_batch_json(text):
+    """
+    Parse a batched answer into {sender email (lowercase): extraction}.
+    Accepts the requested array of objects carrying "senderEmail", as well
+    as an object keyed by sender email. Unusable entries are left out.
+    """
+    try:
+        parsed = json.loads(text)
+    except (TypeError, ValueError):
+        parsed = None
+        for opening, closing in (("[", "]"), ("{", "}")):
+            start = (text or "").find(opening)
+            end = (text or "").rfind(closing)
+            if start == -1 or end <= start:
+                continue
+            try:
+                parsed = json.loads(text[start:end + 1])
+                break
+            except ValueError:
+                pass
+
+    results = {}
+    if isinstance(parsed, dict):
+        if all("@" in key for key in parsed):
+            items = [{**value, "senderEmail": key} for key, value in parsed.items() if isinstance(value, dict)]
+        else:
+            # {"contacts": [...]} and similar wrappers
+            items = next((value for value in parsed.values() if isinstance(value, list)), [])
+    elif isinstance(parsed, list):
+        items = parsed
+    else:
+        return results
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        sender = item.pop("senderEmail", None) or (item.get("contact_info") or {}).get("primary_email")
+        if isinstance(sender, str) and sender:
+            results.setdefault(sender.strip().lower(), item)
+    return results
+
+def fallback_contact(email):
+    """Basic contact built from the email metadata alone"""
+    return {
+        "company": "",
+        "full_name": email.get("senderName") or "",
+        "department": "",
+        "primary_email": email.get("senderEmail") or "",
+        "landline_phone": "",
+        "mobile_phone": "",
+        "full_address": ""
+    }
+
+def to_contact(extracted, email):
+    """Flatten an ExtractedContactInfo object into the contact record used for CSV export"""
+    if not isinstance(extracted, dict):
+        return fallback_contact(email)
+
+    contact = extracted.get("contact") or {}
+    contact_info = extracted.get("contact_info") or {}
+    address = extracted.get("address") or {}
+
+    full_name = contact.get("full_name")
+    if not full_name:
+        names = [contact.get("first_name"), contact.get("last_name")]
+        full_name = " ".join(name for name in names if name)
+
+    full_address = address.get("full_address") or ", ".join(
+        part for part in (address.get("street"), address.get("city"),
+                          address.get("postal_code"), address.get("country")) if part
+    )
+
+    return {
+        "company": extracted.get("company") or "",
+        "full_name": full_name or "",
+        "department": contact.get("department") or "",
+        "primary_email": contact_info.get("primary_email") or email.get("senderEmail") or "",
+        "landline_phone": contact_info.get("landline_phone") or "",
+        "mobile_phone": contact_info.get("mobile_phone") or "",
+        "full_address": full_address or ""
+    }
+
+async def extract_contact(client, email, cache=None):
+    """
+    Ask Ollama for the contact information of one email, falling back to its metadata.
+    Successful extractions are looked up in and stored to cache if given.
+    """
+    object_to_analyze = build_object_to_analyze(email)
+    key = None
+    if cache is not None:
+        key = cache_key(object_to_analyze, client.model, PROMPT_VERSION)
+        cached = cache.get(key)
+        if cached is not None:
+            return to_contact(cached, email)
+
+    try:
+        response = await client.generate(get_prompt(object_to_analyze))
+    except OllamaError as e:
+        logger.error(f"Error calling Ollama API for {email.get('senderEmail')}: {str(e)}")
+        return fallback_contact(email)
+
+    extracted = parse_model_json(response.get("response"))
+    if extracted is None:
+        logger.warning(f"Could not parse Ollama response for {email.get('senderEmail')}")
+        logger.debug(f"Raw response: {response.get('response')}")
+    elif key is not None:
+        cache.put(key, extracted, client.model, PROMPT_VERSION)
+    return to_contact(extracted, email)
+
+async def extract_contacts(emails, client, on_contact=None, cache=None):
+    """
+    Extract contacts for all emails concurrently, keeping at most the client's
+    in-flight limit of requests open. Results are returned in input order.
+    """
+    emails = list(emails)
+    contacts = [None] * len(emails)
+    queue = asyncio.Queue()
+    for item in enumerate(emails):
+        queue.put_nowait(item)
+
+    done = 0
+
+    async def worker():
+        nonlocal done
+        while True:
+            try:
+                index, email = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            contact = await extract_contact(client, email, cache)
+            contact["extracted_at"] = datetime.now().strftime("%d/%m/%Y - %H:%M")
+            contacts[index] = contact
+            done += 1
+            if on_contact:
+                on_contact(contact)
+            if done % 50 == 0 or done == len(emails):
+                logger.info(f"Extracted {done}/{len(emails)} contacts")
+
+    # One worker per possible slot; the limiter decides how many actually run
+    workers = [asyncio.create_task(worker()) for _ in range(client.limiter.max_in_flight)]
+    await asyncio.gather(*workers)
+    return contacts
+
+def pack_batches(emails, batch_size, num_ctx):
+    """
+    Group emails into batches of at most batch_size senders whose batched
+    prompt plus expected answers fits in num_ctx tokens. An email too large
+    for any batch gets a batch of its own. Yields lists of (index, email).
+    """
+    budget = num_ctx - estimate_tokens(BATCH_PROMPT)
+    batch = []
+    senders = set()
+    used = 0
+
+    for index, email in emails:
+        cost = estimate_tokens(build_object_to_analyze(email)) + OUTPUT_TOKENS_PER_CONTACT
+        sender = (email.get("senderEmail") or "").lower()
+        if batch and (len(batch) >= batch_size or used + cost > budget or sender in senders):
+            yield batch
+            batch = []
+            senders = set()
+            used = 0
+        batch.append((index, email))
+        senders.add(sender)
+        used += cost
+
+    if batch:
+        yield batch
+
+async def extract_batch(client, batch, num_ctx, cache=None):
+    """
+    Extract the contacts of a batch of emails with a single Ollama call.
+    Returns {index: contact}; senders missing from the answer, and all of
+    them when the call fails, are retried individually.
+    """
+    objects = json.dumps([analysis_input(email) for _, email in batch], ensure_ascii=False)
+    try:
+        # The answer is an array, which JSON-constrained output would not allow
+        num_predict = client.num_predict * len(batch) if client.num_predict else None
+        response = await client.generate(get_batch_prompt(objects), num_predict=num_predict, json_format=False,
+                                         options={"num_ctx": num_ctx})
+        extracted = parse_batch_json(response.get("response"))
+    except OllamaError as e:
+        logger.warning(f"Batch of {len(batch)} senders failed, retrying individually: {str(e)}")
+        extracted = {}
+
+    contacts = {}
+    retry = []
+    for index, email in batch:
+        result = extracted.get((email.get("senderEmail") or "").lower())
+        if not isinstance(result, dict):
+            retry.append((index, email))
+            continue
+        if cache is not None:
+            key = cache_key(build_object_to_analyze(email), client.model, BATCH_PROMPT_VERSION)
+            cache.put(key, result, client.model, BATCH_PROMPT_VERSION)
+        contacts[index] = to_contact(result, email)
+
+    if retry:
+        logger.info(f"Retrying {len(retry)}/{len(batch)} senders missing from a batched answer")
+        singles = await asyncio.gather(*(extract_contact(client, email, cache) for _, email in retry))
+        for (index, _), contact in zip(retry, singles):
+            contacts[index] = contact
+    return contacts
+
+async def extract_contacts_batched(emails, client, batch_size=8, num_ctx=8192, on_contact=None, cache=None):
+    """
+    Same as extract_contacts, but packs several senders into each prompt so
+    the long instruction block is evaluated once per batch, not per sender.
+    """
+    emails = list(emails)
+    contacts = [None] * len(emails)
+    done = 0
+
+    def finish(index, contact):
+        nonlocal done
+        contact["extracted_at"] = datetime.now().strftime("%d/%m/%Y - %H:%M")
+        contacts[index] = contact
+        done += 1
+        if on_contact:
+            on_contact(contact)
+        if done % 50 == 0 or done == len(emails):
+            logger.info(f"Extracted {done}/{len(emails)} contacts")
+
+    pending = []
+    for index, email in enumerate(emails):
+        cached = None
+        if cache is not None:
+            # Senders retried individually were cached under the single-email prompt
+            object_to_analyze = build_object_to_analyze(email)
+            cached = cache.get(cache_key(object_to_analyze, client.model, BATCH_PROMPT_VERSION),
+                               cache_key(object_to_analyze, client.model, PROMPT_VERSION))
+        if cached is not None:
+            finish(index, to_contact(cached, email))
+        else:
+            pending.append((index, email))
+
+    queue = asyncio.Queue()
+    for batch in pack_batches(pending, batch_size, num_ctx):
+        queue.put_nowait(batch)
+    logger.info(f"Packed {len(pending)} senders into {queue.qsize()} batches")
+
+    async def worker():
+        while True:
+            try:
+                batch = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for index, contact in (await extract_batch(client, batch, num_ctx, cache)).items():
+                finish(index, contact)
+
+    workers = [asyncio.create_task(worker()) for _ in range(client.limiter.max_in_flight)]
+    await asyncio.gather(*workers)
+    return contacts
+
+def latest_input_file(contacts_dir=CONTACTS_DIR):
+    """
+    Prefer signature-reduced emails, fall back to the raw deduplicated ones.
+    Signature-reduced emails older than the newest deduplicated emails were
+    reduced from an earlier run, and are not used.
+    """
+    newest = {}
+    for pattern in ("signature_emails_*.json", "deduplicated_emails_*.json"):
+        files = sorted(contacts_dir.glob(pattern), key=lambda x: x.stat().st_mtime)
+        newest[pattern] = files[-1] if files else None
+    signatures, deduplicated = newest.values()
+    if signatures and (deduplicated is None or signatures.stat().st_mtime >= deduplicated.stat().st_mtime):
+        return signatures
+    return deduplicated
+
+def fill_missing(contact, fallback):
+    """Fill the empty fields of a contact record from another one"""
+    for field, value in fallback.items():
+        if value and not contact.get(field):
+            contact[field] = value
+    return contact
+
+def known_contact(email, structured=None, rules=True):
+    """
+    Contact record of a sender built without the LLM, and where it came from:
+    the sender's structured contact (contact item or vCard) completed by the
+    rule extractor, "structured"; the rule extractor alone, "rules"; or
+    (None, None) when neither applies.
+    """
+    record = structured.get(email.get("senderEmail")) if structured is not None else None
+    rule_contact = to_contact(extract_with_rules(email), email) if rules else None
+    if record is None:
+        return rule_contact, "rules" if rule_contact is not None else None
+    contact = to_contact(record, email)
+    if rule_contact is not None:
+        fill_missing(contact, rule_contact)
+    return contact, "structured"
+
+def complete_contact(contact, known, source):
+    """Merge an LLM contact with the one built without it; structured fields take precedence"""
+    if known is None:
+        return contact
+    if source == "structured":
+        return fill_missing(dict(known), contact)
+    return fill_missing(contact, known)
+
+async def extract_contacts_from_queue(queue, client, on_contact, cache=None, rules=True,
+                                     required_fields=REQUIRED_FIELDS, structured=None):
+    """
+    Extract contacts for emails taken from an asyncio queue until a None
+    sentinel arrives, passing each contact to on_contact as soon as it is
+    ready. Senders fully resolved by their structured contact (see
+    structured_contacts.py, looked up when the sender is taken from the
+    queue) or by the rules never wait for Ollama.
+    Returns the number of contacts, how many of them the rules resolved and
+    how many their structured contact resolved.
+    """
+    counts = {"contacts": 0, "rules": 0, "structured": 0}
+
+    async def worker():
+        while True:
+            email = await queue.get()
+            if email is None:
+                # Leave the sentinel for the other workers
+                queue.put_nowait(None)
+                return
+            known, source = known_contact(email, structured, rules)
+            if known is not None and not missing_fields(known, required_fields):
+                contact = known
+                counts[source] += 1
+            else:
+                contact = complete_contact(await extract_contact(client, email, cache), known, source)
+            contact["extracted_at"] = datetime.now().strftime("%d/%m/%Y - %H:%M")
+            counts["contacts"] += 1
+            on_contact(contact)
+
+    workers = [asyncio.create_task(worker()) for _ in range(client.limiter.max_in_flight)]
+    await asyncio.gather(*workers)
+    return counts["contacts"], counts["rules"], counts["structured"]
+
+async def run_contact_extraction(emails, base_url=LOCAL_OLLAMA_URL, model=DEFAULT_OLLAMA_MODEL,
+                                 max_in_flight=4, timeout=120.0, retries=3, adaptive=False, cache=None,
+                                 batch_size=1, num_ctx=8192, rules=True, required_fields=REQUIRED_FIELDS,
+                                 stream=True, num_predict=512, json_format=True, keep_alive="30m",
+                                 warmup=True, timing_sample_every=20, calls_file=None, structured=None,
+                                 metrics=None):
+    """
+    Extract contacts for emails, in input order. Senders with a record in
+    structured (a StructuredContactIndex) start from it, and with rules=True
+    the regex extractor fills in after it; only senders still missing one of
+    required_fields are sent to Ollama. Structured fields override the
+    model's answer, which overrides the rule results. Generations are streamed and stopped at the end of
+    the JSON answer unless stream=False; num_predict caps the tokens generated
+    per sender. The model is kept loaded for keep_alive and, with warmup,
+    loaded with the static prompt prefix before the first sender. Per-call
+    Ollama timings are saved to calls_file if given, and recorded in metrics
+    (a RunMetrics); when streaming, they are only reported by the one call in
+    timing_sample_every that runs to the end.
+    """
+    emails = list(emails)
+    contacts = [None] * len(emails)
+    known_contacts = [(None, None)] * len(emails)
+    resolved = {"rules": 0, "structured": 0}
+    pending = []
+
+    for index, email in enumerate(emails):
+        known, source = known_contacts[index] = known_contact(email, structured, rules)
+        if known is not None and not missing_fields(known, required_fields):
+            known["extracted_at"] = datetime.now().strftime("%d/%m/%Y - %H:%M")
+            contacts[index] = known
+            resolved[source] += 1
+            continue
+        pending.append(index)
+
+    if structured is not None and emails:
+        logger.info(f"Structured contacts resolved {resolved['structured']}/{len(emails)} senders")
+        if metrics:
+            metrics.count("extraction", "structured_contacts", resolved["structured"])
+    if (rules or structured is not None) and emails:
+        skipped = len(emails) - len(pending)
+        logger.info(f"Fast path resolved {skipped}/{len(emails)} senders "
+                    f"({resolved['rules']} by rules, LLM skip rate {skipped / len(emails):.0%})")
+        if metrics and rules:
+            metrics.count("extraction", "rule_contacts", resolved["rules"])
+
+    if pending:
+        async with OllamaClient(base_url=base_url, model=model, max_in_flight=max_in_flight,
+                                timeout=timeout, retries=retries, adaptive=adaptive, stream=stream,
+                                num_predict=num_predict, json_format=json_format,
+                                keep_alive=keep_alive, timing_sample_every=timing_sample_every) as client:
+            if warmup:
+                await client.warmup(BATCH_PROMPT_PREFIX if batch_size > 1 else PROMPT_PREFIX)
+            pending_emails = [emails[index] for index in pending]
+            if batch_size > 1:
+                extracted = await extract_contacts_batched(pending_emails, client, batch_size=batch_size,
+                                                           num_ctx=num_ctx, cache=cache)
+            else:
+                extracted = await extract_contacts(pending_emails, client, cache=cache)
+            if client.early_stops:
+                logger.info(f"Stopped {client.early_stops} generations early once their JSON answer was complete")
+
+        summary = client.call_summary()
+        logger.info(
+            f"Ollama calls: {summary['calls']}, mean load {summary['mean_load_duration_ms']} ms, "
+            f"mean prompt eval {summary['mean_prompt_eval_duration_ms']} ms "
+            f"for {summary['mean_prompt_eval_count']} tokens, "
+            f"mean first token {summary['mean_time_to_first_token_ms']} ms"
+        )
+        if calls_file:
+            write_json_array(client.calls, calls_file)
+        if metrics:
+            metrics.observe_llm_calls(client.calls)
+            metrics.count("extraction", "llm_failures", client.failures)
+
+        for index, contact in zip(pending, extracted):
+            contacts[index] = complete_contact(contact, *known_contacts[index])
+
+    return contacts
+
+def process_contact_extraction(base_url=LOCAL_OLLAMA_URL, model=DEFAULT_OLLAMA_MODEL,
+                               max_in_flight=4, timeout=120.0, retries=3, adaptive=False,
+                               cache_mode="use", cache_path=DEFAULT_CACHE_PATH,
+                               cache_max_entries=200000, cache_max_age_days=180,
+                               batch_size=1, num_ctx=8192, rules=True, required_fields=REQUIRED_FIELDS,
+                               stream=True, num_predict=512, json_format=True, keep_alive="30m", warmup=True,
+                               timing_sample_every=20, structured_contacts=True, metrics=None, store=None):
+    """
+    Extract contacts from the latest deduplicated (signature-reduced) emails
+    and save them to extracted_contacts_<timestamp>.json.
+    With structured_contacts=True, the contact items and vCards harvested by
+    the processors are used for their senders. Senders fully resolved by
+    them or by the rule extractor skip Ollama.
+    Results are cached on disk; cache_mode="refresh" ignores cached entries
+    and cache_mode="off" bypasses the cache. With batch_size > 1 up to that
+    many senders share one prompt, within a num_ctx token context window.
+    Ollama timings of every call are saved to ollama_calls_<timestamp>.json
+    and, with metrics (a RunMetrics), recorded under the "extraction" stage.
+    With store (an EmailStore), the senders are read from it, with their
+    reduced signatures, and the contacts saved back to it.
+    """
+    if store:
+        senders, emails = [], []
+        for sender, email in store.iter_senders(signatures=True):
+            senders.append(sender)
+            emails.append(email)
+        if not emails:
+            logger.warning(f"No deduplicated senders found in {store.path}")
+            return 0
+        logger.info(f"Extracting contacts for {len(emails)} senders from {store.path}")
+    else:
+        input_file = latest_input_file()
+        if not input_file:
+            logger.warning(f"No deduplicated emails found in {CONTACTS_DIR}")
+            return 0
+
+        emails = list(iter_email_file(input_file))
+        logger.info(f"Extracting contacts for {len(emails)} senders from {input_file}")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    structured = load_structured_contacts() if structured_contacts else None
+
+    cache = ExtractionCache(cache_path, mode=cache_mode, max_entries=cache_max_entries,
+                            max_age_days=cache_max_age_days)
+    with cache:
+        contacts = asyncio.run(run_contact_extraction(
+            emails, base_url=base_url, model=model, max_in_flight=max_in_flight,
+            timeout=timeout, retries=retries, adaptive=adaptive, cache=cache,
+            batch_size=batch_size, num_ctx=num_ctx, rules=rules, required_fields=required_fields,
+            stream=stream, num_predict=num_predict, json_format=json_format,
+            keep_alive=keep_alive, warmup=warmup, timing_sample_every=timing_sample_every,
+            calls_file=CONTACTS_DIR / f"ollama_calls_{timestamp}.json", structured=structured, metrics=metrics
+        ))
+        stats = cache.stats()
+
+    logger.info(f"Extraction cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.0%})")
+    if metrics:
+        metrics.count("extraction", "cache_hits", stats["hits"])
+        metrics.count("extraction", "cache_misses", stats["misses"])
+
+    if store:
+        store.save_contacts(zip(senders, contacts))
+        count = len(contacts)
+        logger.info(f"Stored {count} contacts in {store.path}")
+    else:
+        output_file = CONTACTS_DIR / f"extracted_contacts_{timestamp}.json"
+        count = write_json_array(contacts, output_file)
+        logger.info(f"Saved {count} contacts to {output_file}")
+    if metrics:
+        metrics.count("extraction", "contacts", count)
+
+    return count
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract contacts from deduplicated emails with Ollama")
+    parser.add_argument("--url", default=LOCAL_OLLAMA_URL, help="Ollama base URL")
+    parser.add_argument("--model", default=DEFAULT_OLLAMA_MODEL.value, help="Ollama model name")
+    parser.add_argument("--max-in-flight", type=int, default=4,
+                        help="Maximum number of concurrent Ollama requests")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Start low and adapt concurrency to observed latency")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per request")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Senders packed into one prompt (1 disables batching)")
+    parser.add_argument("--num-ctx", type=int, default=8192,
+                        help="Model context window in tokens, used to size batches")
+    parser.add_argument("--no-stream", dest="stream", action="store_false",
+                        help="Wait for whole generations instead of streaming and stopping at the end of the JSON")
+    parser.add_argument("--max-tokens", type=int, default=512,
+                        help="Cap on generated tokens per sender (num_predict), 0 for no cap")
+    parser.add_argument("--no-json-format", dest="json_format", action="store_false",
+                        help="Do not ask Ollama for JSON-constrained output")
+    parser.add_argument("--keep-alive", default="30m",
+                        help="How long Ollama keeps the model loaded after a call (e.g. 30m, -1 for ever)")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false",
+                        help="Skip loading the model with the prompt prefix before extraction")
+    parser.add_argument("--timing-sample-every", type=int, default=20,
+                        help="Let every Nth streamed call finish so Ollama reports its timings (0: never)")
+    parser.add_argument("--no-rules", dest="rules", action="store_false",
+                        help="Send every sender to Ollama instead of resolving regular signatures with rules")
+    parser.add_argument("--required-fields", default=",".join(REQUIRED_FIELDS),
+                        help="Fields the rules must fill for a sender to skip Ollama "
+                             "(full_name, company, department, primary_email, phone, landline_phone, "
+                             "mobile_phone, full_address)")
+    parser.add_argument("--no-structured-contacts", dest="structured_contacts", action="store_false",
+                        help="Ignore the contact items and vCards harvested by the PST and MSG processors")
+    parser.add_argument("--store", nargs="?", const=str(DEFAULT_STORE_PATH), default=None,
+                        help="Read senders from and save contacts to the SQLite email store (optionally at this path)")
+    parser.add_argument("--cache", dest="cache_mode", choices=CACHE_MODES, default="use",
+                        help="use: read and write the extraction cache; refresh: ignore cached entries; off: bypass")
+    parser.add_argument("--cache-path", default=str(DEFAULT_CACHE_PATH), help="Extraction cache database")
+    parser.add_argument("--cache-max-entries", type=int, default=200000,
+                        help="Evict least recently used cache entries beyond this count")
+    parser.add_argument("--cache-max-age-days", type=float, default=180,
+                        help="Ignore and prune cache entries older than this")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = EmailStore(args.store) if args.store else None
+    result = process_contact_extraction(
+        base_url=args.url,
+        model=args.model,
+        max_in_flight=args.max_in_flight,
+        timeout=args.timeout,
+        retries=args.retries,
+        adaptive=args.adaptive,
+        cache_mode=args.cache_mode,
+        cache_path=args.cache_path,
+        cache_max_entries=args.cache_max_entries,
+        cache_max_age_days=args.cache_max_age_days,
+        batch_size=args.batch_size,
+        num_ctx=args.num_ctx,
+        rules=args.rules,
+        required_fields=tuple(field.strip() for field in args.required_fields.split(",") if field.strip()),
+        stream=args.stream,
+        num_predict=args.max_tokens,
+        json_format=args.json_format,
+        keep_alive=int(args.keep_alive) if args.keep_alive.lstrip("-").isdigit() else args.keep_alive,
+        warmup=args.warmup,
+        timing_sample_every=args.timing_sample_every,
+        structured_contacts=args.structured_contacts,
+        store=store
+    )
+    if store:
+        store.close()
+    print(f"Extracted {result} contacts")
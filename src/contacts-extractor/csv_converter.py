@@ -0,0 +1,112 @@
+import os
+import sys
+import csv
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# Shared helpers live in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonl_stream import iter_email_file
+from email_store import EmailStore, DEFAULT_STORE_PATH
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CONTACTS_DIR = Path("src/contacts-extractor")
+
+# Same columns as convertToCSV in src/utils/csv.utils.ts
+CSV_HEADERS = [
+    'full_name',
+    'department',
+    'company',
+    'primary_email',
+    'landline_phone',
+    'mobile_phone',
+    'full_address'
+]
+
+DETAILED_HEADERS = CSV_HEADERS + ['email_domain', 'has_phone', 'has_address', 'extracted_at']
+
+def latest_contacts_file(contacts_dir=CONTACTS_DIR):
+    files = sorted(contacts_dir.glob("extracted_contacts_*.json"), key=lambda x: x.stat().st_mtime)
+    return files[-1] if files else None
+
+def write_csv(rows, headers, output_file):
+    """Write rows (dicts) with every field quoted, like the TS exporter. Returns the row count"""
+    count = 0
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=headers, quoting=csv.QUOTE_ALL, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({header: row.get(header) or '' for header in headers})
+            count += 1
+    return count
+
+def detailed_row(contact):
+    email = contact.get('primary_email') or ''
+    return {
+        **contact,
+        'email_domain': email.rsplit('@', 1)[-1].lower() if '@' in email else '',
+        'has_phone': 'yes' if contact.get('landline_phone') or contact.get('mobile_phone') else 'no',
+        'has_address': 'yes' if contact.get('full_address') else 'no'
+    }
+
+def iter_contacts(input_file=None, store=None):
+    """Contacts of the store's current senders, or of input_file (default: the latest extracted contacts)"""
+    if store:
+        if not store.count("contacts"):
+            logger.warning(f"No extracted contacts found in {store.path}")
+            return None
+        return store.iter_contacts()
+    input_file = input_file or latest_contacts_file()
+    if not input_file:
+        logger.warning(f"No extracted contacts found in {CONTACTS_DIR}")
+        return None
+    return iter_email_file(input_file)
+
+def convert_contacts_to_csv(input_file=None, output_file=None, store=None):
+    """Export the latest extracted contacts, or those of store (an EmailStore), to contacts_export_<timestamp>.csv"""
+    contacts = iter_contacts(input_file, store)
+    if contacts is None:
+        return 0
+
+    if output_file is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = CONTACTS_DIR / f"contacts_export_{timestamp}.csv"
+
+    count = write_csv(contacts, CSV_HEADERS, output_file)
+    logger.info(f"Saved {count} contacts to {output_file}")
+    return count
+
+def create_detailed_csv(input_file=None, output_file=None, store=None):
+    """Export the latest extracted contacts with completeness columns to contacts_detailed_<timestamp>.csv"""
+    contacts = iter_contacts(input_file, store)
+    if contacts is None:
+        return 0
+
+    if output_file is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = CONTACTS_DIR / f"contacts_detailed_{timestamp}.csv"
+
+    count = write_csv((detailed_row(contact) for contact in contacts), DETAILED_HEADERS, output_file)
+    logger.info(f"Saved {count} detailed contacts to {output_file}")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export extracted contacts to CSV")
+    parser.add_argument("--store", nargs="?", const=str(DEFAULT_STORE_PATH), default=None,
+                        help="Export the contacts of the SQLite email store (optionally at this path)")
+    args = parser.parse_args()
+
+    store = EmailStore(args.store) if args.store else None
+    csv_count = convert_contacts_to_csv(store=store)
+    detailed_count = create_detailed_csv(store=store)
+    if store:
+        store.close()
+    print(f"Exported {csv_count} contacts ({detailed_count} in detailed CSV)")
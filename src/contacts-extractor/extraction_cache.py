@@ -0,0 +1,190 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path("src/contacts-extractor/extraction_cache.db")
+
+# Cache modes: "use" reads and writes, "refresh" ignores existing entries but
+# stores new results, "off" bypasses the cache entirely
+CACHE_MODES = ("use", "refresh", "off")
+
+def cache_key(object_to_analyze, model, prompt_version):
+    """Content address of one extraction: normalized input, model and prompt template version"""
+    if isinstance(object_to_analyze, str):
+        object_to_analyze = json.loads(object_to_analyze)
+    normalized = {
+        key: " ".join(str(value or "").split()) for key, value in object_to_analyze.items()
+    }
+    if "senderEmail" in normalized:
+        normalized["senderEmail"] = normalized["senderEmail"].lower()
+    payload = json.dumps([model, prompt_version, normalized], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ExtractionCache:
+    """
+    Persistent SQLite cache of LLM extraction results.
+
+    Entries older than max_age_days are ignored and pruned; beyond max_entries
+    the least recently used entries are evicted. Hit/miss counters cover the
+    current run.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, mode="use", max_entries=200000, max_age_days=180):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unsupported cache mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._db = None
+
+        if mode != "off":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path))
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS extractions (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_extractions_last_used ON extractions(last_used_at)")
+            self._db.commit()
+
+    @property
+    def _min_created_at(self):
+        return time.time() - self.max_age_days * 86400 if self.max_age_days else 0
+
+    def get(self, key, *fallback_keys):
+        """Return the cached extraction for the first of the keys found, or None"""
+        if self.mode != "use":
+            if self.mode == "refresh":
+                self.misses += 1
+            return None
+
+        for candidate in (key,) + fallback_keys:
+            row = self._db.execute(
+                "SELECT value FROM extractions WHERE key = ? AND created_at >= ?",
+                (candidate, self._min_created_at)
+            ).fetchone()
+            if row is not None:
+                break
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._db.execute("UPDATE extractions SET last_used_at = ? WHERE key = ?", (time.time(), candidate))
+        return json.loads(row[0])
+
+    def put(self, key, value, model, prompt_version):
+        if self.mode == "off":
+            return
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO extractions (key, model, prompt_version, value, created_at, last_used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, prompt_version, json.dumps(value, ensure_ascii=False), now, now)
+        )
+        self.stores += 1
+        if self.stores % 500 == 0:
+            self._db.commit()
+
+    def prune(self):
+        """Drop expired entries and evict least recently used ones beyond max_entries"""
+        if self._db is None:
+            return 0
+        removed = self._db.execute(
+            "DELETE FROM extractions WHERE created_at < ?", (self._min_created_at,)
+        ).rowcount
+        if self.max_entries:
+            removed += self._db.execute("""
+                DELETE FROM extractions WHERE key IN (
+                    SELECT key FROM extractions ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+        self._db.commit()
+        self.evictions += removed
+        return removed
+
+    def invalidate(self, model=None, prompt_version=None):
+        """Delete all entries, or only those of a model and/or prompt version"""
+        if self._db is None:
+            return 0
+        clauses = []
+        params = []
+        if model:
+            clauses.append("model = ?")
+            params.append(model)
+        if prompt_version:
+            clauses.append("prompt_version = ?")
+            params.append(prompt_version)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        removed = self._db.execute(f"DELETE FROM extractions{where}", params).rowcount
+        self._db.commit()
+        return removed
+
+    def stats(self):
+        stats = {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / (self.hits + self.misses), 3) if self.hits + self.misses else 0.0
+        }
+        if self._db is not None:
+            stats["entries"] = self._db.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        return stats
+
+    def close(self, prune=True):
+        if self._db is not None:
+            if prune:
+                self.prune()
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or maintain the contact extraction cache")
+    parser.add_argument("command", choices=["stats", "prune", "clear"])
+    parser.add_argument("--path", default=str(DEFAULT_CACHE_PATH))
+    parser.add_argument("--model", default=None, help="With clear: only entries of this model")
+    parser.add_argument("--prompt-version", default=None, help="With clear: only entries of this prompt version")
+    parser.add_argument("--max-entries", type=int, default=200000)
+    parser.add_argument("--max-age-days", type=float, default=180)
+    args = parser.parse_args()
+
+    cache = ExtractionCache(args.path, max_entries=args.max_entries, max_age_days=args.max_age_days)
+    if args.command == "prune":
+        logger.info(f"Pruned {cache.prune()} entries")
+    elif args.command == "clear":
+        logger.info(f"Removed {cache.invalidate(model=args.model, prompt_version=args.prompt_version)} entries")
+    print(json.dumps(cache.stats(), indent=2))
+    cache.close(prune=False)
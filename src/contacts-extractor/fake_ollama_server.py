@@ -0,0 +1,289 @@
+"""
+Local stand-in for the Ollama HTTP API, for testing the contact extractor
+without a model. /api/generate answers with a contact JSON built from the
+email found in the prompt (or an array of them for batched prompts), after
+a configurable delay.
+"""
+
+import os
+import re
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prompt import BATCH_MARKER
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def parse_keep_alive(value, default=300.0):
+    """Seconds for an Ollama keep_alive value: 300, "30m", "1h", -1 (for ever)"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*", value)
+        if not match:
+            return default
+        seconds = float(match.group(1)) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[match.group(2) or "s"]
+    else:
+        seconds = float(value)
+    return float("inf") if seconds < 0 else seconds
+
+def fake_contact(prompt):
+    """Build a plausible ExtractedContactInfo answer from the email in the prompt"""
+    sender_email = re.findall(r'"senderEmail":\s*"([^"]*)"', prompt)
+    sender_name = re.findall(r'"senderName":\s*"([^"]*)"', prompt)
+    return fake_contact_for(sender_email[-1] if sender_email else None,
+                            sender_name[-1] if sender_name else None)
+
+def fake_batch(prompt, drop_every=0):
+    """Answer a batched prompt with one contact per email, dropping every Nth one"""
+    emails = json.loads(prompt.split(BATCH_MARKER, 1)[1])
+    answers = []
+    for position, email in enumerate(emails, 1):
+        if drop_every and position % drop_every == 0:
+            continue
+        answer = fake_contact_for(email.get("senderEmail"), email.get("senderName"))
+        answer["senderEmail"] = email.get("senderEmail")
+        answers.append(answer)
+    return answers
+
+def fake_contact_for(email, name):
+    first_name, _, last_name = (name or "").partition(" ")
+    return {
+        "contact": {
+            "first_name": first_name or None,
+            "last_name": last_name or None,
+            "full_name": name,
+            "department": None
+        },
+        "company": email.split("@")[-1].split(".")[0].upper() if email else None,
+        "contact_info": {
+            "primary_email": email,
+            "landline_phone": None,
+            "mobile_phone": None
+        },
+        "address": {
+            "street": None,
+            "city": None,
+            "postal_code": None,
+            "country": None,
+            "full_address": None
+        }
+    }
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; avoid Nagle/delayed-ACK stalls
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _stream_tokens(self, request, tokens, final):
+        """Send tokens as NDJSON messages the way Ollama streams, one per eval_latency"""
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(server.eval_latency)
+                self._write_chunk(json.dumps({
+                    "model": request.get("model"),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "response": token,
+                    "done": False
+                }).encode("utf-8") + b"\n")
+                with server.lock:
+                    server.tokens_generated += 1
+            self._write_chunk(json.dumps(final).encode("utf-8") + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading: abandon the generation like Ollama does
+            self.close_connection = True
+            with server.lock:
+                server.cancelled += 1
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-fake"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight_seen = max(server.max_in_flight_seen, server.in_flight)
+            fail = server.fail_every and server.requests % server.fail_every == 0
+
+        prompt = request.get("prompt", "")
+        with server.lock:
+            load = server.load_model(request.get("keep_alive"))
+            cached = server.cached_prefix(prompt)
+        # Like Ollama, only the part of the prompt not found in the cache is evaluated
+        prompt_tokens = max(1, (len(prompt) - cached) // 4)
+        prompt_eval = server.latency + prompt_tokens * server.token_latency
+        latency = load + prompt_eval
+        try:
+            time.sleep(latency)
+            if fail:
+                self._send_json(503, {"error": "fake overload"})
+                return
+
+            if BATCH_MARKER in prompt:
+                answer = fake_batch(prompt, server.drop_every)
+            else:
+                answer = fake_contact(prompt)
+
+            text = json.dumps(answer)
+            # JSON-constrained output cannot ramble on after the object
+            if server.ramble and request.get("format") != "json":
+                text += "\n\nExplanation: " + "the contact was found in the signature. " * server.ramble
+            tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+            num_predict = (request.get("options") or {}).get("num_predict")
+            done_reason = "stop"
+            if num_predict and num_predict > 0 and len(tokens) > num_predict:
+                tokens = tokens[:num_predict]
+                done_reason = "length"
+
+            final = {
+                "model": request.get("model"),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "response": "",
+                "done": True,
+                "done_reason": done_reason,
+                "context": [],
+                "total_duration": int((latency + len(tokens) * server.eval_latency) * 1e9),
+                "load_duration": int(load * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int(len(tokens) * server.eval_latency * 1e9)
+            }
+
+            if request.get("stream", True):
+                self._stream_tokens(request, tokens, final)
+            else:
+                time.sleep(len(tokens) * server.eval_latency)
+                self._send_json(200, {**final, "response": "".join(tokens)})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections when many clients connect at once
+    request_queue_size = 128
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, fail_every=0, token_latency=0.0, drop_every=0,
+                 eval_latency=0.0, ramble=0, load_latency=0.0, prompt_cache_slots=4):
+        super().__init__(address, FakeOllamaHandler)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.token_latency = token_latency
+        self.drop_every = drop_every
+        self.eval_latency = eval_latency
+        self.ramble = ramble
+        self.load_latency = load_latency
+        self.prompt_cache = deque(maxlen=prompt_cache_slots)
+        self.tokens_generated = 0
+        self.cancelled = 0
+        self.loads = 0
+        self.loaded_until = 0.0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight_seen = 0
+
+    def load_model(self, keep_alive):
+        """Return the load time of this request and extend how long the model stays loaded"""
+        now = time.monotonic()
+        load = 0.0
+        if now >= self.loaded_until:
+            load = self.load_latency
+            self.loads += 1
+        self.loaded_until = now + load + parse_keep_alive(keep_alive)
+        return load
+
+    def cached_prefix(self, prompt):
+        """Length of the longest prefix of prompt shared with a recently evaluated prompt"""
+        if self.prompt_cache.maxlen == 0:
+            return 0
+        cached = max((len(os.path.commonprefix([previous, prompt])) for previous in self.prompt_cache), default=0)
+        self.prompt_cache.append(prompt)
+        return cached
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_fake_ollama(latency=0.0, fail_every=0, port=0, token_latency=0.0, drop_every=0,
+                      eval_latency=0.0, ramble=0, load_latency=0.0, prompt_cache_slots=4):
+    """Start a fake Ollama server in a background thread and return it"""
+    server = FakeOllamaServer(("127.0.0.1", port), latency=latency, fail_every=fail_every,
+                              token_latency=token_latency, drop_every=drop_every,
+                              eval_latency=eval_latency, ramble=ramble, load_latency=load_latency,
+                              prompt_cache_slots=prompt_cache_slots)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Ollama API server")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per /api/generate call")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer 503 to every Nth request")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="Extra seconds per prompt token, to model prompt evaluation cost")
+    parser.add_argument("--drop-every", type=int, default=0,
+                        help="Leave every Nth sender out of batched answers")
+    parser.add_argument("--eval-latency", type=float, default=0.0, help="Seconds per generated token")
+    parser.add_argument("--ramble", type=int, default=0,
+                        help="Sentences of explanation generated after the JSON unless format is json")
+    parser.add_argument("--load-latency", type=float, default=0.0,
+                        help="Seconds to load the model when it is not loaded (see keep_alive)")
+    parser.add_argument("--prompt-cache-slots", type=int, default=4,
+                        help="Recent prompts whose common prefix is not evaluated again, 0 to disable")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(("127.0.0.1", args.port), latency=args.latency, fail_every=args.fail_every,
+                              token_latency=args.token_latency, drop_every=args.drop_every,
+                              eval_latency=args.eval_latency, ramble=args.ramble,
+                              load_latency=args.load_latency, prompt_cache_slots=args.prompt_cache_slots)
+    logger.info(f"Fake Ollama listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,461 @@
+import json
+import time
+import random
+import asyncio
+import logging
+from enum import Enum
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class EOllamaModel(str, Enum):
+    Mistral = 'mistral:7b'
+    Qwen = 'Qwen2.5:7b'
+    Llama = 'llama3.2:3b'
+
+DEFAULT_OLLAMA_MODEL = EOllamaModel.Qwen
+
+LOCAL_OLLAMA_URL = 'http://localhost:11434'
+
+class OllamaError(Exception):
+    """Raised when Ollama cannot be reached or keeps failing after retries"""
+
+class HttpStatusError(OllamaError):
+    def __init__(self, status, body):
+        super().__init__(f"HTTP error! status: {status}")
+        self.status = status
+        self.body = body
+
+class StreamError(OllamaError):
+    """Error Ollama reports inside a streamed response, after its 200 status"""
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+class HttpConnectionPool:
+    """
+    Minimal asyncio HTTP/1.1 client keeping persistent keep-alive connections
+    to a single host. Only what the Ollama API needs is supported:
+    Content-Length and chunked responses, no TLS, no redirects.
+    """
+
+    def __init__(self, base_url, max_connections=8):
+        parts = urlsplit(base_url)
+        if parts.scheme != 'http':
+            raise ValueError(f"Only http:// URLs are supported, got {base_url}")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.max_connections = max_connections
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def _acquire(self):
+        await self._slots.acquire()
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.reader.at_eof() and not connection.writer.is_closing():
+                return connection
+            connection.close()
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except BaseException:
+            self._slots.release()
+            raise
+        return _Connection(reader, writer)
+
+    def _release(self, connection, reusable):
+        if reusable:
+            self._idle.append(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    async def _send(self, connection, method, path, payload):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        )
+        connection.writer.write(head.encode('ascii') + body)
+        await connection.writer.drain()
+
+    async def _read_head(self, connection):
+        status_line = await connection.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await connection.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def _iter_body(self, connection, headers):
+        """Yield raw body chunks as they arrive"""
+        reader = connection.reader
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                chunk = await reader.readexactly(size)
+                await reader.readexactly(2)
+                yield chunk
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, 65536))
+                if not chunk:
+                    raise ConnectionResetError("Connection closed before end of body")
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                yield chunk
+
+    @asynccontextmanager
+    async def stream(self, method, path, payload=None):
+        """
+        Send a JSON request and yield (status, body chunk iterator). Leaving
+        before the body is fully read closes the connection, which makes the
+        server abandon the response.
+        """
+        connection = await self._acquire()
+        state = {'finished': False}
+
+        async def chunks():
+            async for chunk in self._iter_body(connection, headers):
+                yield chunk
+            state['finished'] = True
+
+        reusable = False
+        try:
+            await self._send(connection, method, path, payload)
+            status, headers = await self._read_head(connection)
+            yield status, chunks()
+            reusable = state['finished'] and headers.get('connection', '').lower() != 'close' and (
+                'content-length' in headers or 'transfer-encoding' in headers
+            )
+        finally:
+            self._release(connection, reusable)
+
+    async def request(self, method, path, payload=None):
+        """Send a JSON request and return (status, body bytes)"""
+        async with self.stream(method, path, payload) as (status, chunks):
+            body = b''.join([chunk async for chunk in chunks])
+        return status, body
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+class JsonCompletionScanner:
+    """
+    Incrementally tracks the first top-level JSON object or array in
+    streamed text and reports when it is closed. Brackets inside strings
+    are ignored; text before the opening bracket is skipped.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, text):
+        """Consume text; return True once the value is complete"""
+        for char in text:
+            if self.complete:
+                break
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char in '{[':
+                self.started = True
+                self.depth += 1
+            elif not self.started:
+                continue
+            elif char == '"':
+                self.in_string = True
+            elif char in '}]':
+                self.depth -= 1
+                self.complete = self.depth == 0
+        return self.complete
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for in-flight requests.
+
+    With adaptive=True the limit follows an AIMD scheme: it grows by one slot
+    per window of fast responses and is halved when latency rises above
+    latency_factor times the best latency seen, or when a request fails.
+    """
+
+    def __init__(self, max_in_flight, min_in_flight=1, adaptive=False, latency_factor=2.0):
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight
+        self.adaptive = adaptive
+        self.latency_factor = latency_factor
+        self.limit = float(min_in_flight if adaptive else max_in_flight)
+        self.in_flight = 0
+        self.best_latency = None
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            while self.in_flight >= int(self.limit):
+                await self._condition.wait()
+            self.in_flight += 1
+
+    async def release(self, latency=None, ok=True):
+        async with self._condition:
+            self.in_flight -= 1
+            if self.adaptive:
+                self._adjust(latency, ok)
+            self._condition.notify_all()
+
+    def _adjust(self, latency, ok):
+        if ok and latency is not None:
+            if self.best_latency is None or latency < self.best_latency:
+                self.best_latency = latency
+            if latency <= self.best_latency * self.latency_factor:
+                self.limit = min(self.max_in_flight, self.limit + 1 / self.limit)
+                return
+        previous = int(self.limit)
+        self.limit = max(self.min_in_flight, self.limit / 2)
+        if int(self.limit) < previous:
+            logger.info(f"Reducing Ollama concurrency to {int(self.limit)}")
+
+class OllamaClient:
+    """
+    Async Ollama client with a persistent connection pool, a bounded (and
+    optionally adaptive) number of in-flight requests, per-request timeouts
+    and retries with exponential backoff.
+
+    With stream=True generations are streamed and, when early_stop is set,
+    cut as soon as a complete JSON value has arrived. num_predict caps the
+    generated tokens and json_format asks Ollama for JSON-constrained output.
+    keep_alive (e.g. "30m", -1 for ever) keeps the model loaded between calls.
+
+    The timings Ollama reports for each generation are kept in calls, to
+    check that the model stays loaded and the prompt prefix is reused. Ollama
+    only reports them at the end of a generation, so every
+    timing_sample_every-th streamed call runs to completion to keep them.
+    """
+
+    def __init__(self, base_url=LOCAL_OLLAMA_URL, model=DEFAULT_OLLAMA_MODEL, max_in_flight=4,
+                 timeout=120.0, retries=3, backoff=1.0, adaptive=False, min_in_flight=1,
+                 stream=False, early_stop=True, num_predict=None, json_format=False, keep_alive=None,
+                 timing_sample_every=0):
+        self.base_url = base_url
+        self.model = model.value if isinstance(model, EOllamaModel) else model
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = AdaptiveLimiter(max_in_flight, min_in_flight=min_in_flight, adaptive=adaptive)
+        self.pool = HttpConnectionPool(base_url, max_connections=max_in_flight)
+        self.stream = stream
+        self.early_stop = early_stop
+        self.num_predict = num_predict
+        self.json_format = json_format
+        self.keep_alive = keep_alive
+        self.timing_sample_every = timing_sample_every
+        self.requests = 0
+        self.failures = 0
+        self.early_stops = 0
+        self.calls = []
+        self.warmup_call = None
+
+    async def _post(self, path, payload, early_stop=None):
+        if payload.get("stream"):
+            return await self._post_stream(path, payload, self.early_stop if early_stop is None else early_stop)
+        status, body = await self.pool.request('POST', path, payload)
+        if status >= 400:
+            raise HttpStatusError(status, body)
+        return json.loads(body)
+
+    async def _post_stream(self, path, payload, early_stop):
+        """
+        Read a streamed NDJSON generation and return it in the shape of a
+        non-streamed response. Stops reading, and thereby cancels the
+        generation, once the JSON answer is complete if early_stop is set.
+        """
+        scanner = JsonCompletionScanner() if early_stop else None
+        pieces = []
+        final = {}
+        started = time.monotonic()
+        first_token = None
+        async with self.pool.stream('POST', path, payload) as (status, chunks):
+            if status >= 400:
+                raise HttpStatusError(status, b''.join([chunk async for chunk in chunks]))
+            buffer = b''
+            async for chunk in chunks:
+                buffer += chunk
+                lines = buffer.split(b'\n')
+                buffer = lines.pop()
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    message = json.loads(line)
+                    if message.get("error"):
+                        raise StreamError(f"Ollama error: {message['error']}")
+                    pieces.append(message.get("response", ""))
+                    if first_token is None and pieces[-1]:
+                        first_token = time.monotonic() - started
+                    if message.get("done"):
+                        final = message
+                        break
+                    if scanner is not None and scanner.feed(pieces[-1]):
+                        self.early_stops += 1
+                        # Ollama only reports timings in the last message, which we skip
+                        final = {**message, "done": True, "done_reason": "early_stop"}
+                        break
+                if final:
+                    break
+        if not final:
+            raise ConnectionResetError("Stream ended before generation was done")
+        response = {**final, "response": "".join(pieces)}
+        if first_token is not None:
+            response["time_to_first_token"] = int(first_token * 1e9)
+        return response
+
+    async def generate(self, prompt, num_predict=None, json_format=None, **options):
+        """
+        Call /api/generate and return the decoded response. num_predict and
+        json_format default to the client settings; other keyword arguments
+        are added to the request payload.
+        """
+        payload = {"model": self.model, "prompt": prompt, "stream": self.stream}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        num_predict = num_predict if num_predict is not None else self.num_predict
+        if num_predict:
+            payload["options"] = {"num_predict": num_predict}
+        if json_format if json_format is not None else self.json_format:
+            payload["format"] = "json"
+        for key, value in options.items():
+            if key == "options":
+                payload.setdefault("options", {}).update(value)
+            else:
+                payload[key] = value
+        # Let a sample of calls finish so Ollama reports their timings
+        early_stop = self.early_stop and not (
+            self.timing_sample_every and len(self.calls) % self.timing_sample_every == 0
+        )
+        started = time.monotonic()
+        response = await self.call('/api/generate', payload, early_stop=early_stop)
+        self._record(response, time.monotonic() - started)
+        return response
+
+    def _record(self, response, elapsed):
+        """Keep the timings of one generation, in milliseconds"""
+        def ms(key):
+            value = response.get(key)
+            return round(value / 1e6, 1) if isinstance(value, (int, float)) else None
+
+        self.calls.append({
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "load_duration_ms": ms("load_duration"),
+            "prompt_eval_count": response.get("prompt_eval_count"),
+            "prompt_eval_duration_ms": ms("prompt_eval_duration"),
+            "eval_count": response.get("eval_count"),
+            "eval_duration_ms": ms("eval_duration"),
+            "time_to_first_token_ms": ms("time_to_first_token"),
+            "done_reason": response.get("done_reason")
+        })
+
+    def call_summary(self):
+        """Averages of the recorded timings, over the calls that reported them"""
+        summary = {"calls": len(self.calls)}
+        for key in ("elapsed_ms", "load_duration_ms", "prompt_eval_count", "prompt_eval_duration_ms",
+                    "eval_count", "time_to_first_token_ms"):
+            values = [call[key] for call in self.calls if call[key] is not None]
+            summary[f"mean_{key}"] = round(sum(values) / len(values), 1) if values else None
+        return summary
+
+    async def warmup(self, prompt=""):
+        """
+        Load the model (and, given the static prompt prefix, fill the server's
+        prompt cache) before real requests arrive. Returns the load duration
+        in milliseconds, or None when the warmup failed.
+        """
+        try:
+            response = await self.generate(prompt, num_predict=1, json_format=False)
+        except OllamaError as e:
+            logger.warning(f"Ollama warmup failed: {str(e)}")
+            return None
+        # Kept apart so it does not skew the averages of real calls
+        self.warmup_call = self.calls.pop()
+        logger.info(f"Warmed up {self.model}: load {self.warmup_call['load_duration_ms']} ms, "
+                    f"prompt eval {self.warmup_call['prompt_eval_duration_ms']} ms "
+                    f"for {response.get('prompt_eval_count')} tokens")
+        return self.warmup_call["load_duration_ms"]
+
+    async def call(self, path, payload, early_stop=None):
+        """POST payload to path with concurrency limiting, timeout and retries"""
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logger.warning(f"Retrying Ollama request in {delay:.1f}s ({attempt}/{self.retries}): {last_error}")
+                await asyncio.sleep(delay)
+
+            await self.limiter.acquire()
+            started = time.monotonic()
+            ok = False
+            try:
+                self.requests += 1
+                response = await asyncio.wait_for(self._post(path, payload, early_stop), self.timeout)
+                ok = True
+                return response
+            except HttpStatusError as e:
+                last_error = e
+                # Client errors will not get better by retrying
+                if e.status < 500 and e.status != 429:
+                    raise
+            # A StreamError is a server side failure, like a 5xx sent before streaming began
+            except (StreamError, asyncio.TimeoutError, OSError, ValueError, asyncio.IncompleteReadError) as e:
+                last_error = e if str(e) else type(e).__name__
+            finally:
+                await self.limiter.release(time.monotonic() - started, ok)
+
+        self.failures += 1
+        raise OllamaError(f"Ollama request failed after {self.retries + 1} attempts: {last_error}")
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
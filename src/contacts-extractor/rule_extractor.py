@@ -0,0 +1,209 @@
+"""
+Deterministic contact extraction for regular signatures.
+
+Applies the extraction rules of prompt.py that need no judgement (French
+phone numbers, postcodes, emails, URLs, company from the sender's domain)
+with precompiled patterns, so senders whose signature resolves completely
+never reach the LLM.
+"""
+
+import re
+
+# Free and ISP mailboxes say nothing about the sender's company
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "outlook.com", "outlook.fr", "hotmail.com", "hotmail.fr",
+    "live.com", "live.fr", "msn.com", "yahoo.com", "yahoo.fr", "icloud.com", "me.com",
+    "aol.com", "gmx.fr", "gmx.com", "protonmail.com", "proton.me", "orange.fr", "wanadoo.fr",
+    "free.fr", "sfr.fr", "neuf.fr", "laposte.net", "bbox.fr", "numericable.fr"
+}
+
+# Contact record fields that must be filled for a sender to skip the LLM;
+# "phone" is satisfied by either a landline or a mobile number
+REQUIRED_FIELDS = ("full_name", "company", "phone")
+
+# +33 1 23 45 67 89, 0033 (0)1..., 01.23.45.67.89, 01 23 45 67 89, 0123456789
+PHONE = re.compile(
+    r"(?<![\d+])(?:(?:\+|00)33\s?(?:\(0\)\s?)?|0)([1-79])((?:[\s.\-]?\d{2}){4})(?!\d)"
+)
+FAX_LABEL = re.compile(r"\bfax\b|\bt[ée]l[ée]copie\b", re.IGNORECASE)
+MOBILE_LABEL = re.compile(r"\b(mobile?|portable|port\.?|gsm|cell)\b", re.IGNORECASE)
+
+EMAIL = re.compile(r"[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+")
+URL = re.compile(r"\b(?:https?://)?(?:www\.)([\w\-]+(?:\.[\w\-]+)+)", re.IGNORECASE)
+
+# Metropolitan and overseas postcodes followed by the city, optionally CEDEX
+POSTCODE_CITY = re.compile(
+    r"(?:^|[\s,\-])(?:F-)?((?:0[1-9]|[1-8]\d|9[0-5]|97|98)\d{3})\s+"
+    r"([A-Za-zÀ-ÿ][A-Za-zÀ-ÿ'\- ]*?)(?:\s+cedex(?:\s*\d{1,2})?)?\s*(?:,?\s*(France))?\s*$",
+    re.IGNORECASE
+)
+STREET = re.compile(
+    r"^\s*(\d{1,4}\s*(?:bis|ter)?,?\s+"
+    r"(?:rue|avenue|av\.|boulevard|bd|place|pl\.|chemin|all[ée]e|impasse|route|quai|cours|square|parvis|esplanade)"
+    r"\b.*?)\s*,?\s*$",
+    re.IGNORECASE
+)
+
+LEGAL_FORM = re.compile(r"\b(SAS|SASU|SARL|EURL|SA|SCI|SCOP|GIE|GmbH|Ltd|Inc|LLC)\b")
+
+DEPARTMENTS = [
+    ("Commercial", re.compile(r"\b(service |direction )?commercia(l|le|ux)\b|\bventes?\b|\bsales\b", re.IGNORECASE)),
+    ("RH", re.compile(r"\bRH\b|ressources humaines|\bHR\b|human resources", re.IGNORECASE)),
+    ("IT", re.compile(r"\bIT\b|\bDSI\b|informatique", re.IGNORECASE)),
+    ("Comptabilité", re.compile(r"comptab|\bfinance|\bDAF\b", re.IGNORECASE)),
+    ("Marketing", re.compile(r"\bmarketing\b|\bcommunication\b", re.IGNORECASE)),
+    ("Achats", re.compile(r"\bachats?\b|\bpurchasing\b", re.IGNORECASE)),
+    ("Logistique", re.compile(r"\blogistique\b|\bsupply chain\b", re.IGNORECASE)),
+    ("Juridique", re.compile(r"\bjuridique\b|\blegal\b", re.IGNORECASE)),
+]
+
+def format_phone(first_digit, rest):
+    """Normalize a French number to +33 X XX XX XX XX"""
+    digits = re.sub(r"\D", "", rest)
+    return "+33 " + first_digit + " " + " ".join(digits[i:i + 2] for i in range(0, 8, 2))
+
+def extract_phones(text):
+    """Return (landline, mobile), the first of each found outside fax lines"""
+    landline = None
+    mobile = None
+    for line in text.split("\n"):
+        label_start = 0
+        for match in PHONE.finditer(line):
+            # A label is the text between the previous number and this one
+            label = line[label_start:match.start()]
+            label_start = match.end()
+            if FAX_LABEL.search(label):
+                continue
+            number = format_phone(match.group(1), match.group(2))
+            if match.group(1) in "67":
+                mobile = mobile or number
+            elif MOBILE_LABEL.search(label) and not mobile:
+                mobile = number
+            else:
+                landline = landline or number
+    return landline, mobile
+
+def extract_address(text):
+    """Street from the line before "<postcode> <city>", postcode and city"""
+    lines = [line.strip() for line in text.split("\n")]
+    for position, line in enumerate(lines):
+        match = POSTCODE_CITY.search(line)
+        if not match:
+            continue
+        postal_code, city, country = match.group(1), match.group(2).strip(" -'"), match.group(3)
+        street = None
+        same_line = STREET.match(line[:match.start()])
+        if same_line:
+            street = same_line.group(1)
+        elif position and STREET.match(lines[position - 1]):
+            street = STREET.match(lines[position - 1]).group(1)
+        parts = [part for part in (street, f"{postal_code} {city}", country) if part]
+        return {
+            "street": street,
+            "city": city,
+            "postal_code": postal_code,
+            "country": country.capitalize() if country else None,
+            "full_address": ", ".join(parts)
+        }
+    return None
+
+def _domain_of(address):
+    return address.rsplit("@", 1)[-1].lower() if address and "@" in address else None
+
+def _squash(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+def extract_company(text, sender_email):
+    """
+    Company named in the signature when it matches the sender's (or the
+    signature URL's) domain or carries a legal form, else the domain itself.
+    """
+    domain = _domain_of(sender_email)
+    if domain in FREE_MAIL_DOMAINS:
+        domain = None
+    if not domain:
+        url = URL.search(text)
+        domain = url.group(1).lower() if url else None
+    if not domain:
+        return None
+
+    label = domain.split(".")[-2] if "." in domain else domain
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line or len(line) > 60:
+            continue
+        if _squash(line) == _squash(label) or (LEGAL_FORM.search(line) and _squash(label) in _squash(line)):
+            return line
+    return label.replace("-", " ").replace("_", " ").upper()
+
+def split_name(sender_name, sender_email):
+    """(first, last) from the display name, or from a first.last mailbox"""
+    name = (sender_name or "").strip().strip("'\"")
+    if name and "@" not in name:
+        if "," in name:
+            last, _, first = name.partition(",")
+            return first.strip() or None, last.strip() or None
+        words = name.split()
+        if len(words) == 1:
+            return words[0], None
+        # "HUET Elodie": an all-caps surname first
+        if words[0].isupper() and not words[-1].isupper():
+            return " ".join(words[1:]), words[0]
+        return words[0], " ".join(words[1:])
+
+    local = (sender_email or "").split("@")[0]
+    parts = [part for part in re.split(r"[._\-]", local) if part.isalpha()]
+    if len(parts) == 2:
+        return parts[0].capitalize(), parts[1].capitalize()
+    return None, None
+
+def extract_department(text):
+    for name, pattern in DEPARTMENTS:
+        if pattern.search(text):
+            return name
+    return None
+
+def extract_with_rules(email):
+    """Extract an ExtractedContactInfo object from an email without the LLM"""
+    text = (email.get("body") or "").replace("\r\n", "\n")
+    sender_email = email.get("senderEmail") or None
+    if not sender_email:
+        found = EMAIL.search(text)
+        sender_email = found.group(0) if found else None
+
+    first_name, last_name = split_name(email.get("senderName"), sender_email)
+    full_name = " ".join(part for part in (first_name, last_name) if part) or None
+    landline, mobile = extract_phones(text)
+
+    return {
+        "contact": {
+            "first_name": first_name,
+            "last_name": last_name,
+            "full_name": full_name,
+            "department": extract_department(text)
+        },
+        "company": extract_company(text, sender_email),
+        "contact_info": {
+            "primary_email": sender_email,
+            "landline_phone": landline,
+            "mobile_phone": mobile
+        },
+        "address": extract_address(text) or {
+            "street": None,
+            "city": None,
+            "postal_code": None,
+            "country": None,
+            "full_address": None
+        }
+    }
+
+def missing_fields(contact, required_fields=REQUIRED_FIELDS):
+    """Required fields still empty in a flattened contact record"""
+    missing = []
+    for field in required_fields:
+        if field == "phone":
+            if not (contact.get("landline_phone") or contact.get("mobile_phone")):
+                missing.append(field)
+        elif not contact.get(field):
+            missing.append(field)
+    return missing
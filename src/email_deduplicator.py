@@ -1,9 +1,20 @@
 import os
 import json
+import zlib
+import heapq
+import shutil
 import logging
+import argparse
+import tempfile
+import textwrap
 from pathlib import Path
-from collections import defaultdict
 from datetime import datetime
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from jsonl_stream import iter_email_file, list_email_files
+from email_record import EmailRecord, json_default
+from ingestion_manifest import IngestionManifest, MANIFEST_FILE, iter_ranges
 
 # Set up logging
 logging.basicConfig(
@@ -12,65 +23,268 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def load_json_files(directory):
-    """Load all JSON files from a directory and return combined email list"""
-    emails = []
-    json_files = list(Path(directory).glob("*.json"))
-    
-    for json_file in json_files:
+def iter_json_files(directory, manifest=None):
+    """
+    Lazily yield emails from all processor output files in a directory.
+    Supports legacy JSON arrays as well as (compressed) JSONL shards.
+    With manifest (the IngestionManifest of the processor that wrote the
+    directory), shards it retired are skipped and the shards it tracks are
+    read only within the line ranges of current inputs. Files the manifest
+    does not know, such as output of non-incremental runs, are read whole.
+    """
+    live = manifest.live_ranges() if manifest else {}
+    retired = set(manifest.retired) - set(live) if manifest else set()
+    skipped = 0
+
+    for email_file in list_email_files(directory):
+        if email_file.name in retired:
+            skipped += 1
+            continue
+        emails = iter_email_file(email_file)
+        if email_file.name in live:
+            emails = iter_ranges(emails, live[email_file.name])
+        count = 0
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    emails.extend(data)
-                    logger.info(f"Loaded {len(data)} emails from {json_file.name}")
-                else:
-                    logger.warning(f"JSON file {json_file.name} does not contain a list")
+            for email in emails:
+                count += 1
+                yield email
+            logger.info(f"Loaded {count} emails from {email_file.name}")
         except Exception as e:
-            logger.error(f"Error loading {json_file}: {str(e)}")
+            logger.error(f"Error loading {email_file}: {str(e)}")
+
+    if skipped:
+        logger.info(f"Skipped {skipped} shards superseded by re-processed inputs in {directory}")
+
+def load_json_files(directory, manifest=None):
+    """Load all JSON files from a directory and return combined email list"""
+    return list(iter_json_files(directory, manifest))
+
+def normalize_sender(email):
+    """Normalized sender address used as the deduplication key"""
+    return (email.get('senderEmail') or '').strip().lower()
+
+def _is_later(record, winner):
+    """
+    True if record was sent after winner, both EmailRecords, whose send dates
+    come from sentTimestamp or, in output written without it, sentAt.
+    Unknown dates never win.
+    """
+    if record.sent is None:
+        return False
+    return winner.sent is None or record.sent > winner.sent
+
+def _partition_of(sender_email, partitions):
+    """Stable partition number for a sender (Python's hash() is salted per process)"""
+    return zlib.crc32(sender_email.encode('utf-8')) % partitions
+
+def _dedup_partition(partition_path, keep="first"):
+    """
+    Keep the first (or with keep="latest", the most recent) record per sender
+    in one spilled partition. Winners are written next to the partition,
+    sorted by the arrival order of their sender's first record.
+    """
+    winners = {}
+    with open(partition_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            seq, sender_email, email = json.loads(line)
+            if sender_email not in winners:
+                winners[sender_email] = (seq, EmailRecord.from_dict(email).compact())
+            elif keep == "latest":
+                record = EmailRecord.from_dict(email)
+                if _is_later(record, winners[sender_email][1]):
+                    winners[sender_email] = (winners[sender_email][0], record.compact())
+    
+    winners_path = partition_path.with_suffix('.winners.jsonl')
+    with open(winners_path, 'w', encoding='utf-8') as f:
+        for seq, email in sorted(winners.values(), key=lambda item: item[0]):
+            f.write(json.dumps([seq, email], ensure_ascii=False, default=json_default))
+            f.write('\n')
     
-    return emails
+    partition_path.unlink()
+    return winners_path, len(winners)
 
-def deduplicate_emails(emails):
+def _iter_winners(winners_path):
+    with open(winners_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+class StreamingDeduplicator:
     """
-    Deduplicate emails by sender email address.
-    Keep only the first email from each sender.
+    Deduplicate a stream of emails by sender, keeping the first email per
+    sender, or with keep="latest" the most recent one by sentTimestamp (the
+    sender keeps the position of its first email).
+
+    Only the current winner per sender is held in memory, as a compacted
+    EmailRecord whatever form the email was fed in. Once more than
+    max_senders distinct senders have been seen, winners and all further
+    emails are spilled to disk in partitions keyed by a hash of the normalized
+    sender address; partitions are then deduplicated independently (in
+    parallel with workers > 1) and merged back in first-seen order, so the
+    result is the same as the in-memory path.
     """
-    logger.info(f"Starting deduplication of {len(emails)} emails")
+
+    def __init__(self, max_senders=100000, partitions=64, workers=1, spill_dir=None, keep="first"):
+        self.max_senders = max_senders
+        self.keep = keep
+        self.partitions = partitions
+        self.workers = workers
+        self.spill_dir = spill_dir
+        self.total = 0
+        self.without_sender = 0
+        self._seq = 0
+        self._winners = {}
+        self._partition_dir = None
+        self._partition_files = None
+        self._unique = None
     
-    # Group emails by sender email
-    email_groups = defaultdict(list)
+    @property
+    def spilled(self):
+        return self._partition_dir is not None
     
-    for email in emails:
-        sender_email = email.get('senderEmail', '').strip().lower()
-        if sender_email:  # Only process emails with valid sender email
-            email_groups[sender_email].append(email)
-        else:
-            logger.warning(f"Email without sender email: {email.get('subject', 'No subject')}")
+    def _spill(self):
+        self._partition_dir = Path(tempfile.mkdtemp(prefix="dedup_", dir=self.spill_dir))
+        self._partition_files = [
+            open(self._partition_dir / f"partition_{i:04d}.jsonl", 'w', encoding='utf-8')
+            for i in range(self.partitions)
+        ]
+        logger.info(f"More than {self.max_senders} unique senders, spilling to {self.partitions} partitions in {self._partition_dir}")
+        
+        winners = sorted(self._winners.items(), key=lambda item: item[1][0])
+        self._winners = {}
+        for sender_email, (seq, email) in winners:
+            self._write_partition(seq, sender_email, email)
     
-    # Keep only the first email from each sender
-    deduplicated_emails = []
-    duplicate_count = 0
+    def _write_partition(self, seq, sender_email, email):
+        f = self._partition_files[_partition_of(sender_email, self.partitions)]
+        f.write(json.dumps([seq, sender_email, email], ensure_ascii=False, default=json_default))
+        f.write('\n')
     
-    for sender_email, sender_emails in email_groups.items():
-        if len(sender_emails) > 1:
-            duplicate_count += len(sender_emails) - 1
-            logger.debug(f"Found {len(sender_emails)} emails from {sender_email}, keeping first one")
+    def add(self, email):
+        """Feed one email to the deduplicator"""
+        self.total += 1
+        sender_email = normalize_sender(email)
+        if not sender_email:
+            self.without_sender += 1
+            logger.warning(f"Email without sender email: {email.get('subject', 'No subject')}")
+            return
+        
+        self._seq += 1
+        if self.spilled:
+            self._write_partition(self._seq, sender_email, email)
+        elif sender_email not in self._winners:
+            self._winners[sender_email] = (self._seq, EmailRecord.from_dict(email).compact())
+            if self.max_senders and len(self._winners) > self.max_senders:
+                self._spill()
+        elif self.keep == "latest":
+            record = EmailRecord.from_dict(email)
+            seq, winner = self._winners[sender_email]
+            if _is_later(record, winner):
+                self._winners[sender_email] = (seq, record.compact())
+    
+    def _merge_partitions(self):
+        for f in self._partition_files:
+            f.close()
+        partition_paths = [Path(f.name) for f in self._partition_files]
+        
+        dedup_partition = partial(_dedup_partition, keep=self.keep)
+        if self.workers and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(dedup_partition, partition_paths))
+        else:
+            results = [dedup_partition(path) for path in partition_paths]
         
-        # Keep the first email (you could add logic here to keep the most recent instead)
-        deduplicated_emails.append(sender_emails[0])
+        self._unique = sum(count for _, count in results)
+        merged = heapq.merge(*(_iter_winners(path) for path, _ in results), key=lambda item: item[0])
+        for seq, email in merged:
+            yield email
+    
+    def results(self):
+        """Yield the winning email per sender, in first-seen order"""
+        try:
+            if self.spilled:
+                yield from self._merge_partitions()
+            else:
+                self._unique = len(self._winners)
+                for seq, email in self._winners.values():
+                    yield email
+        finally:
+            self.close()
+    
+    @property
+    def unique_senders(self):
+        return self._unique if self._unique is not None else len(self._winners)
+    
+    @property
+    def duplicates_removed(self):
+        return self.total - self.without_sender - self.unique_senders
+    
+    def close(self):
+        """Release spilled partitions"""
+        if self._partition_dir is not None:
+            for f in self._partition_files:
+                f.close()
+            shutil.rmtree(self._partition_dir, ignore_errors=True)
+            self._partition_dir = None
+        self._winners = {}
+
+def deduplicate_emails(emails, max_senders=100000, partitions=64, workers=1):
+    """
+    Deduplicate emails by sender email address.
+    Keep only the first email from each sender.
+    """
+    logger.info("Starting deduplication")
+    
+    deduplicator = StreamingDeduplicator(max_senders=max_senders, partitions=partitions, workers=workers)
+    for email in emails:
+        deduplicator.add(email)
+    deduplicated_emails = list(deduplicator.results())
     
-    logger.info(f"Deduplication completed: {len(deduplicated_emails)} unique senders, {duplicate_count} duplicates removed")
+    logger.info(f"Deduplication completed: {len(deduplicated_emails)} unique senders, {deduplicator.duplicates_removed} duplicates removed")
     
     return deduplicated_emails
 
-def process_deduplication():
+def write_json_array(records, output_file):
+    """Stream records to a file formatted like json.dump(records, indent=2) and return the count"""
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write('[\n' if count == 0 else ',\n')
+            f.write(textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False, default=json_default), '  '))
+            count += 1
+        f.write('\n]' if count else '[]')
+    return count
+
+def deduplicate_store(store, metrics=None, keep="first"):
+    """Deduplicate the emails of an EmailStore by sender, as an indexed query"""
+    total, unique_count = store.deduplicate(keep)
+    if not total:
+        logger.warning(f"No emails found to process in {store.path}")
+        return 0
+    
+    logger.info(f"Deduplication completed: {unique_count} unique senders, {total - unique_count} duplicates removed")
+    if metrics:
+        metrics.count("dedup", "input_emails", total)
+        metrics.count("dedup", "unique_senders", unique_count)
+        metrics.count("dedup", "duplicates", total - unique_count)
+    return unique_count
+
+def process_deduplication(max_senders=100000, partitions=64, workers=1, metrics=None, store=None, keep="first"):
     """
     Main function to process deduplication:
-    1. Load emails from both output directories
-    2. Deduplicate by sender email
+    1. Stream emails from both output directories, leaving out records
+       superseded according to the processors' ingestion manifests
+    2. Deduplicate by sender email, spilling to disk past max_senders senders
     3. Save deduplicated results
+    keep="first" keeps each sender's first email, MSG emails first; with
+    keep="latest" the most recent email per sender wins instead.
+    With metrics (a RunMetrics), input and output counts are recorded under
+    the "dedup" stage.
+    With store (an EmailStore), its emails are deduplicated in place instead
+    (see deduplicate_store) and no JSON files are read or written.
     """
+    if store:
+        return deduplicate_store(store, metrics, keep)
+    
     # Define paths
     msg_output_dir = Path("src/msg-processor/output")
     pst_output_dir = Path("src/pst-processor/output")
@@ -79,63 +293,90 @@ def process_deduplication():
     # Ensure contacts directory exists
     contacts_dir.mkdir(parents=True, exist_ok=True)
     
-    # Load emails from both directories
-    all_emails = []
+    deduplicator = StreamingDeduplicator(max_senders=max_senders, partitions=partitions, workers=workers, keep=keep)
     
-    if msg_output_dir.exists():
-        msg_emails = load_json_files(msg_output_dir)
-        all_emails.extend(msg_emails)
-        logger.info(f"Loaded {len(msg_emails)} emails from MSG processor")
-    else:
-        logger.warning(f"MSG output directory {msg_output_dir} does not exist")
-    
-    if pst_output_dir.exists():
-        pst_emails = load_json_files(pst_output_dir)
-        all_emails.extend(pst_emails)
-        logger.info(f"Loaded {len(pst_emails)} emails from PST processor")
-    else:
-        logger.warning(f"PST output directory {pst_output_dir} does not exist")
+    # Stream emails from both directories
+    for label, output_dir in (("MSG", msg_output_dir), ("PST", pst_output_dir)):
+        if output_dir.exists():
+            loaded = deduplicator.total
+            # Incremental runs leave superseded records behind until compaction
+            manifest_path = output_dir.parent / MANIFEST_FILE
+            manifest = IngestionManifest(manifest_path) if manifest_path.exists() else None
+            for email in iter_json_files(output_dir, manifest):
+                deduplicator.add(email)
+            logger.info(f"Loaded {deduplicator.total - loaded} emails from {label} processor")
+        else:
+            logger.warning(f"{label} output directory {output_dir} does not exist")
     
-    if not all_emails:
+    if not deduplicator.total:
         logger.warning("No emails found to process")
         return 0
     
-    logger.info(f"Total emails loaded: {len(all_emails)}")
+    logger.info(f"Total emails loaded: {deduplicator.total}")
     
-    # Deduplicate emails
-    deduplicated_emails = deduplicate_emails(all_emails)
+    # Save deduplicated emails as they come out of the deduplicator
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = contacts_dir / f"deduplicated_emails_{timestamp}.json"
     
-    # Save deduplicated emails
-    if deduplicated_emails:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = contacts_dir / f"deduplicated_emails_{timestamp}.json"
+    try:
+        unique_count = write_json_array(deduplicator.results(), output_file)
         
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(deduplicated_emails, f, indent=2, ensure_ascii=False)
-            
-            logger.info(f"Saved {len(deduplicated_emails)} deduplicated emails to {output_file}")
-            
-            # Also save a summary
-            summary = {
-                "total_emails_processed": len(all_emails),
-                "unique_senders": len(deduplicated_emails),
-                "duplicates_removed": len(all_emails) - len(deduplicated_emails),
-                "timestamp": timestamp
-            }
-            
-            summary_file = contacts_dir / f"deduplication_summary_{timestamp}.json"
-            with open(summary_file, 'w', encoding='utf-8') as f:
-                json.dump(summary, f, indent=2)
-            
-            logger.info(f"Saved deduplication summary to {summary_file}")
-            
-        except Exception as e:
-            logger.error(f"Error saving deduplicated emails: {str(e)}")
+        if not unique_count:
+            output_file.unlink()
             return 0
+        
+        logger.info(f"Deduplication completed: {unique_count} unique senders, {deduplicator.duplicates_removed} duplicates removed")
+        if metrics:
+            metrics.count("dedup", "input_emails", deduplicator.total)
+            metrics.count("dedup", "unique_senders", unique_count)
+            metrics.count("dedup", "duplicates", deduplicator.duplicates_removed)
+            metrics.count("dedup", "without_sender", deduplicator.without_sender)
+        logger.info(f"Saved {unique_count} deduplicated emails to {output_file}")
+        
+        # Also save a summary
+        summary = {
+            "total_emails_processed": deduplicator.total,
+            "unique_senders": unique_count,
+            "duplicates_removed": deduplicator.total - unique_count,
+            "timestamp": timestamp
+        }
+        
+        summary_file = contacts_dir / f"deduplication_summary_{timestamp}.json"
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        
+        logger.info(f"Saved deduplication summary to {summary_file}")
+        
+    except Exception as e:
+        logger.error(f"Error saving deduplicated emails: {str(e)}")
+        return 0
     
-    return len(deduplicated_emails)
+    return unique_count
+
+def parse_args(argv=None):
+    # email_store imports this module for normalize_sender
+    from email_store import DEFAULT_STORE_PATH
+    
+    parser = argparse.ArgumentParser(description="Deduplicate extracted emails by sender")
+    parser.add_argument("--max-senders", type=int, default=100000,
+                        help="Unique senders kept in memory before spilling to disk (0 = never spill)")
+    parser.add_argument("--partitions", type=int, default=64,
+                        help="Number of on-disk partitions used after spilling")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes used to deduplicate spilled partitions")
+    parser.add_argument("--store", nargs="?", const=str(DEFAULT_STORE_PATH), default=None,
+                        help="Deduplicate the SQLite email store (optionally at this path) instead of the JSON output")
+    parser.add_argument("--keep", choices=["first", "latest"], default="first",
+                        help="Keep each sender's first email, or its most recent one by delivery time")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    result = process_deduplication()
-    print(f"Processed {result} unique emails")
\ No newline at end of file
+    from email_store import EmailStore
+    
+    args = parse_args()
+    store = EmailStore(args.store) if args.store else None
+    result = process_deduplication(max_senders=args.max_senders, partitions=args.partitions, workers=args.workers,
+                                   store=store, keep=args.keep)
+    if store:
+        store.close()
+    print(f"Processed {result} unique emails")
@@ -0,0 +1,197 @@
+"""
+Compact in-memory form of an extracted email.
+
+The processors emit EmailRecord objects instead of dicts. A record has no
+per-instance dict, shares one string object per sender address and name
+(interned), keeps the send date as integer epoch seconds (also written out
+as the sortable sentTimestamp), and can hold its
+body zlib-compressed once it is retained (see compact()). It behaves as a
+mapping with the keys of the processors' JSON schema, so code written for
+dicts keeps working; use json_default (or to_dict()) to serialize it.
+"""
+
+import sys
+import zlib
+import calendar
+from datetime import datetime, timedelta, timezone
+from collections.abc import MutableMapping
+
+FIELDS = ("subject", "messageId", "senderName", "senderEmail", "body", "sentAt", "sentTimestamp")
+SENT_AT_FORMAT = "%d/%m/%Y - %Hh%M"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# compact() leaves shorter bodies alone, compression would not pay for itself
+COMPRESS_BODY_CHARS = 256
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else ""
+
+def encode_date(value):
+    """
+    (epoch seconds, UTC offset in minutes, text) of a datetime or sentAt
+    string. Naive datetimes and sentAt strings are taken as UTC, like pypff
+    delivery times; other values are kept as their text.
+    """
+    if value is None or value == "":
+        return None, 0, None
+    try:
+        if isinstance(value, str):
+            value = datetime.strptime(value, SENT_AT_FORMAT)
+        if isinstance(value, datetime):
+            offset = value.utcoffset()
+            if offset is None:
+                return calendar.timegm(value.timetuple()), 0, None
+            return int(value.timestamp()), int(offset.total_seconds() // 60), None
+    except (ValueError, OverflowError, OSError):
+        pass
+    return None, 0, str(value)
+
+def format_sent(sent, offset=0):
+    """sentAt string of epoch seconds, in the sender's original time zone"""
+    return (EPOCH + timedelta(seconds=sent, minutes=offset)).strftime(SENT_AT_FORMAT)
+
+class EmailRecord(MutableMapping):
+    """
+    One email, readable and writable as a mapping with the JSON schema keys
+    (subject, messageId, senderName, senderEmail, body, sentAt,
+    sentTimestamp). sentAt is the send date in the sender's time zone,
+    sentTimestamp the same instant as UTC epoch seconds. Other keys, such as
+    the PST body locator, are kept in a small side dict. source_file, the
+    PST or MSG file the email was read from, is not part of the mapping.
+    """
+
+    __slots__ = ("subject", "message_id", "sender_name", "sender_email", "_body", "sent", "_sent_offset",
+                 "_sent_text", "_extra", "source_file")
+
+    def __init__(self, subject="", message_id="", sender_name="", sender_email="", body="", sent=None,
+                 extra=None):
+        self.subject = subject or ""
+        self.message_id = message_id or ""
+        self.sender_name = _intern(sender_name)
+        self.sender_email = _intern(sender_email)
+        self._body = body or ""
+        self.sent, self._sent_offset, self._sent_text = encode_date(sent)
+        self._extra = dict(extra) if extra else None
+        self.source_file = None
+
+    @classmethod
+    def from_dict(cls, email):
+        """Record of an email in the JSON schema; records are returned as is"""
+        if isinstance(email, cls):
+            return email
+        extra = {key: value for key, value in email.items() if key not in FIELDS}
+        record = cls(email.get("subject"), email.get("messageId"), email.get("senderName"),
+                     email.get("senderEmail"), email.get("body"), email.get("sentAt"), extra)
+        timestamp = email.get("sentTimestamp")
+        if isinstance(timestamp, int):
+            if record.sent is not None:
+                # sentAt was read back as UTC and without seconds; the difference,
+                # to the quarter hour, is the sender's offset
+                record._sent_offset = round((record.sent - timestamp) / 900) * 15
+            record.sent = timestamp
+        return record
+
+    @property
+    def body(self):
+        if isinstance(self._body, bytes):
+            return zlib.decompress(self._body).decode("utf-8")
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value or ""
+
+    @property
+    def sent_at(self):
+        """Send date in the sentAt format, None if unknown"""
+        if self.sent is None or self._sent_text is not None:
+            return self._sent_text
+        return format_sent(self.sent, self._sent_offset)
+
+    def compact(self):
+        """Compress a long body in place, for records held in memory until the end of a run"""
+        if isinstance(self._body, str) and len(self._body) >= COMPRESS_BODY_CHARS:
+            compressed = zlib.compress(self._body.encode("utf-8"), 1)
+            if len(compressed) < len(self._body):
+                self._body = compressed
+        return self
+
+    def to_dict(self):
+        return {key: self[key] for key in self}
+
+    def __getitem__(self, key):
+        if key == "subject":
+            return self.subject
+        if key == "messageId":
+            return self.message_id
+        if key == "senderName":
+            return self.sender_name
+        if key == "senderEmail":
+            return self.sender_email
+        if key == "body":
+            return self.body
+        if key == "sentAt":
+            return self.sent_at
+        if key == "sentTimestamp":
+            return self.sent
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key == "subject":
+            self.subject = value or ""
+        elif key == "messageId":
+            self.message_id = value or ""
+        elif key == "senderName":
+            self.sender_name = _intern(value)
+        elif key == "senderEmail":
+            self.sender_email = _intern(value)
+        elif key == "body":
+            self.body = value
+        elif key == "sentAt":
+            self.sent, self._sent_offset, self._sent_text = encode_date(value)
+        elif key == "sentTimestamp":
+            self.sent = value
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in FIELDS:
+            raise KeyError(f"{key} is part of the email schema and cannot be removed")
+        if self._extra is None:
+            raise KeyError(key)
+        del self._extra[key]
+        if not self._extra:
+            self._extra = None
+
+    def __iter__(self):
+        yield from FIELDS
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return len(FIELDS) + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self):
+        return f"EmailRecord({self.sender_email!r}, {self.subject[:40]!r}, {self.sent_at!r})"
+
+    def __reduce__(self):
+        # Sent to and from worker processes; the receiving side interns the sender again
+        return _restore, tuple(getattr(self, slot) for slot in self.__slots__)
+
+def _restore(*state):
+    record = EmailRecord.__new__(EmailRecord)
+    for slot, value in zip(EmailRecord.__slots__, state):
+        setattr(record, slot, value)
+    record.sender_name = _intern(record.sender_name)
+    record.sender_email = _intern(record.sender_email)
+    return record
+
+def json_default(value):
+    """json.dumps default= hook writing EmailRecords in the processors' JSON schema"""
+    if isinstance(value, EmailRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
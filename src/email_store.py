@@ -0,0 +1,254 @@
+"""
+SQLite store shared by the stages of the email workflow.
+
+The processors bulk-insert emails into `messages`; deduplication fills
+`senders` with the first email per sender as one indexed query, the
+signature stage stores each sender's reduced body there, contact
+extraction writes `contacts` and the CSV export reads them back. Stages
+using the store never re-read the processors' JSON output.
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from pathlib import Path
+
+from email_deduplicator import normalize_sender
+from email_record import json_default
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = Path(__file__).parent / "email_store.db"
+
+# MSG emails win over PST emails of the same sender, as in process_deduplication
+SOURCE_ORDER = "CASE source WHEN 'msg' THEN 0 ELSE 1 END"
+# Send date of a record as epoch seconds, parsed from its sentAt (dd/mm/yyyy - HHhMM, UTC
+# like EmailRecord reads it) where it was stored without sentTimestamp
+SENT_AT = "json_extract(record, '$.sentAt')"
+SENT_TIMESTAMP = (f"COALESCE(json_extract(record, '$.sentTimestamp'), CAST(strftime('%s', "
+                  f"substr({SENT_AT}, 7, 4) || '-' || substr({SENT_AT}, 4, 2) || '-' || substr({SENT_AT}, 1, 2) "
+                  f"|| ' ' || substr({SENT_AT}, 14, 2) || ':' || substr({SENT_AT}, 17, 2)) AS INTEGER))")
+# With keep="latest", the most recent email of a sender wins, those without a date last
+LATEST_ORDER = f"{SENT_TIMESTAMP} IS NULL, {SENT_TIMESTAMP} DESC"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    source_file TEXT,
+    message_id TEXT,
+    sender TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender);
+CREATE INDEX IF NOT EXISTS idx_messages_message_id ON messages(message_id);
+CREATE INDEX IF NOT EXISTS idx_messages_source_file ON messages(source_file);
+
+CREATE TABLE IF NOT EXISTS senders (
+    sender TEXT PRIMARY KEY,
+    message INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    signature TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_senders_rank ON senders(rank);
+
+CREATE TABLE IF NOT EXISTS contacts (
+    sender TEXT PRIMARY KEY,
+    contact TEXT NOT NULL,
+    extracted_at REAL NOT NULL
+);
+"""
+
+def file_key(source_file):
+    """Stored form of a source file path, the same whatever directory a stage runs from"""
+    return str(Path(source_file).resolve())
+
+class StoreWriter:
+    """
+    Bulk inserter of one processor's emails, flushed every batch_size rows.
+    Each row records the file its email was read from, given to write or
+    carried by the record itself, so files may finish in any order.
+    """
+
+    def __init__(self, store, source, batch_size=1000):
+        self.store = store
+        self.source = source
+        self.batch_size = batch_size
+        self.count = 0
+        self.without_sender = 0
+        self._rows = []
+
+    def write(self, email, source_file=None):
+        source_file = source_file or getattr(email, "source_file", None)
+        sender = normalize_sender(email)
+        if not sender:
+            self.without_sender += 1
+            return
+        self._rows.append((self.source, file_key(source_file) if source_file else None,
+                           (email.get("messageId") or "").strip() or None, sender,
+                           json.dumps(email, ensure_ascii=False, default=json_default)))
+        self.count += 1
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self.store.db.executemany(
+                "INSERT INTO messages (source, source_file, message_id, sender, record) VALUES (?, ?, ?, ?, ?)",
+                self._rows
+            )
+            self.store.db.commit()
+            self._rows = []
+
+    def file_done(self, source_file):
+        """Commit the emails written so far, before source_file is recorded as complete"""
+        self.flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class EmailStore:
+    """
+    Indexed SQLite store of emails, deduplicated senders and extracted contacts.
+
+    Messages are indexed by normalized sender address, Message-ID and source
+    file; the database runs in WAL mode so a stage can read while another
+    process inserts.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def writer(self, source, batch_size=1000):
+        return StoreWriter(self, source, batch_size)
+
+    def forget_files(self, source, source_files):
+        """
+        Delete the emails of files about to be processed again, and those of
+        the same processor stored without a file. Returns how many were
+        removed.
+        """
+        removed = 0
+        for source_file in source_files:
+            removed += self.db.execute("DELETE FROM messages WHERE source_file = ?",
+                                       (file_key(source_file),)).rowcount
+        self.db.execute("DELETE FROM messages WHERE source = ? AND source_file IS NULL", (source,))
+        self.db.commit()
+        if removed:
+            logger.info(f"Removed {removed} stored emails of files being processed again")
+        return removed
+
+    def deduplicate(self, keep="first"):
+        """
+        Rebuild the senders table with the first email per sender, MSG emails
+        first and then in insertion order, or with keep="latest" the most
+        recent one by sentTimestamp. Returns (emails, unique senders).
+        """
+        winner_order = f"{LATEST_ORDER}, id" if keep == "latest" else f"{SOURCE_ORDER}, id"
+        self.db.execute("DELETE FROM senders")
+        self.db.execute(f"""
+            INSERT INTO senders (sender, message, rank, messages)
+            SELECT sender, id, ROW_NUMBER() OVER (ORDER BY source_order, id), messages FROM (
+                SELECT sender, id, {SOURCE_ORDER} AS source_order,
+                       COUNT(*) OVER (PARTITION BY sender) AS messages,
+                       ROW_NUMBER() OVER (PARTITION BY sender ORDER BY {winner_order}) AS position
+                FROM messages
+            ) WHERE position = 1
+        """)
+        self.db.commit()
+        return self.count("messages"), self.count("senders")
+
+    def iter_senders(self, signatures=False):
+        """
+        Yield (sender, email) for the first email of every sender, in rank
+        order. With signatures=True, bodies are replaced by the reduced
+        signature where the signature stage stored one.
+        """
+        rows = self.db.execute("""
+            SELECT senders.sender, messages.record, senders.signature
+            FROM senders JOIN messages ON messages.id = senders.message
+            ORDER BY senders.rank
+        """)
+        for sender, record, signature in rows:
+            email = json.loads(record)
+            if signatures and signature is not None:
+                email["body"] = signature
+            yield sender, email
+
+    def set_signatures(self, signatures):
+        """Store (sender, signature) pairs"""
+        self.db.executemany("UPDATE senders SET signature = ? WHERE sender = ?",
+                            ((signature, sender) for sender, signature in signatures))
+        self.db.commit()
+
+    def save_contacts(self, contacts):
+        """Store (sender, contact) pairs, replacing earlier contacts of the same senders"""
+        now = time.time()
+        self.db.executemany("INSERT OR REPLACE INTO contacts (sender, contact, extracted_at) VALUES (?, ?, ?)",
+                            ((sender, json.dumps(contact, ensure_ascii=False), now)
+                             for sender, contact in contacts))
+        self.db.commit()
+
+    def iter_contacts(self):
+        """Yield the contacts of the current senders, in rank order"""
+        rows = self.db.execute("""
+            SELECT contacts.contact FROM senders JOIN contacts ON contacts.sender = senders.sender
+            ORDER BY senders.rank
+        """)
+        for (contact,) in rows:
+            yield json.loads(contact)
+
+    def count(self, table):
+        return self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def stats(self):
+        stats = {table: self.count(table) for table in ("messages", "senders", "contacts")}
+        stats["source_files"] = self.db.execute(
+            "SELECT COUNT(DISTINCT source_file) FROM messages").fetchone()[0]
+        stats["size_mb"] = round(self.path.stat().st_size / (1024 * 1024), 1) if self.path.exists() else 0.0
+        return stats
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or reset the email store")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--path", default=str(DEFAULT_STORE_PATH))
+    args = parser.parse_args()
+
+    with EmailStore(args.path) as store:
+        if args.command == "clear":
+            for table in ("contacts", "senders", "messages"):
+                store.db.execute(f"DELETE FROM {table}")
+            store.db.commit()
+            logger.info(f"Cleared {args.path}")
+        print(json.dumps(store.stats(), indent=2))
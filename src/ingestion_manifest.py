@@ -0,0 +1,259 @@
+import os
+import json
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+from jsonl_stream import JsonlShardWriter, iter_jsonl
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hash a file in chunks so multi-GB PSTs are never loaded at once"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def iter_ranges(records, ranges):
+    """Yield the records whose line index falls in one of the sorted (start, end) ranges"""
+    ranges = iter(ranges)
+    start, end = next(ranges, (None, None))
+    for line_index, record in enumerate(records):
+        while end is not None and line_index >= end:
+            start, end = next(ranges, (None, None))
+        if end is None:
+            return
+        if line_index >= start:
+            yield record
+
+class IngestionManifest:
+    """
+    Persistent record of which input files a processor has already handled.
+
+    Inputs are keyed by path and identified by size, mtime and SHA-256. Each
+    entry lists the line ranges of the JSONL shards its emails were written
+    to, so a changed input can be re-processed without touching the others
+    and stale shards can be compacted or garbage-collected later.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = Path(path)
+        self.inputs = {}
+        self.retired = []
+        self._hashes = {}
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.inputs = data.get("inputs", {})
+            self.retired = data.get("retired", [])
+
+        self._by_hash = {
+            entry["sha256"]: key
+            for key, entry in self.inputs.items()
+            if not entry.get("duplicate_of")
+        }
+
+    def save(self):
+        """Write the manifest atomically so an interrupted run never corrupts it"""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "inputs": self.inputs,
+                "retired": self.retired
+            }, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def needs_processing(self, input_path):
+        """
+        Return True if input_path is new or changed since it was last processed.
+        The content hash is only computed when size or mtime changed.
+        """
+        key = str(input_path)
+        stat = os.stat(input_path)
+        entry = self.inputs.get(key)
+
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return False
+
+        content_hash = file_sha256(input_path)
+        self._hashes[key] = content_hash
+
+        if entry and entry["sha256"] == content_hash:
+            # Touched but unchanged
+            entry["size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+            return False
+
+        other_key = self._by_hash.get(content_hash)
+        if other_key and other_key != key:
+            logger.info(f"{input_path} has the same content as {other_key}, skipping")
+            self.record(input_path, [], 0, duplicate_of=other_key)
+            return False
+
+        return True
+
+    def pending(self, input_paths):
+        """Filter input_paths down to new or changed files"""
+        pending = [p for p in input_paths if self.needs_processing(p)]
+        skipped = len(input_paths) - len(pending)
+        if skipped:
+            logger.info(f"Skipping {skipped} already processed files")
+        return pending
+
+    def record(self, input_path, outputs, email_count, duplicate_of=None):
+        """Record that input_path was processed and its emails were written to outputs"""
+        key = str(input_path)
+        stat = os.stat(input_path)
+        content_hash = self._hashes.pop(key, None) or file_sha256(input_path)
+
+        previous = self.inputs.get(key)
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": content_hash,
+            "processed_at": datetime.now().isoformat(timespec="seconds"),
+            "emails": email_count,
+            "outputs": outputs
+        }
+        if duplicate_of:
+            entry["duplicate_of"] = duplicate_of
+        else:
+            self._by_hash[content_hash] = key
+        self.inputs[key] = entry
+
+        if previous:
+            self._retire_unreferenced({r["file"] for r in previous["outputs"]})
+
+    def live_outputs(self):
+        """Names of output files that still hold records of a current input"""
+        return {r["file"] for entry in self.inputs.values() for r in entry["outputs"]}
+
+    def live_ranges(self):
+        """{output file name: sorted (start, end) line ranges holding records of a current input}"""
+        ranges = {}
+        for entry in self.inputs.values():
+            for r in entry["outputs"]:
+                ranges.setdefault(r["file"], []).append((r["start"], r["end"]))
+        return {name: sorted(spans) for name, spans in ranges.items()}
+
+    def _retire_unreferenced(self, files):
+        live = self.live_outputs()
+        for name in sorted(files - live):
+            if name not in self.retired:
+                self.retired.append(name)
+
+    def gc(self, output_dir):
+        """Delete output files that no longer hold records of any current input"""
+        output_dir = Path(output_dir)
+        live = self.live_outputs()
+        removed = 0
+
+        for name in self.retired:
+            if name in live:
+                continue
+            path = output_dir / name
+            if path.exists():
+                path.unlink()
+                removed += 1
+
+        self.retired = []
+        self.save()
+        logger.info(f"Garbage collection removed {removed} output files from {output_dir}")
+        return removed
+
+    def compact(self, output_dir, prefix, compression=None, max_shard_bytes=None):
+        """
+        Rewrite every live record into fresh, densely packed shards.
+
+        Records superseded by a re-processed input are dropped, many small
+        shards are merged, and the old shards are deleted once the manifest
+        points at the new ones.
+        """
+        output_dir = Path(output_dir)
+
+        # Group live ranges by source file, in file order
+        ranges_by_file = {}
+        for key, entry in self.inputs.items():
+            for r in entry["outputs"]:
+                ranges_by_file.setdefault(r["file"], []).append((r["start"], r["end"], key))
+
+        new_outputs = {key: [] for key in self.inputs}
+        writer = JsonlShardWriter(output_dir, prefix, compression=compression, max_shard_bytes=max_shard_bytes)
+
+        with writer:
+            for name in sorted(ranges_by_file):
+                path = output_dir / name
+                if not path.exists():
+                    logger.warning(f"Output file {name} is missing, dropping its records from the manifest")
+                    continue
+
+                ranges = sorted(ranges_by_file[name])
+                current = 0
+                range_start = None
+                for line_index, record in enumerate(iter_jsonl(path)):
+                    while current < len(ranges) and line_index >= ranges[current][1]:
+                        if range_start is not None:
+                            new_outputs[ranges[current][2]].extend(writer.ranges_since(range_start))
+                            range_start = None
+                        current += 1
+                    if current >= len(ranges):
+                        break
+                    start, end, key = ranges[current]
+                    if line_index >= start:
+                        if range_start is None:
+                            range_start = writer.count
+                        writer.write(record)
+
+                if range_start is not None and current < len(ranges):
+                    new_outputs[ranges[current][2]].extend(writer.ranges_since(range_start))
+
+        old_files = set(ranges_by_file) | set(self.retired)
+        for key, entry in self.inputs.items():
+            entry["outputs"] = new_outputs[key]
+
+        self.retired = sorted(old_files - self.live_outputs())
+        self.save()
+        removed = self.gc(output_dir)
+        logger.info(f"Compacted {writer.count} records into {len(writer.paths)} shards, removed {removed} old files")
+        return writer.count
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain processor ingestion manifests and output shards")
+    parser.add_argument("command", choices=["gc", "compact"],
+                        help="gc: delete retired shards; compact: rewrite live records into fresh shards")
+    parser.add_argument("--processor", choices=["pst", "msg"], required=True,
+                        help="Which processor's manifest and output directory to maintain")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None,
+                        help="Compression of compacted shards")
+    parser.add_argument("--max-shard-mb", type=float, default=None,
+                        help="Size of compacted shards in MB")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    processor_dir = Path("src") / f"{args.processor}-processor"
+    manifest = IngestionManifest(processor_dir / MANIFEST_FILE)
+
+    if args.command == "gc":
+        manifest.gc(processor_dir / "output")
+    else:
+        manifest.compact(
+            processor_dir / "output",
+            f"{args.processor}_emails",
+            compression=args.compression,
+            max_shard_bytes=int(args.max_shard_mb * 1024 * 1024) if args.max_shard_mb else None
+        )
@@ -0,0 +1,179 @@
+import io
+import json
+import gzip
+import logging
+from pathlib import Path
+from datetime import datetime
+
+from email_record import json_default
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIXES = {
+    None: "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+# Patterns of processor output files, legacy JSON arrays first
+EMAIL_FILE_PATTERNS = ["*.json", "*.jsonl", "*.jsonl.gz", "*.jsonl.zst"]
+
+def open_jsonl(path, mode="r"):
+    """Open a JSONL file as text, transparently handling .gz and .zst compression"""
+    path = Path(path)
+    text_mode = mode + "t" if "t" not in mode else mode
+
+    if path.suffix == ".gz":
+        return gzip.open(path, text_mode, encoding="utf-8")
+
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed. Install with: pip install zstandard")
+        raw = open(path, mode.replace("t", "") + "b")
+        if "r" in mode:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+
+    return open(path, text_mode, encoding="utf-8")
+
+def iter_jsonl(path):
+    """Lazily yield records from a (possibly compressed) JSONL file"""
+    line_number = 0
+    try:
+        with open_jsonl(path) as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    # A crash while writing leaves a truncated last line
+                    logger.warning(f"Skipping invalid line {line_number} in {Path(path).name}: {str(e)}")
+    except (EOFError, OSError) as e:
+        # Truncated compressed stream: keep everything read so far
+        logger.warning(f"Stopped reading {Path(path).name} after line {line_number}: {str(e)}")
+
+def iter_email_file(path):
+    """Lazily yield emails from a processor output file (JSON array or JSONL)"""
+    path = Path(path)
+
+    if path.suffix == ".json":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            yield from data
+        else:
+            logger.warning(f"JSON file {path.name} does not contain a list")
+        return
+
+    yield from iter_jsonl(path)
+
+def list_email_files(directory):
+    """List processor output files in a directory, in a stable order"""
+    files = []
+    for pattern in EMAIL_FILE_PATTERNS:
+        files.extend(Path(directory).glob(pattern))
+    return sorted(files)
+
+class JsonlShardWriter:
+    """
+    Write records one per line as they are produced, rotating to a new shard
+    once the current one reaches roughly max_shard_bytes (measured on disk, so
+    after compression, and up to one write buffer late). Shards are named
+    <prefix>_<timestamp>_<NNNN>.jsonl[.gz|.zst].
+    """
+
+    def __init__(self, output_dir, prefix, compression=None, max_shard_bytes=None):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstandard is not installed. Install with: pip install zstandard")
+
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.compression = compression
+        self.max_shard_bytes = max_shard_bytes
+        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.paths = []
+        self.shard_starts = []
+        self.count = 0
+        self._next_shard = 0
+        self._file = None
+        self._raw = None
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def _open_shard(self):
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        while True:
+            path = self.output_dir / f"{self.prefix}_{self.timestamp}_{self._next_shard:04d}.jsonl{suffix}"
+            self._next_shard += 1
+            # Never overwrite a shard written by another writer in the same second
+            if not path.exists():
+                break
+        self._raw = open(path, "wb")
+
+        if self.compression == "gzip":
+            stream = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        elif self.compression == "zstd":
+            stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            stream = self._raw
+
+        self._file = io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+        self.paths.append(path)
+        self.shard_starts.append(self.count)
+
+    def _close_shard(self):
+        if self._file is not None:
+            self._file.close()
+            if not self._raw.closed:
+                self._raw.close()
+            self._file = None
+            self._raw = None
+
+    def write(self, record):
+        if self._file is None:
+            self._open_shard()
+
+        self._file.write(json.dumps(record, ensure_ascii=False, default=json_default))
+        self._file.write("\n")
+        self.count += 1
+
+        if self.max_shard_bytes and self._raw.tell() >= self.max_shard_bytes:
+            self._close_shard()
+
+    def ranges_since(self, start):
+        """
+        Describe where records [start, count) were written, as a list of
+        {"file", "start", "end"} line ranges within the shards.
+        """
+        ranges = []
+        shard_ends = self.shard_starts[1:] + [self.count]
+        for path, shard_start, shard_end in zip(self.paths, self.shard_starts, shard_ends):
+            low = max(start, shard_start)
+            high = min(self.count, shard_end)
+            if low < high:
+                ranges.append({"file": path.name, "start": low - shard_start, "end": high - shard_start})
+        return ranges
+
+    def close(self):
+        self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -7,6 +7,8 @@ Coordinates the entire workflow from file sorting to CSV export.
 import os
 import sys
 import logging
+import contextlib
+import argparse
 from pathlib import Path
 from datetime import datetime
 
@@ -20,41 +22,58 @@ sys.path.append(os.path.join(current_dir, 'contacts-extractor'))
 # Import modules
 from file_sorter import sort_files
 from email_deduplicator import process_deduplication
+from signature_extractor import process_signature_extraction
+from pipeline import run_pipeline, add_pipeline_arguments, pipeline_options
+from run_metrics import RunMetrics
+from email_store import EmailStore, DEFAULT_STORE_PATH
+from message_index import MessageIndex
+from time_window import TimeWindow
 
 # Import processor functions with different names to avoid conflicts
 import importlib.util
 
 # Load PST processor
-pst_spec = importlib.util.spec_from_file_location("pst_processor", os.path.join(current_dir, 'pst-processor', 'processor.py'))
+pst_spec = importlib.util.spec_from_file_location("pst_processor", os.path.join(current_dir, 'pst-processor', 'pst.processor.py'))
 pst_module = importlib.util.module_from_spec(pst_spec)
 pst_spec.loader.exec_module(pst_module)
 process_all_pst_files = pst_module.process_all_pst_files
 
 # Load MSG processor  
-msg_spec = importlib.util.spec_from_file_location("msg_processor", os.path.join(current_dir, 'msg-processor', 'processor.py'))
+msg_spec = importlib.util.spec_from_file_location("msg_processor", os.path.join(current_dir, 'msg-processor', 'msg.processor.py'))
 msg_module = importlib.util.module_from_spec(msg_spec)
 msg_spec.loader.exec_module(msg_module)
 process_all_msg_files = msg_module.process_all_msg_files
 
 # Load contact extractor
 from contact_extractor import process_contact_extraction
+from ollama_client import LOCAL_OLLAMA_URL, DEFAULT_OLLAMA_MODEL
 from csv_converter import convert_contacts_to_csv, create_detailed_csv
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'email_processing_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'),
-        logging.StreamHandler()
-    ]
-)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
-def main():
+def add_log_file():
+    """Also log to email_processing_<timestamp>.log, only for runs of the orchestrator itself"""
+    file_handler = logging.FileHandler(f'email_processing_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logging.getLogger().addHandler(file_handler)
+
+def main(metrics=None, store=None, window=None, workers=1, shard_size=None, timeout=None,
+         base_url=LOCAL_OLLAMA_URL, model=DEFAULT_OLLAMA_MODEL, max_in_flight=4, cache_mode="use", rules=True,
+         structured_contacts=True):
     """
-    Main orchestrator function that runs the complete email processing workflow
+    Main orchestrator function that runs the complete email processing workflow.
+    With metrics (a RunMetrics), every step is recorded as a stage.
+    With store (an EmailStore), the steps hand emails, senders and contacts
+    to each other through it instead of JSON files.
+    With window (a TimeWindow), only messages delivered in it are extracted.
+    workers, shard_size and timeout are passed to the PST processor (workers
+    also to the MSG processor), the Ollama options to contact extraction, as
+    in main_pipeline().
     """
+    metrics = metrics or RunMetrics()
     logger.info("="*60)
     logger.info("Starting Email Processing System")
     logger.info("="*60)
@@ -62,7 +81,8 @@ def main():
     # Step 1: File Sorting
     logger.info("Step 1: Sorting files from unsorted directory")
     try:
-        sort_result = sort_files()
+        with metrics.stage("sort"):
+            sort_result = sort_files()
         if sort_result:
             logger.info(f"File sorting completed: {sort_result['msg_files']} MSG, {sort_result['pst_files']} PST files")
         else:
@@ -71,10 +91,16 @@ def main():
         logger.error(f"Error in file sorting: {str(e)}")
         return False
     
+    # PST and MSG processing skip the copies of a message read by either
+    message_index = MessageIndex()
+    
     # Step 2: Process PST files
     logger.info("Step 2: Processing PST files")
     try:
-        pst_count = process_all_pst_files()
+        with metrics.stage("pst"):
+            pst_count = process_all_pst_files(workers=workers, timeout=timeout, shard_size=shard_size,
+                                              metrics=metrics, harvest_contacts=structured_contacts, store=store,
+                                              message_index=message_index, window=window)
         logger.info(f"PST processing completed: {pst_count} emails extracted")
     except Exception as e:
         logger.error(f"Error in PST processing: {str(e)}")
@@ -83,16 +109,21 @@ def main():
     # Step 3: Process MSG files
     logger.info("Step 3: Processing MSG files")
     try:
-        msg_count = process_all_msg_files()
+        with metrics.stage("msg"):
+            msg_count = process_all_msg_files(metrics=metrics, workers=workers,
+                                              harvest_contacts=structured_contacts, store=store,
+                                              message_index=message_index, window=window)
         logger.info(f"MSG processing completed: {msg_count} emails extracted")
     except Exception as e:
         logger.error(f"Error in MSG processing: {str(e)}")
         # Continue with deduplication even if MSG fails
+    message_index.close()
     
     # Step 4: Email Deduplication
     logger.info("Step 4: Deduplicating emails")
     try:
-        dedup_count = process_deduplication()
+        with metrics.stage("dedup"):
+            dedup_count = process_deduplication(metrics=metrics, store=store)
         if dedup_count == 0:
             logger.error("No emails available for deduplication. Stopping workflow.")
             return False
@@ -101,10 +132,24 @@ def main():
         logger.error(f"Error in email deduplication: {str(e)}")
         return False
     
-    # Step 5: Contact Extraction
-    logger.info("Step 5: Extracting contact information using Ollama")
+    # Step 5: Signature Reduction
+    logger.info("Step 5: Reducing email bodies to signature blocks")
+    try:
+        with metrics.stage("signatures"):
+            reduced_count = process_signature_extraction(store)
+        logger.info(f"Signature reduction completed: {reduced_count} email bodies reduced")
+    except Exception as e:
+        logger.error(f"Error in signature reduction: {str(e)}")
+        # Contact extraction falls back to the full deduplicated bodies
+    
+    # Step 6: Contact Extraction
+    logger.info("Step 6: Extracting contact information using Ollama")
     try:
-        extracted_count = process_contact_extraction()
+        with metrics.stage("extraction"):
+            extracted_count = process_contact_extraction(base_url=base_url, model=model,
+                                                         max_in_flight=max_in_flight, cache_mode=cache_mode,
+                                                         rules=rules, structured_contacts=structured_contacts,
+                                                         metrics=metrics, store=store)
         if extracted_count == 0:
             logger.error("No contacts were extracted. Stopping workflow.")
             return False
@@ -113,11 +158,12 @@ def main():
         logger.error(f"Error in contact extraction: {str(e)}")
         return False
     
-    # Step 6: CSV Conversion
-    logger.info("Step 6: Converting contacts to CSV format")
+    # Step 7: CSV Conversion
+    logger.info("Step 7: Converting contacts to CSV format")
     try:
-        csv_count = convert_contacts_to_csv()
-        detailed_csv_count = create_detailed_csv()
+        with metrics.stage("csv"):
+            csv_count = convert_contacts_to_csv(store=store)
+            detailed_csv_count = create_detailed_csv(store=store)
         logger.info(f"CSV conversion completed: {csv_count} contacts in standard CSV")
         logger.info(f"Detailed CSV created with {detailed_csv_count} contacts")
     except Exception as e:
@@ -145,6 +191,73 @@ def main():
     
     return True
 
+def main_pipeline(metrics=None, **options):
+    """
+    Streaming variant of main(): after sorting, extraction, deduplication,
+    signature reduction, contact extraction and CSV export overlap instead
+    of running one after the other (see pipeline.py)
+    """
+    metrics = metrics or RunMetrics()
+    logger.info("="*60)
+    logger.info("Starting Email Processing System (pipeline mode)")
+    logger.info("="*60)
+    
+    # Step 1: File Sorting
+    logger.info("Step 1: Sorting files from unsorted directory")
+    try:
+        with metrics.stage("sort"):
+            sort_result = sort_files()
+        if sort_result:
+            logger.info(f"File sorting completed: {sort_result['msg_files']} MSG, {sort_result['pst_files']} PST files")
+        else:
+            logger.warning("File sorting returned no results")
+    except Exception as e:
+        logger.error(f"Error in file sorting: {str(e)}")
+        return False
+    
+    # Step 2: Everything else, streamed
+    logger.info("Step 2: Extracting, deduplicating and extracting contacts as one pipeline")
+    try:
+        with metrics.stage("pipeline"):
+            extracted_count = run_pipeline(metrics=metrics, **options)
+        if extracted_count == 0:
+            logger.error("No contacts were extracted.")
+            return False
+    except Exception as e:
+        logger.error(f"Error in pipeline: {str(e)}")
+        return False
+    
+    logger.info("="*60)
+    logger.info("Email Processing Workflow Completed Successfully!")
+    logger.info("="*60)
+    logger.info(f"  - Contacts extracted: {extracted_count} contacts")
+    
+    return True
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the complete email processing workflow")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap extraction, deduplication and contact extraction instead of running them in turn")
+    parser.add_argument("--store", nargs="?", const=str(DEFAULT_STORE_PATH), default=None,
+                        help="Hand data between the steps through the SQLite email store (optionally at this path) "
+                             "instead of JSON files")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--metrics-report", default=None,
+                        help="Path of the JSON run report (default: run_report_<timestamp>.json)")
+    parser.add_argument("--prometheus-textfile", default=None,
+                        help="Also write the run metrics in Prometheus text format, e.g. for the node_exporter textfile collector")
+    return parser.parse_args(argv)
+
+def write_run_report(metrics, report_path=None, prometheus_path=None):
+    """Save the JSON run report and, if a path is given, the Prometheus textfile"""
+    report_path = report_path or f'run_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+    try:
+        metrics.write_json(report_path)
+        if prometheus_path:
+            metrics.write_prometheus(prometheus_path)
+    except Exception as e:
+        logger.error(f"Error writing run metrics: {str(e)}")
+
 def check_dependencies():
     """Check if required dependencies are available"""
     logger.info("Checking system dependencies...")
@@ -184,6 +297,9 @@ def check_dependencies():
     return True
 
 if __name__ == "__main__":
+    args = parse_args()
+    add_log_file()
+    
     print("Email Processing System - Main Orchestrator")
     print("=" * 60)
     
@@ -193,7 +309,17 @@ if __name__ == "__main__":
         sys.exit(1)
     
     # Run the main workflow
-    success = main()
+    metrics = RunMetrics()
+    options = pipeline_options(args)
+    if args.pipeline:
+        success = main_pipeline(metrics, **options)
+    else:
+        # Senders are only queued for contact extraction in pipeline mode
+        options.pop("queue_size")
+        window = TimeWindow(options.pop("since"), options.pop("until"))
+        with EmailStore(args.store) if args.store else contextlib.nullcontext() as store:
+            success = main(metrics, store, window, **options)
+    write_run_report(metrics, args.metrics_report, args.prometheus_textfile)
     
     if success:
         print("\n✅ Email processing completed successfully!")
@@ -0,0 +1,149 @@
+"""
+Message-level deduplication across the PST and MSG sources of a run.
+
+The same message is often exported as a .msg file and also stored in one
+or more PSTs (e.g. the mailboxes of several colleagues). The processors
+claim every message in a shared MessageIndex before decoding its body, so
+copies after the first are skipped at the source instead of being carried
+to sender deduplication. A message is keyed by its normalized Message-ID,
+or without one by a fingerprint of sender, send time (UTC epoch seconds),
+subject and body.
+"""
+
+import os
+import hashlib
+import sqlite3
+import logging
+import tempfile
+from pathlib import Path
+
+from email_record import encode_date
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class DuplicateMessage(Exception):
+    """Raised by the processors' extract_message for a message already claimed in the run"""
+
+def normalize_message_id(message_id):
+    """Message-ID without surrounding whitespace and angle brackets, lowercased"""
+    return " ".join((message_id or "").split()).strip("<>").strip().lower()
+
+def message_key(email_data):
+    """Index key of an email record: its Message-ID, or a fingerprint of its content"""
+    message_id = normalize_message_id(email_data.get("messageId"))
+    if message_id:
+        return hashlib.sha1(f"id\x1f{message_id}".encode("utf-8")).digest()
+    body = " ".join((email_data.get("body") or "").split())
+    # The UTC instant, as sentAt is shown in the sender's time zone by the MSG side only
+    sent = email_data.get("sentTimestamp")
+    if sent is None:
+        sent, _, text = encode_date(email_data.get("sentAt"))
+        sent = text if sent is None else sent
+    fingerprint = "\x1f".join([
+        "fp",
+        (email_data.get("senderEmail") or "").strip().lower(),
+        "" if sent is None else str(sent),
+        " ".join((email_data.get("subject") or "").split()).lower(),
+        hashlib.sha1(body.encode("utf-8")).hexdigest()
+    ])
+    return hashlib.sha1(fingerprint.encode("utf-8")).digest()
+
+class MessageIndex:
+    """
+    SQLite set of the messages claimed during a run, shared by worker
+    processes. Without a path, a temporary database is used and deleted on
+    close. Each process opens its own connection on first use, so an index
+    created before forking workers can be handed to them. Duplicates are
+    counted per process; report() adds them to the shared total.
+    Worker processes whose results may still be lost (a crash, a timeout)
+    call defer_claims(): they only skip messages already claimed, and the
+    parent claims the messages it actually keeps.
+    """
+
+    def __init__(self, path=None):
+        self.temporary = path is None
+        if self.temporary:
+            fd, path = tempfile.mkstemp(prefix="message_index_", suffix=".db")
+            os.close(fd)
+        self.path = Path(path)
+        self.duplicates = 0
+        self.deferred = False
+        self._db = None
+        self._pid = None
+        self._owner = os.getpid()
+        self._connection()
+
+    def _connection(self):
+        if self._pid != os.getpid():
+            # Never reuse a connection inherited from the parent process
+            self._db = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS messages (key BLOB PRIMARY KEY) WITHOUT ROWID")
+            self._db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._pid = os.getpid()
+            self.duplicates = 0
+        return self._db
+
+    def defer_claims(self):
+        """
+        From now on only check for messages already claimed, without claiming
+        new ones. Called in a worker process, whose parent then claims what it
+        keeps, so the claims of a task lost with its worker do not hide the
+        message from a retry or from other copies of it.
+        """
+        self.deferred = True
+
+    def claim(self, email_data):
+        """True for the first copy of a message in the run, False for a duplicate"""
+        key = message_key(email_data)
+        if self.deferred:
+            first = self._connection().execute("SELECT 1 FROM messages WHERE key = ?", (key,)).fetchone() is None
+        else:
+            first = bool(self._connection().execute("INSERT OR IGNORE INTO messages (key) VALUES (?)",
+                                                    (key,)).rowcount)
+        if not first:
+            self.duplicates += 1
+        return first
+
+    def check(self, email_data):
+        """Claim a message, raising DuplicateMessage if it was already claimed"""
+        if not self.claim(email_data):
+            raise DuplicateMessage(email_data.get("messageId") or email_data.get("subject"))
+
+    def report(self):
+        """Add this process's duplicate count to the shared total"""
+        if self.duplicates:
+            self._connection().execute(
+                "INSERT INTO counters (name, value) VALUES ('duplicates', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (self.duplicates,)
+            )
+            self.duplicates = 0
+
+    def total_duplicates(self):
+        """Duplicates reported by every process so far, this one included"""
+        self.report()
+        row = self._connection().execute("SELECT value FROM counters WHERE name = 'duplicates'").fetchone()
+        return row[0] if row else 0
+
+    def close(self):
+        if self._db is None or self._pid != os.getpid():
+            return
+        self.report()
+        self._db.close()
+        self._db = None
+        if self.temporary and os.getpid() == self._owner:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
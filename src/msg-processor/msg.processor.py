@@ -1,11 +1,30 @@
 import os
-import json
+import sys
+import time
+import signal
 import logging
+import argparse
+import functools
 import re
+import multiprocessing
 from pathlib import Path
 from datetime import datetime
+from collections import deque
+from multiprocessing.connection import wait
 import extract_msg
 
+# Shared helpers live in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonl_stream import JsonlShardWriter
+from ingestion_manifest import IngestionManifest, MANIFEST_FILE
+from email_store import EmailStore, DEFAULT_STORE_PATH
+from message_index import MessageIndex, DuplicateMessage
+from email_deduplicator import write_json_array
+from email_record import EmailRecord, encode_date
+from time_window import TimeWindow, parse_time
+from structured_contacts import (contact_record, is_contact_class, is_vcard_name, parse_vcards,
+                                 prune_structured_contacts)
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -13,17 +32,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def format_date(date_obj):
-    """Format date object to string in the required format"""
-    if date_obj is None:
-        return None
-    try:
-        if hasattr(date_obj, 'strftime'):
-            return date_obj.strftime("%d/%m/%Y - %Hh%M")
-        else:
-            return str(date_obj)
-    except:
-        return str(date_obj)
+# Parallel mode logs a progress line at most this often, instead of one line per file
+PROGRESS_INTERVAL_SECONDS = 30
+# Failed files named individually in the parallel run summary
+FAILURE_SAMPLE_SIZE = 20
+# Extra seconds a worker gets per chunk, beyond file_timeout per file, before it is killed
+CHUNK_GRACE_SECONDS = 10
 
 def extract_sender_email(msg):
     """Extract sender email from MSG object"""
@@ -48,8 +62,116 @@ def extract_sender_email(msg):
     
     return None
 
-def process_msg_file(msg_path):
-    """Process a single MSG file and extract email information"""
+class OutOfWindow(Exception):
+    """Raised by extract_message for a message delivered outside the run's window"""
+
+def extract_message(msg, message_index=None, window=None):
+    """
+    Extract email information from an extract_msg Message, or None if it has no sender email.
+    With message_index (a MessageIndex), DuplicateMessage is raised for a
+    message already claimed in the run; with a Message-ID that is checked
+    before the body is decoded. With window (a TimeWindow), OutOfWindow is
+    raised for a message delivered outside it, before anything else is read.
+    """
+    sent = msg.date
+    if window and not window.contains(encode_date(sent)[0]):
+        raise OutOfWindow(sent)
+    
+    # Extract sender email using our custom function
+    sender_email = extract_sender_email(msg)
+    sender_name = msg.sender or ""
+    
+    # Clean up sender name (remove email if it's there)
+    if sender_name and '<' in sender_name and '>' in sender_name:
+        # Extract just the name part before <email>
+        name_part = sender_name.split('<')[0].strip()
+        if name_part:
+            sender_name = name_part.strip('"')
+    
+    # Only keep emails with valid sender email
+    if not sender_email:
+        return None
+    
+    email_data = EmailRecord(msg.subject, msg.messageId, sender_name, sender_email, sent=sent)
+    if message_index is not None and email_data.message_id:
+        message_index.check(email_data)
+    email_data.body = msg.body
+    if message_index is not None and not email_data.message_id:
+        # Without a Message-ID the fingerprint covers the body
+        message_index.check(email_data)
+    return email_data
+
+def _msg_string(msg, *attributes, prop_id=None):
+    """
+    First non-empty string among the given attributes of an extract_msg
+    object, which differ between extract_msg versions, falling back to the
+    MAPI string property prop_id
+    """
+    for attribute in attributes:
+        try:
+            value = getattr(msg, attribute, None)
+        except Exception:
+            continue
+        if isinstance(value, str) and value.strip():
+            return value
+    if prop_id is not None:
+        for reader in ('getStringStream', '_getStringStream'):
+            if hasattr(msg, reader):
+                try:
+                    value = getattr(msg, reader)(f"__substg1.0_{prop_id:04X}")
+                except Exception:
+                    continue
+                if isinstance(value, str) and value.strip():
+                    return value
+    return None
+
+def contact_from_msg(msg):
+    """Contact record of an IPM.Contact MSG file, None if it has no email address"""
+    emails = [_msg_string(msg, name)
+              for name in ('email1EmailAddress', 'email2EmailAddress', 'email3EmailAddress', 'email')]
+    emails.append(_msg_string(msg, prop_id=0x3003))
+    return contact_record(
+        emails,
+        first_name=_msg_string(msg, 'givenName', prop_id=0x3A06),
+        last_name=_msg_string(msg, 'surname', prop_id=0x3A11),
+        full_name=_msg_string(msg, 'displayName', prop_id=0x3001),
+        company=_msg_string(msg, 'companyName', 'company', prop_id=0x3A16),
+        department=_msg_string(msg, 'departmentName', prop_id=0x3A18),
+        landline_phone=_msg_string(msg, 'businessTelephoneNumber', 'businessPhone', 'homeTelephoneNumber',
+                                   'homePhone', prop_id=0x3A08),
+        mobile_phone=_msg_string(msg, 'mobileTelephoneNumber', 'mobilePhone', prop_id=0x3A1C),
+        street=_msg_string(msg, 'workAddressStreet', prop_id=0x3A29),
+        city=_msg_string(msg, 'workAddressCity', prop_id=0x3A27),
+        postal_code=_msg_string(msg, 'workAddressPostalCode', prop_id=0x3A2A),
+        country=_msg_string(msg, 'workAddressCountry', prop_id=0x3A26),
+        source="msg:contact"
+    )
+
+def extract_structured_contacts(msg, has_sender=True):
+    """
+    Structured contact records held by an MSG file: the item itself if it is
+    an IPM.Contact, plus its vCard attachments. Contact items have no sender,
+    so only those are checked for the contact message class.
+    """
+    if not has_sender and is_contact_class(_msg_string(msg, 'classType', prop_id=0x001A)):
+        record = contact_from_msg(msg)
+        return [record] if record else []
+    
+    records = []
+    for attachment in getattr(msg, 'attachments', None) or []:
+        name = _msg_string(attachment, 'longFilename', 'shortFilename', 'name')
+        data = getattr(attachment, 'data', None)
+        if is_vcard_name(name) and isinstance(data, (bytes, str)):
+            records.extend(parse_vcards(data, source="msg:vcard"))
+    return records
+
+def process_msg_file(msg_path, on_contact=None, message_index=None, window=None):
+    """
+    Process a single MSG file and extract email information.
+    With on_contact, a contact item or vCard attachments are passed to it as
+    structured contact records. A message already claimed in message_index
+    (a MessageIndex), or delivered outside window (a TimeWindow), is skipped.
+    """
     emails = []
     
     try:
@@ -58,31 +180,24 @@ def process_msg_file(msg_path):
         # Open and parse the MSG file
         msg = extract_msg.Message(str(msg_path))
         
-        # Extract sender email using our custom function
-        sender_email = extract_sender_email(msg)
-        sender_name = msg.sender or ""
-        
-        # Clean up sender name (remove email if it's there)
-        if sender_name and '<' in sender_name and '>' in sender_name:
-            # Extract just the name part before <email>
-            name_part = sender_name.split('<')[0].strip()
-            if name_part:
-                sender_name = name_part.strip('"')
-        
-        # Extract email information
-        email_data = {
-            "subject": msg.subject or "",
-            "messageId": msg.messageId or "",
-            "senderName": sender_name,
-            "senderEmail": sender_email or "",
-            "body": msg.body or "",
-            "sentAt": format_date(msg.date)
-        }
-        
-        # Only add emails with valid sender email
-        if email_data["senderEmail"]:
+        try:
+            email_data = extract_message(msg, message_index, window)
+        except DuplicateMessage:
+            logger.info(f"Skipped {msg_path.name}: message already read in this run")
+            msg.close()
+            return emails
+        except OutOfWindow:
+            logger.info(f"Skipped {msg_path.name}: delivered outside the window")
+            msg.close()
+            return emails
+        contacts = extract_structured_contacts(msg, email_data is not None) if on_contact else []
+        for record in contacts:
+            on_contact(record)
+        if email_data:
             emails.append(email_data)
             logger.info(f"Extracted email from {msg_path.name}: {email_data['subject'][:50]}...")
+        elif contacts:
+            logger.info(f"Harvested contact item {msg_path.name}")
         else:
             logger.warning(f"No sender email found in {msg_path.name}")
         
@@ -94,11 +209,260 @@ def process_msg_file(msg_path):
     
     return emails
 
-def process_all_msg_files():
-    """Process all MSG files in the input directory"""
+class MsgTimeout(BaseException):
+    """
+    Raised by SIGALRM inside extract_msg code, whose broad except Exception
+    handlers would otherwise swallow it and keep parsing a hung file.
+    """
+
+def _raise_timeout(signum, frame):
+    raise MsgTimeout()
+
+def parse_msg_file(msg_path, file_timeout=None, harvest=False, message_index=None, window=None):
+    """
+    Parse one MSG file without logging. Returns (email_data, status, contacts),
+    status being "ok", "no_sender", "contact", "duplicate", "out_of_window",
+    "timeout" or "error: <reason>". With harvest, contacts lists the structured
+    contacts of the file; "duplicate" is a message already claimed in
+    message_index, "out_of_window" one delivered outside window.
+    file_timeout (seconds) interrupts parsing with SIGALRM, where available.
+    """
+    use_alarm = file_timeout and hasattr(signal, "setitimer")
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, file_timeout)
+    msg = None
+    try:
+        msg = extract_msg.Message(str(msg_path))
+        email_data = extract_message(msg, message_index, window)
+        contacts = extract_structured_contacts(msg, email_data is not None) if harvest else []
+        if email_data:
+            return email_data, "ok", contacts
+        return None, "contact" if contacts else "no_sender", contacts
+    except DuplicateMessage:
+        return None, "duplicate", []
+    except OutOfWindow:
+        return None, "out_of_window", []
+    except MsgTimeout:
+        return None, "timeout", []
+    except Exception as e:
+        return None, f"error: {str(e)}", []
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+        if msg is not None:
+            try:
+                msg.close()
+            except Exception:
+                pass
+
+def process_msg_chunk(msg_paths, file_timeout=None, harvest=False, message_index=None, window=None):
+    """Worker entry point: parse a chunk of MSG files, returning (path, email_data, status, contacts) per file"""
+    results = []
+    for msg_path in msg_paths:
+        try:
+            email_data, status, contacts = parse_msg_file(msg_path, file_timeout, harvest, message_index, window)
+        except MsgTimeout:
+            # The alarm went off just as the file completed
+            email_data, status, contacts = None, "timeout", []
+        results.append((str(msg_path), email_data, status, contacts))
+    return results
+
+def _mp_context():
+    """Use fork where available so workers inherit this module even when it was loaded by path"""
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+def _msg_worker(conn, file_timeout, harvest, message_index=None, window=None):
+    """
+    Worker process entry point: parse the chunks of MSG files received on conn
+    until None. Messages are only checked against message_index here; the
+    parent claims them once their chunk came back.
+    """
+    if message_index is not None:
+        message_index.defer_claims()
+    for msg_paths in iter(conn.recv, None):
+        results = process_msg_chunk(msg_paths, file_timeout, harvest, message_index, window)
+        if message_index is not None:
+            message_index.report()
+        conn.send(results)
+
+def iter_msg_files_parallel(msg_files, workers, chunk_size=200, file_timeout=None, harvest=False,
+                            message_index=None, window=None):
+    """
+    Parse MSG files in worker processes, chunk_size files per task, and yield
+    (path, email_data, status, contacts) per file as chunks complete.
+
+    Each worker holds one chunk at a time, so results are streamed with
+    bounded memory. A worker that dies (e.g. in native code) or overruns its
+    chunk's time budget despite file_timeout is replaced, and its chunk is
+    retried one file at a time; a single file that does it again is reported
+    as failed. Workers skip messages already claimed in message_index and
+    report the duplicates they found with every chunk; the messages of a
+    chunk are claimed here once it came back, so a chunk lost with its
+    worker can be retried. Messages delivered outside window are skipped.
+    """
+    ctx = _mp_context()
+    chunks = deque(msg_files[start:start + chunk_size] for start in range(0, len(msg_files), chunk_size))
+    idle = []
+    busy = {}
+
+    def start_worker():
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_msg_worker, args=(child_conn, file_timeout, harvest, message_index, window),
+                              daemon=True)
+        process.start()
+        child_conn.close()
+        idle.append((process, parent_conn))
+
+    def claimed(results):
+        for msg_path, email_data, status, contacts in results:
+            if email_data is not None and message_index is not None and not message_index.claim(email_data):
+                # Another worker's copy of the message was kept first
+                email_data, status, contacts = None, "duplicate", []
+            yield msg_path, email_data, status, contacts
+
+    def lost(process, conn, files, reason):
+        process.terminate()
+        process.join()
+        conn.close()
+        start_worker()
+        if len(files) > 1:
+            logger.warning(f"{reason} on a chunk of {len(files)} MSG files, retrying them one at a time")
+            chunks.extendleft([msg_path] for msg_path in reversed(files))
+            return []
+        return [(str(files[0]), None, f"error: {reason}", [])]
+
+    for _ in range(min(workers, len(chunks))):
+        start_worker()
+
+    try:
+        while chunks or busy:
+            while chunks and idle:
+                process, conn = idle.pop()
+                files = chunks.popleft()
+                conn.send(files)
+                busy[conn] = (process, files, time.monotonic())
+
+            for conn in wait(list(busy), timeout=0.5):
+                process, files, _ = busy.pop(conn)
+                try:
+                    results = conn.recv()
+                except (EOFError, OSError):
+                    process.join(1)
+                    yield from lost(process, conn, files, f"Worker exited with code {process.exitcode}")
+                    continue
+                idle.append((process, conn))
+                yield from claimed(results)
+
+            # Backstop for hangs the per-file alarm cannot interrupt
+            if file_timeout:
+                for conn, (process, files, started_at) in list(busy.items()):
+                    if time.monotonic() - started_at > file_timeout * len(files) + CHUNK_GRACE_SECONDS and not conn.poll():
+                        del busy[conn]
+                        yield from lost(process, conn, files, "Worker stopped responding")
+    finally:
+        for process, conn in idle:
+            conn.send(None)
+        for process, conn in idle + [(process, conn) for conn, (process, _, _) in busy.items()]:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            conn.close()
+
+class MsgRunStats:
+    """Outcome counts of a parallel MSG run, logged periodically rather than per file"""
+
+    def __init__(self, total):
+        self.total = total
+        self.files = 0
+        self.counts = {"ok": 0, "no_sender": 0, "contact": 0, "duplicate": 0, "out_of_window": 0, "timeout": 0,
+                       "error": 0}
+        self.failures = []
+        self.started = time.monotonic()
+        self.last_logged = self.started
+
+    def add(self, msg_path, status):
+        self.files += 1
+        kind = status.split(":", 1)[0]
+        self.counts[kind] += 1
+        if kind in ("timeout", "error"):
+            self.failures.append(f"{Path(msg_path).name}: {status}")
+        if time.monotonic() - self.last_logged >= PROGRESS_INTERVAL_SECONDS:
+            self.log_progress()
+
+    def log_progress(self):
+        self.last_logged = time.monotonic()
+        elapsed = self.last_logged - self.started
+        logger.info(
+            f"MSG files: {self.files}/{self.total} ({self.files / elapsed if elapsed else 0:.0f}/s), "
+            f"{self.counts['ok']} emails, {self.counts['contact']} contact items, "
+            f"{self.counts['no_sender']} without sender, {self.counts['duplicate']} duplicates, "
+            f"{self.counts['out_of_window']} outside the window, "
+            f"{self.counts['timeout']} timed out, {self.counts['error']} failed"
+        )
+
+    def log_summary(self):
+        self.log_progress()
+        for failure in self.failures[:FAILURE_SAMPLE_SIZE]:
+            logger.warning(f"Failed MSG file {failure}")
+        if len(self.failures) > FAILURE_SAMPLE_SIZE:
+            logger.warning(f"... and {len(self.failures) - FAILURE_SAMPLE_SIZE} more failed MSG files")
+
+def process_msg_files_parallel(msg_files, workers, chunk_size=200, file_timeout=None, on_contact=None,
+                               message_index=None, window=None):
+    """
+    Yield (msg_path, emails) per file like the serial loop, in completion
+    order, parsing in worker processes (see iter_msg_files_parallel) and
+    logging aggregated progress. Structured contacts are passed to on_contact
+    if given, and messages already claimed in message_index or delivered
+    outside window are skipped.
+    """
+    logger.info(f"Processing {len(msg_files)} MSG files with {workers} workers, {chunk_size} files per task")
+    stats = MsgRunStats(len(msg_files))
+    results = iter_msg_files_parallel(msg_files, workers, chunk_size, file_timeout, harvest=on_contact is not None,
+                                      message_index=message_index, window=window)
+    for msg_path, email_data, status, contacts in results:
+        stats.add(msg_path, status)
+        for record in contacts:
+            on_contact(record)
+        yield Path(msg_path), [email_data] if email_data else []
+    stats.log_summary()
+
+def process_all_msg_files(output_format="json", compression=None, max_shard_bytes=None, incremental=False,
+                          metrics=None, workers=1, chunk_size=200, file_timeout=None, harvest_contacts=True,
+                          store=None, message_index=None, dedup_messages=True, window=None):
+    """
+    Process all MSG files in the input directory.
+    Emails are streamed to a single JSON array, or with output_format="jsonl"
+    to disk one per line.
+    With workers > 1, files are parsed in worker processes in chunks of
+    chunk_size files, each file limited to file_timeout seconds, and progress
+    is logged periodically instead of per file.
+    With incremental=True (implies JSONL), files already recorded in the
+    ingestion manifest with the same size, mtime and content are skipped.
+    With metrics (a RunMetrics), messages and decoded body bytes are counted
+    under the "msg" stage.
+    With harvest_contacts=True, contact items and vCard attachments are
+    written as structured contacts to contacts/structured_contacts_msg_*.jsonl,
+    replacing those of earlier runs unless only part of the files or
+    messages were read (incremental or window).
+    With store (an EmailStore), emails are inserted into it instead of being
+    written to output/, replacing those of earlier runs over the same files.
+    With dedup_messages=True, copies of a message already read in this run
+    (same Message-ID, or same sender, date, subject and body) are skipped
+    before their body is decoded. Pass a message_index (a MessageIndex) to
+    share this with the PST processor; by default the index only spans this
+    call's files.
+    With window (a TimeWindow), only messages delivered in it are extracted.
+    """
     # Define paths
     input_dir = Path("input")
     output_dir = Path("output")
+    contacts_dir = Path("contacts")
     
     # Ensure output directory exists
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -117,31 +481,183 @@ def process_all_msg_files():
     
     logger.info(f"Found {len(msg_files)} MSG files to process")
     
-    all_emails = []
+    manifest = None
+    if incremental:
+        output_format = "jsonl"
+        manifest = IngestionManifest(MANIFEST_FILE)
+        msg_files = manifest.pending(msg_files)
+        manifest.save()
+        if not msg_files:
+            logger.info("No new or changed MSG files")
+            return 0
     
-    # Process each MSG file
-    for msg_file in msg_files:
-        emails = process_msg_file(msg_file)
-        all_emails.extend(emails)
+    def counted(on_email):
+        return metrics.counting("msg", on_email) if metrics else on_email
     
-    # Save all emails to JSON file
-    if all_emails:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = output_dir / f"msg_emails_{timestamp}.json"
-        
+    contact_writer = None
+    on_contact = None
+    if harvest_contacts:
+        contact_writer = JsonlShardWriter(contacts_dir, "structured_contacts_msg")
+        on_contact = contact_writer.write
+
+    own_index = dedup_messages and message_index is None
+    if own_index:
+        message_index = MessageIndex()
+    elif not dedup_messages:
+        message_index = None
+
+    if workers > 1:
+        results = process_msg_files_parallel(msg_files, workers, chunk_size, file_timeout, on_contact=on_contact,
+                                             message_index=message_index, window=window)
+    else:
+        results = ((msg_file, process_msg_file(msg_file, on_contact, message_index, window))
+                   for msg_file in msg_files)
+
+    def indexed(results):
+        """Count the duplicate messages once every file was read, or the output failed"""
+        duplicates_before = message_index.total_duplicates()
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(all_emails, f, indent=2, ensure_ascii=False)
-            
-            logger.info(f"Saved {len(all_emails)} emails to {output_file}")
-            
-        except Exception as e:
-            logger.error(f"Error saving emails to JSON: {str(e)}")
+            yield from results
+        finally:
+            duplicates = message_index.total_duplicates() - duplicates_before
+            if own_index:
+                message_index.close()
+            if duplicates:
+                logger.info(f"Skipped {duplicates} copies of messages already read in this run")
+            if metrics:
+                metrics.count("msg", "duplicate_messages", duplicates)
+
+    if message_index:
+        results = indexed(results)
+
+    def harvested(results):
+        """Close the structured contacts once every file was read, or the output failed"""
+        try:
+            yield from results
+        finally:
+            contact_writer.close()
+            if contact_writer.count:
+                logger.info(f"Harvested {contact_writer.count} structured contacts to {contacts_dir}")
+                if metrics:
+                    metrics.count("msg", "structured_contacts", contact_writer.count)
+        if not incremental and not window:
+            # Every MSG file was read again, the contacts of earlier runs are superseded
+            prune_structured_contacts(contacts_dir, "msg", contact_writer.paths)
+
+    if contact_writer:
+        results = harvested(results)
+
+    if store:
+        store.forget_files("msg", msg_files)
+        with store.writer("msg") as writer:
+            for msg_file, emails in results:
+                file_start = writer.count
+                write = counted(functools.partial(writer.write, source_file=msg_file))
+                for email_data in emails:
+                    write(email_data)
+                if manifest:
+                    manifest.record(msg_file, [], writer.count - file_start)
+                    if len(manifest.inputs) % 500 == 0:
+                        manifest.save()
+        
+        if manifest:
+            manifest.save()
+        
+        if writer.count:
+            logger.info(f"Stored {writer.count} emails in {store.path}")
+        else:
+            logger.warning("No emails were extracted from MSG files")
+        return writer.count
     
+    if output_format == "jsonl":
+        with JsonlShardWriter(output_dir, "msg_emails", compression=compression, max_shard_bytes=max_shard_bytes) as writer:
+            write = counted(writer.write)
+            for msg_file, emails in results:
+                file_start = writer.count
+                for email_data in emails:
+                    write(email_data)
+                if manifest:
+                    manifest.record(msg_file, writer.ranges_since(file_start), writer.count - file_start)
+                    if len(manifest.inputs) % 500 == 0:
+                        manifest.save()
+        
+        if manifest:
+            manifest.save()
+        
+        if writer.count:
+            logger.info(f"Streamed {writer.count} emails to {len(writer.paths)} JSONL shards in {output_dir}")
+        else:
+            logger.warning("No emails were extracted from MSG files")
+        return writer.count
+    
+    # Stream all emails to a JSON file as they are extracted
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = output_dir / f"msg_emails_{timestamp}.json"
+    add_email = counted(lambda email_data: email_data)
+    
+    try:
+        count = write_json_array((add_email(email_data) for _, emails in results for email_data in emails), output_file)
+    except Exception as e:
+        logger.error(f"Error saving emails to JSON: {str(e)}")
+        return 0
+    
+    if count:
+        logger.info(f"Saved {count} emails to {output_file}")
     else:
+        output_file.unlink()
         logger.warning("No emails were extracted from MSG files")
     
-    return len(all_emails)
+    return count
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract emails from MSG files")
+    parser.add_argument("--format", dest="output_format", choices=["json", "jsonl"], default="json",
+                        help="Output a single JSON array or stream JSONL shards")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None,
+                        help="Compress JSONL shards")
+    parser.add_argument("--max-shard-mb", type=float, default=None,
+                        help="Rotate JSONL output to a new shard after this many MB")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip MSG files already recorded in the ingestion manifest (implies --format jsonl)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (0 = one per CPU core)")
+    parser.add_argument("--chunk-size", type=int, default=200,
+                        help="MSG files sent to a worker at a time when running in parallel")
+    parser.add_argument("--file-timeout", type=float, default=None,
+                        help="Give up on a single MSG file after this many seconds when running in parallel")
+    parser.add_argument("--no-contacts", dest="harvest_contacts", action="store_false",
+                        help="Do not harvest contact items and vCard attachments as structured contacts")
+    parser.add_argument("--store", nargs="?", const=str(DEFAULT_STORE_PATH), default=None,
+                        help="Insert emails into the SQLite email store (optionally at this path) instead of output/")
+    parser.add_argument("--no-message-dedup", dest="dedup_messages", action="store_false",
+                        help="Keep every copy of a message found in several MSG files")
+    parser.add_argument("--message-index", default=None,
+                        help="Message dedup index database to share with a PST processor run (default: temporary)")
+    parser.add_argument("--since", type=parse_time, default=None,
+                        help="Only extract messages delivered since this ISO date or time ago (e.g. 2024-01-01, 6m)")
+    parser.add_argument("--until", type=parse_time, default=None,
+                        help="Only extract messages delivered before this ISO date or time ago")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    process_all_msg_files()
\ No newline at end of file
+    args = parse_args()
+    store = EmailStore(args.store) if args.store else None
+    message_index = MessageIndex(args.message_index) if args.message_index and args.dedup_messages else None
+    process_all_msg_files(
+        output_format=args.output_format,
+        compression=args.compression,
+        max_shard_bytes=int(args.max_shard_mb * 1024 * 1024) if args.max_shard_mb else None,
+        incremental=args.incremental,
+        workers=args.workers or os.cpu_count(),
+        chunk_size=args.chunk_size,
+        file_timeout=args.file_timeout,
+        harvest_contacts=args.harvest_contacts,
+        store=store,
+        message_index=message_index,
+        dedup_messages=args.dedup_messages,
+        window=TimeWindow(args.since, args.until)
+    )
+    if store:
+        store.close()
+    if message_index:
+        message_index.close()
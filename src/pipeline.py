@@ -0,0 +1,357 @@
+"""
+Streaming pipeline mode of the email processing system.
+
+PST/MSG extraction, sender deduplication, signature reduction and contact
+extraction run at the same time instead of one full pass after the other:
+processors run in their own processes and stream records through a bounded
+queue, the dedup stage forwards each first-seen sender straight away and
+Ollama starts extracting contacts while PSTs are still being read. Full
+queues block the stage before them, so memory stays bounded by the queue
+sizes plus the set of senders seen.
+"""
+
+import os
+import sys
+import time
+import queue
+import asyncio
+import logging
+import argparse
+import importlib.util
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, 'contacts-extractor'))
+
+from jsonl_stream import JsonlShardWriter
+from email_deduplicator import normalize_sender, write_json_array
+from signature_extractor import reduce_body
+from ollama_client import OllamaClient, LOCAL_OLLAMA_URL, DEFAULT_OLLAMA_MODEL
+from extraction_cache import ExtractionCache, DEFAULT_CACHE_PATH, CACHE_MODES
+from contact_extractor import extract_contacts_from_queue, CONTACTS_DIR
+from structured_contacts import StructuredContactIndex
+from message_index import MessageIndex
+from time_window import TimeWindow, parse_time
+from rule_extractor import REQUIRED_FIELDS
+from prompt import PROMPT_PREFIX
+from csv_converter import convert_contacts_to_csv, create_detailed_csv
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PST_INPUT_DIR = Path("src/pst-processor/input")
+MSG_INPUT_DIR = Path("src/msg-processor/input")
+
+def load_processor(folder, filename, name):
+    """Load a processor module whose file name is not importable (e.g. pst.processor.py)"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(current_dir, folder, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _mp_context():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+def _extract_pst(pst_files, workers, shard_size, timeout, message_index, window, on_email, on_contact=None):
+    pst = load_processor('pst-processor', 'pst.processor.py', 'pst_processor')
+    item_filter = pst.PstItemFilter(window=window)
+    # Unordered: pass emails on as they arrive instead of buffering whole files
+    pst.extract_pst_files(pst_files, workers, shard_size=shard_size, timeout=timeout, on_email=on_email,
+                          ordered=False, max_queued_chunks=workers * 2 if workers > 1 else None,
+                          on_contact=on_contact, item_filter=item_filter, message_index=message_index)
+    item_filter.log_summary()
+    message_index.report()
+
+def _extract_msg(msg_files, workers, message_index, window, on_email, on_contact=None):
+    msg = load_processor('msg-processor', 'msg.processor.py', 'msg_processor')
+    if workers > 1:
+        results = msg.process_msg_files_parallel(msg_files, workers, on_contact=on_contact,
+                                                 message_index=message_index, window=window)
+    else:
+        results = ((msg_path, msg.process_msg_file(msg_path, on_contact, message_index, window))
+                   for msg_path in msg_files)
+    for _, emails in results:
+        for email_data in emails:
+            on_email(email_data)
+    message_index.report()
+
+def _producer(source, target, args, records, chunk_size, harvest=True):
+    """
+    Producer process entry point: run target(*args, on_email=...) and stream
+    records in chunks. With harvest, structured contacts are streamed as
+    they are found, ahead of the emails still in the chunk.
+    """
+    chunk = []
+    options = {}
+    if harvest:
+        options["on_contact"] = lambda record: records.put(("contacts", source, [record]))
+
+    def send(email_data):
+        chunk.append(email_data)
+        if len(chunk) >= chunk_size:
+            # Blocks while the queue is full, which pauses extraction
+            records.put(("emails", source, list(chunk)))
+            chunk.clear()
+
+    try:
+        target(*args, on_email=send, **options)
+        if chunk:
+            records.put(("emails", source, list(chunk)))
+        records.put(("done", source, None))
+    except Exception as e:
+        records.put(("error", source, str(e)))
+
+class PipelineStats:
+    def __init__(self):
+        self.records = 0
+        self.without_sender = 0
+        self.duplicates = 0
+        self.unique_senders = 0
+        self.contacts = 0
+        self.rule_contacts = 0
+        self.structured_contacts = 0
+        self.harvested_contacts = 0
+        self.first_contact_after = None
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+async def _dedup_stage(records, producers, senders, writer, stats, structured, metrics=None):
+    """
+    Read record chunks from the producers and forward each sender the first
+    time it is seen, with its body reduced to the signature block.
+    Structured contacts are added to structured as they arrive.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    seen = set()
+    remaining = set(producers)
+
+    while remaining:
+        try:
+            kind, source, payload = await loop.run_in_executor(None, records.get, True, 1.0)
+        except queue.Empty:
+            for source in list(remaining):
+                if not producers[source].is_alive():
+                    logger.error(f"{source} extraction exited with code {producers[source].exitcode}")
+                    remaining.discard(source)
+            continue
+
+        if kind == "done":
+            logger.info(f"{source} extraction finished")
+            remaining.discard(source)
+            if metrics:
+                metrics.finish(source.lower(), time.monotonic() - started)
+        elif kind == "error":
+            logger.error(f"{source} extraction failed: {payload}")
+            remaining.discard(source)
+        elif kind == "contacts":
+            for record in payload:
+                stats.harvested_contacts += 1
+                structured.add(record)
+        else:
+            for email in payload:
+                stats.records += 1
+                if metrics:
+                    metrics.count(source.lower(), "messages")
+                    metrics.count(source.lower(), "body_bytes", len((email.get("body") or "").encode("utf-8")))
+                sender = normalize_sender(email)
+                if not sender:
+                    stats.without_sender += 1
+                    continue
+                if sender in seen:
+                    stats.duplicates += 1
+                    continue
+                seen.add(sender)
+                stats.unique_senders += 1
+                writer.write(email)
+                # Waits while the LLM stage is behind, which in turn stops reading records
+                await senders.put({**email, "body": reduce_body(email.get("body"))})
+
+    await senders.put(None)
+
+async def _run_stages(records, producers, writer, stats, on_contact, queue_size, client_options,
+                      cache, rules, required_fields, warmup, metrics=None):
+    senders = asyncio.Queue(queue_size)
+    structured = StructuredContactIndex()
+    started = time.monotonic()
+
+    def contact_done(contact):
+        if stats.first_contact_after is None:
+            stats.first_contact_after = round(time.monotonic() - started, 1)
+        on_contact(contact)
+
+    async with OllamaClient(**client_options) as client:
+        dedup = asyncio.create_task(_dedup_stage(records, producers, senders, writer, stats, structured, metrics))
+        if warmup:
+            await client.warmup(PROMPT_PREFIX)
+        stats.contacts, stats.rule_contacts, stats.structured_contacts = await extract_contacts_from_queue(
+            senders, client, contact_done, cache=cache, rules=rules, required_fields=required_fields,
+            structured=structured
+        )
+        await dedup
+
+    if metrics:
+        metrics.observe_llm_calls(client.calls)
+        metrics.count("extraction", "llm_failures", client.failures)
+
+def run_pipeline(workers=1, shard_size=None, timeout=None, queue_size=1000, chunk_size=200,
+                 base_url=LOCAL_OLLAMA_URL, model=DEFAULT_OLLAMA_MODEL, max_in_flight=4, request_timeout=120.0,
+                 retries=3, adaptive=False, cache_mode="use", cache_path=DEFAULT_CACHE_PATH, rules=True,
+                 required_fields=REQUIRED_FIELDS, stream=True, num_predict=512, json_format=True,
+                 keep_alive="30m", warmup=True, timing_sample_every=20, structured_contacts=True, metrics=None,
+                 since=None, until=None):
+    """
+    Run extraction, deduplication, signature reduction and contact extraction
+    concurrently over the files in the PST and MSG input directories.
+    With structured_contacts=True, contact items and vCard attachments are
+    harvested along the way and used for senders taken up for extraction
+    after their structured contact was found. Both producers claim messages
+    in one MessageIndex, so a message present in several PST or MSG files is
+    only read once. since and until (epoch seconds) bound the delivery times
+    of the messages extracted.
+    Saves deduplicated_emails_<timestamp>_*.jsonl, extracted_contacts_<timestamp>.json
+    and the CSV exports. Returns the number of contacts extracted.
+    With metrics (a RunMetrics), per-source message counts and rates, dedup
+    counts and Ollama timings are recorded; stage wall and CPU times are left
+    to the caller, as the stages overlap.
+    """
+    pst_files = sorted(PST_INPUT_DIR.glob("*.pst"))
+    msg_files = sorted(MSG_INPUT_DIR.glob("*.msg"))
+    if not pst_files and not msg_files:
+        logger.warning(f"No PST or MSG files found in {PST_INPUT_DIR} or {MSG_INPUT_DIR}")
+        return 0
+
+    logger.info(f"Pipeline: {len(pst_files)} PST and {len(msg_files)} MSG files")
+
+    # Start producers before any thread exists in this process, as they are forked
+    ctx = _mp_context()
+    message_index = MessageIndex()
+    window = TimeWindow(since, until)
+    records = ctx.Queue(max(4, 2 * workers))
+    producers = {}
+    # Not daemonic: daemonic processes cannot start the PST worker processes
+    if pst_files:
+        producers["PST"] = ctx.Process(
+            target=_producer,
+            args=("PST", _extract_pst, (pst_files, workers, shard_size, timeout, message_index, window), records,
+                  chunk_size, structured_contacts)
+        )
+    if msg_files:
+        producers["MSG"] = ctx.Process(
+            target=_producer,
+            args=("MSG", _extract_msg, (msg_files, workers, message_index, window), records, chunk_size,
+                  structured_contacts)
+        )
+    for process in producers.values():
+        process.start()
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    stats = PipelineStats()
+    contacts = []
+    client_options = {
+        "base_url": base_url, "model": model, "max_in_flight": max_in_flight, "timeout": request_timeout,
+        "retries": retries, "adaptive": adaptive, "stream": stream, "num_predict": num_predict,
+        "json_format": json_format, "keep_alive": keep_alive, "timing_sample_every": timing_sample_every
+    }
+
+    try:
+        with JsonlShardWriter(CONTACTS_DIR, "deduplicated_emails") as writer, \
+                ExtractionCache(cache_path, mode=cache_mode) as cache:
+            asyncio.run(_run_stages(records, producers, writer, stats, contacts.append, queue_size,
+                                    client_options, cache, rules, required_fields, warmup, metrics))
+    finally:
+        for process in producers.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        duplicate_messages = message_index.total_duplicates()
+        message_index.close()
+
+    logger.info(
+        f"Pipeline: {stats.records} emails, {stats.unique_senders} unique senders, "
+        f"{stats.duplicates} duplicates, {stats.without_sender} without sender, "
+        f"{duplicate_messages} duplicate messages skipped at extraction"
+    )
+    logger.info(
+        f"Pipeline: {stats.contacts} contacts ({stats.rule_contacts} from rules and "
+        f"{stats.structured_contacts} from {stats.harvested_contacts} structured contacts, without the LLM), "
+        f"first contact after {stats.first_contact_after}s"
+    )
+    if metrics:
+        metrics.count("dedup", "input_emails", stats.records)
+        metrics.count("dedup", "unique_senders", stats.unique_senders)
+        metrics.count("dedup", "duplicates", stats.duplicates)
+        metrics.count("dedup", "without_sender", stats.without_sender)
+        metrics.count("dedup", "duplicate_messages", duplicate_messages)
+        metrics.count("extraction", "contacts", stats.contacts)
+        metrics.count("extraction", "rule_contacts", stats.rule_contacts)
+        metrics.count("extraction", "structured_contacts", stats.structured_contacts)
+
+    if not contacts:
+        return 0
+
+    output_file = CONTACTS_DIR / f"extracted_contacts_{timestamp}.json"
+    count = write_json_array(contacts, output_file)
+    logger.info(f"Saved {count} contacts to {output_file}")
+
+    convert_contacts_to_csv(output_file, CONTACTS_DIR / f"contacts_export_{timestamp}.csv")
+    create_detailed_csv(output_file, CONTACTS_DIR / f"contacts_detailed_{timestamp}.csv")
+
+    return count
+
+def add_pipeline_arguments(parser):
+    parser.add_argument("--workers", type=int, default=1,
+                        help="PST and MSG worker processes (0 = one per CPU core)")
+    parser.add_argument("--shard-size", type=int, default=None,
+                        help="Split each PST into shards of at most this many messages")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Per-file (or per-shard) PST timeout in seconds")
+    parser.add_argument("--queue-size", type=int, default=1000,
+                        help="Deduplicated senders waiting for contact extraction before extraction pauses "
+                             "(--pipeline only)")
+    parser.add_argument("--url", default=LOCAL_OLLAMA_URL, help="Ollama base URL")
+    parser.add_argument("--model", default=DEFAULT_OLLAMA_MODEL.value, help="Ollama model name")
+    parser.add_argument("--max-in-flight", type=int, default=4,
+                        help="Maximum number of concurrent Ollama requests")
+    parser.add_argument("--cache", dest="cache_mode", choices=CACHE_MODES, default="use",
+                        help="Extraction cache mode")
+    parser.add_argument("--no-rules", dest="rules", action="store_false",
+                        help="Send every sender to Ollama")
+    parser.add_argument("--no-structured-contacts", dest="structured_contacts", action="store_false",
+                        help="Do not harvest contact items and vCard attachments for the extraction")
+    parser.add_argument("--since", type=parse_time, default=None,
+                        help="Only extract messages delivered since this ISO date or time ago (e.g. 2024-01-01, 6m)")
+    parser.add_argument("--until", type=parse_time, default=None,
+                        help="Only extract messages delivered before this ISO date or time ago")
+
+def pipeline_options(args):
+    return {
+        "workers": args.workers or os.cpu_count(),
+        "shard_size": args.shard_size,
+        "timeout": args.timeout,
+        "queue_size": args.queue_size,
+        "base_url": args.url,
+        "model": args.model,
+        "max_in_flight": args.max_in_flight,
+        "cache_mode": args.cache_mode,
+        "rules": args.rules,
+        "structured_contacts": args.structured_contacts,
+        "since": args.since,
+        "until": args.until
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run extraction, dedup and contact extraction as one streaming pipeline")
+    add_pipeline_arguments(parser)
+    result = run_pipeline(**pipeline_options(parser.parse_args()))
+    print(f"Extracted {result} contacts")
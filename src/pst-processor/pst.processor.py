@@ -1,10 +1,30 @@
 import os
+import re
+import sys
 import json
+import time
+import queue
 import logging
+import argparse
+import fnmatch
+import functools
+import multiprocessing
 from pathlib import Path
 from datetime import datetime
 import pypff
 
+# Shared helpers live in src/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsonl_stream import JsonlShardWriter
+from ingestion_manifest import IngestionManifest, MANIFEST_FILE
+from email_store import EmailStore, DEFAULT_STORE_PATH
+from message_index import MessageIndex, DuplicateMessage
+from email_deduplicator import normalize_sender
+from email_record import EmailRecord, json_default, encode_date
+from time_window import TimeWindow, Watermarks, WATERMARKS_FILE, parse_time
+from structured_contacts import (EMAIL, contact_record, is_contact_class, is_vcard_attachment, parse_vcards,
+                                 prune_structured_contacts)
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -12,17 +32,75 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def format_date(date_obj):
-    """Format date object to string in the required format"""
-    if date_obj is None:
-        return None
-    try:
-        if hasattr(date_obj, 'strftime'):
-            return date_obj.strftime("%d/%m/%Y - %Hh%M")
-        else:
-            return str(date_obj)
-    except:
-        return str(date_obj)
+# MAPI property ids read from contact items and attachments
+PR_MESSAGE_CLASS = 0x001A
+PR_MESSAGE_FLAGS = 0x0E07
+PR_MESSAGE_SIZE = 0x0E08
+PR_DISPLAY_NAME = 0x3001
+PR_EMAIL_ADDRESS = 0x3003
+PR_ATTACH_FILENAME = 0x3704
+PR_ATTACH_LONG_FILENAME = 0x3707
+PR_ATTACH_MIME_TAG = 0x370E
+PR_GIVEN_NAME = 0x3A06
+PR_BUSINESS_TELEPHONE_NUMBER = 0x3A08
+PR_HOME_TELEPHONE_NUMBER = 0x3A09
+PR_SURNAME = 0x3A11
+PR_COMPANY_NAME = 0x3A16
+PR_DEPARTMENT_NAME = 0x3A18
+PR_PRIMARY_TELEPHONE_NUMBER = 0x3A1A
+PR_BUSINESS2_TELEPHONE_NUMBER = 0x3A1B
+PR_MOBILE_TELEPHONE_NUMBER = 0x3A1C
+PR_COUNTRY = 0x3A26
+PR_LOCALITY = 0x3A27
+PR_STREET_ADDRESS = 0x3A29
+PR_POSTAL_CODE = 0x3A2A
+PR_CONTAINER_CLASS = 0x3613
+# MAPI property ids of the sender and message id, read instead of parsing transport headers
+PR_SENT_REPRESENTING_ADDRTYPE = 0x0064
+PR_SENT_REPRESENTING_EMAIL_ADDRESS = 0x0065
+PR_SENDER_ADDRTYPE = 0x0C1E
+PR_SENDER_EMAIL_ADDRESS = 0x0C1F
+PR_INTERNET_MESSAGE_ID = 0x1035
+PR_SENDER_SMTP_ADDRESS = 0x5D01
+PR_SENT_REPRESENTING_SMTP_ADDRESS = 0x5D02
+# (SMTP address, address type, address) of the From mailbox, then of the mailbox that sent on its behalf
+SENDER_PROPERTIES = (
+    (PR_SENT_REPRESENTING_SMTP_ADDRESS, PR_SENT_REPRESENTING_ADDRTYPE, PR_SENT_REPRESENTING_EMAIL_ADDRESS),
+    (PR_SENDER_SMTP_ADDRESS, PR_SENDER_ADDRTYPE, PR_SENDER_EMAIL_ADDRESS),
+)
+SENDER_ADDRESS_PROPERTIES = frozenset(prop_id for props in SENDER_PROPERTIES for prop_id in props)
+MESSAGE_PROPERTIES = SENDER_ADDRESS_PROPERTIES | {PR_INTERNET_MESSAGE_ID, PR_MESSAGE_CLASS}
+# What tells a vCard attachment apart without reading it
+ATTACHMENT_TYPE_PROPERTIES = frozenset({PR_ATTACH_FILENAME, PR_ATTACH_LONG_FILENAME, PR_ATTACH_MIME_TAG})
+# PR_MESSAGE_FLAGS bit of messages with attachments
+MSGFLAG_HASATTACH = 0x10
+# Named properties (e.g. Email1EmailAddress) get ids from here on, which differ per PST
+FIRST_NAMED_PROPERTY = 0x8000
+# MAPI string value types: 8-bit and UTF-16
+STRING_VALUE_TYPES = (0x001E, 0x001F)
+# MAPI integer value types: 32 and 64 bits
+INTEGER_VALUE_TYPES = (0x0003, 0x0014)
+
+# Transport header fields, including folded continuation lines
+HEADER_FROM = re.compile(r'^From:[ \t]*((?:[^\r\n]|\r?\n[ \t])*)', re.IGNORECASE | re.MULTILINE)
+HEADER_MESSAGE_ID = re.compile(r'^Message-ID:[ \t]*((?:[^\r\n]|\r?\n[ \t])*)', re.IGNORECASE | re.MULTILINE)
+
+# Contact items and distribution lists are not emails, even when they record who created them
+NON_EMAIL_CLASSES = ("IPM.Contact*", "IPM.DistList*")
+
+# Larger .vcf attachments are skipped, a contact card is a few KB
+MAX_VCARD_BYTES = 1024 * 1024
+
+# Folders that never hold mail: calendars, tasks, notes and journals, by container class
+DEFAULT_SKIP_CONTAINER_CLASSES = ("IPF.Appointment*", "IPF.Task*", "IPF.StickyNote*", "IPF.Journal*")
+# Folder paths (globs, case-insensitive) of junk mail and Outlook's own bookkeeping, English and French
+DEFAULT_SKIP_FOLDERS = (
+    "*/Junk E-mail", "*/Junk Email", "*/Courrier indésirable",
+    "*/Sync Issues", "*/Problèmes de synchronisation",
+    "*/Conversation Action Settings", "*/Paramètres des actions de conversation",
+    "*/Quick Step Settings", "*/Paramètres d'étape rapide",
+    "*/RSS Feeds", "*/Flux RSS",
+)
 
 def extract_email_body(message):
     """Extract email body text from message"""
@@ -44,106 +122,1085 @@ def extract_email_body(message):
         logger.warning(f"Error extracting body: {str(e)}")
         return ""
 
-def process_pst_file(pst_path):
-    """Process a single PST file and extract email information"""
+def transport_header_fields(message):
+    """(sender email, message id) from the transport headers of a pypff message, read and decoded once"""
+    headers = message.get_transport_headers() if hasattr(message, 'get_transport_headers') else None
+    if not headers:
+        return "", ""
+    if isinstance(headers, bytes):
+        headers = headers.decode('utf-8', errors='ignore')
+    
+    sender_email = ""
+    from_match = HEADER_FROM.search(headers)
+    if from_match:
+        email_match = EMAIL.search(from_match.group(1))
+        if email_match:
+            sender_email = email_match.group()
+    id_match = HEADER_MESSAGE_ID.search(headers)
+    message_id = " ".join(id_match.group(1).split()) if id_match else ""
+    return sender_email, message_id
+
+def extract_message(message, include_body=True, resolver=None, message_index=None):
+    """
+    Extract email information from a pypff message, or None if it has no sender email.
+    With include_body=False the body is left empty and never decoded.
+    With message_index (a MessageIndex), DuplicateMessage is raised for a
+    message already claimed in the run; with a Message-ID that is checked
+    before the body is decoded. A message without one is only checked once
+    its body is decoded, as its fingerprint covers the body.
+    The sender and message id come from the message's MAPI properties, with
+    Exchange senders resolved to SMTP by resolver (a SenderResolver of the
+    message's PST). The transport headers are only parsed for what the
+    properties leave out, and the PST only scanned for an Exchange sender
+    still unresolved after that.
+    """
+    properties = item_strings(message, MESSAGE_PROPERTIES)
+    if _matches(properties.get(PR_MESSAGE_CLASS), NON_EMAIL_CLASSES):
+        return None
+    if resolver is None:
+        resolver = SenderResolver()
+    
+    sender_email = resolver.resolve(properties)
+    message_id = properties.get(PR_INTERNET_MESSAGE_ID, "").strip()
+    if not sender_email or not message_id:
+        header_sender, header_id = transport_header_fields(message)
+        sender_email = sender_email or header_sender
+        message_id = message_id or header_id
+    if not sender_email:
+        sender_email = resolver.resolve(properties, scan=True)
+    
+    # Only keep emails with valid sender email
+    if not sender_email:
+        return None
+    
+    subject = message.get_subject() if hasattr(message, 'get_subject') else ""
+    sender_name = message.get_sender_name() if hasattr(message, 'get_sender_name') else ""
+    delivery_time = message.get_delivery_time() if hasattr(message, 'get_delivery_time') else None
+    
+    email_data = EmailRecord(subject, message_id, sender_name, sender_email, sent=delivery_time)
+    if message_index is not None and message_id:
+        message_index.check(email_data)
+    if include_body:
+        email_data.body = extract_email_body(message)
+        if message_index is not None and not message_id:
+            # Without a Message-ID the fingerprint covers the body
+            message_index.check(email_data)
+    return email_data
+
+def _entry_string(entry):
+    """Value of a pypff record entry as a string, None for non-string properties"""
+    value_type = entry.get_value_type()
+    if value_type not in STRING_VALUE_TYPES:
+        return None
+    if hasattr(entry, 'get_data_as_string'):
+        return entry.get_data_as_string()
+    data = entry.get_data()
+    if not data:
+        return None
+    return data.decode('utf-16-le' if value_type == 0x001F else 'cp1252', errors='ignore').rstrip('\x00')
+
+def item_strings(item, prop_ids):
+    """{property id: value} of the given string properties of a pypff item, without decoding any other"""
+    properties = {}
+    if not hasattr(item, 'get_number_of_record_sets'):
+        return properties
+    for i in range(item.get_number_of_record_sets()):
+        record_set = item.get_record_set(i)
+        for j in range(record_set.get_number_of_entries()):
+            entry = record_set.get_entry(j)
+            entry_type = entry.get_entry_type()
+            if entry_type not in prop_ids or entry_type in properties:
+                continue
+            try:
+                value = _entry_string(entry)
+            except Exception:
+                continue
+            if value:
+                properties[entry_type] = value
+    return properties
+
+def _smtp(value):
+    match = EMAIL.search(value or "")
+    return match.group() if match else None
+
+def _is_legacy_dn(address_type, address):
+    return (address_type or "").upper() == "EX" or (address or "").lower().startswith("/o=")
+
+class SenderResolver:
+    """
+    SMTP sender addresses of the messages of one PST, from their MAPI
+    properties. Internal Exchange mail may name its sender only by an X.500
+    legacy DN (address type EX) and carries no transport headers; such DNs
+    are looked up in a DN -> SMTP table of the PST. Every message whose
+    properties hold both forms adds to the table as it is extracted. The
+    first DN still unknown triggers a single scan of the sender properties
+    of every message below root, after which the table is complete. A table
+    already scanned from the PST (addresses) is used as is.
+    """
+
+    def __init__(self, root=None, addresses=None):
+        self.root = root
+        self.addresses = dict(addresses) if addresses is not None else {}
+        self.scanned = root is None or addresses is not None
+
+    def learn(self, properties):
+        for smtp_id, type_id, address_id in SENDER_PROPERTIES:
+            address = properties.get(address_id)
+            smtp = _smtp(properties.get(smtp_id))
+            if smtp and address and _is_legacy_dn(properties.get(type_id), address):
+                self.addresses.setdefault(address.strip().lower(), smtp)
+
+    def resolve(self, properties, scan=False):
+        """SMTP address of the sender, None if only a DN that is not (yet) in the table is recorded"""
+        self.learn(properties)
+        for smtp_id, type_id, address_id in SENDER_PROPERTIES:
+            smtp = _smtp(properties.get(smtp_id))
+            if smtp:
+                return smtp
+            address = properties.get(address_id)
+            if address and not _is_legacy_dn(properties.get(type_id), address):
+                smtp = _smtp(address)
+                if smtp:
+                    return smtp
+        
+        for smtp_id, type_id, address_id in SENDER_PROPERTIES:
+            address = properties.get(address_id)
+            if not address or not _is_legacy_dn(properties.get(type_id), address):
+                continue
+            key = address.strip().lower()
+            if key not in self.addresses and scan and not self.scanned:
+                self.scan()
+            if key in self.addresses:
+                return self.addresses[key]
+        return None
+
+    def scan(self):
+        """Add the sender DN -> SMTP pairs of every message of the PST to the table"""
+        self.scanned = True
+        start = time.time()
+        for folder, _, folder_name in iter_pst_folders(self.root):
+            try:
+                count = folder.get_number_of_sub_messages()
+            except Exception as e:
+                logger.warning(f"Error scanning folder {folder_name or '/'} for sender addresses: {str(e)}")
+                continue
+            for i in range(count):
+                try:
+                    self.learn(item_strings(folder.get_sub_message(i), SENDER_ADDRESS_PROPERTIES))
+                except Exception as e:
+                    logger.warning(f"Error scanning message {i} in {folder_name or '/'} for sender addresses: {str(e)}")
+        logger.info(f"Resolved {len(self.addresses)} Exchange sender addresses to SMTP "
+                    f"in {time.time() - start:.1f}s")
+
+def item_string_properties(item):
+    """{property id: value} of the string properties of a pypff message or attachment"""
+    properties = {}
+    if not hasattr(item, 'get_number_of_record_sets'):
+        return properties
+    for i in range(item.get_number_of_record_sets()):
+        record_set = item.get_record_set(i)
+        for j in range(record_set.get_number_of_entries()):
+            entry = record_set.get_entry(j)
+            try:
+                value = _entry_string(entry)
+            except Exception:
+                continue
+            if value:
+                properties.setdefault(entry.get_entry_type(), value)
+    return properties
+
+def contact_from_properties(properties):
+    """Contact record of an IPM.Contact item, None if it has no email address"""
+    # Email1..3 are named properties: take the values that are plain addresses
+    named_emails = [value for prop, value in sorted(properties.items())
+                    if prop >= FIRST_NAMED_PROPERTY and EMAIL.fullmatch(value.strip())]
+    landline = next((properties[prop] for prop in (PR_BUSINESS_TELEPHONE_NUMBER, PR_BUSINESS2_TELEPHONE_NUMBER,
+                                                   PR_PRIMARY_TELEPHONE_NUMBER, PR_HOME_TELEPHONE_NUMBER)
+                     if properties.get(prop)), None)
+    return contact_record(
+        [properties.get(PR_EMAIL_ADDRESS)] + named_emails,
+        first_name=properties.get(PR_GIVEN_NAME), last_name=properties.get(PR_SURNAME),
+        full_name=properties.get(PR_DISPLAY_NAME), company=properties.get(PR_COMPANY_NAME),
+        department=properties.get(PR_DEPARTMENT_NAME), landline_phone=landline,
+        mobile_phone=properties.get(PR_MOBILE_TELEPHONE_NUMBER), street=properties.get(PR_STREET_ADDRESS),
+        city=properties.get(PR_LOCALITY), postal_code=properties.get(PR_POSTAL_CODE),
+        country=properties.get(PR_COUNTRY), source="pst:contact"
+    )
+
+def attachment_vcards(message):
+    """
+    Contact records of the vCard attachments of a pypff message. Messages
+    whose flags record no attachment are not opened further, and only
+    attachments whose name or MIME type shows a vCard are read.
+    """
+    records = []
+    flags = _item_integer(message, PR_MESSAGE_FLAGS)
+    if flags is not None and not flags & MSGFLAG_HASATTACH:
+        return records
+    count = message.get_number_of_attachments() if hasattr(message, 'get_number_of_attachments') else 0
+    for i in range(count):
+        attachment = message.get_attachment(i)
+        properties = item_strings(attachment, ATTACHMENT_TYPE_PROPERTIES)
+        name = properties.get(PR_ATTACH_LONG_FILENAME) or properties.get(PR_ATTACH_FILENAME)
+        if not is_vcard_attachment(name, properties.get(PR_ATTACH_MIME_TAG)):
+            continue
+        size = attachment.get_size()
+        if not size or size > MAX_VCARD_BYTES:
+            continue
+        records.extend(parse_vcards(attachment.read_buffer(size), source="pst:vcard"))
+    return records
+
+def extract_structured_contacts(message, has_sender=True):
+    """
+    Structured contact records held by a pypff message: the item itself if it
+    is an IPM.Contact, plus its vCard attachments. Contact items carry no
+    transport headers, so only messages without a sender are checked for it.
+    """
+    records = []
+    if not has_sender:
+        properties = item_string_properties(message)
+        if is_contact_class(properties.get(PR_MESSAGE_CLASS)):
+            record = contact_from_properties(properties)
+            return [record] if record else []
+    records.extend(attachment_vcards(message))
+    return records
+
+def _item_integer(item, prop_id):
+    """Value of an integer MAPI property of a pypff item, None if absent"""
+    if not hasattr(item, 'get_number_of_record_sets'):
+        return None
+    for i in range(item.get_number_of_record_sets()):
+        record_set = item.get_record_set(i)
+        for j in range(record_set.get_number_of_entries()):
+            entry = record_set.get_entry(j)
+            if entry.get_entry_type() == prop_id and entry.get_value_type() in INTEGER_VALUE_TYPES:
+                data = entry.get_data()
+                return int.from_bytes(data, 'little') if data else None
+    return None
+
+def _message_class_and_size(message):
+    """(message class, size in bytes) of a pypff message, reading its properties once"""
+    message_class = message.get_message_class() if hasattr(message, 'get_message_class') else None
+    size = None
+    if not hasattr(message, 'get_number_of_record_sets'):
+        return message_class, size
+    for i in range(message.get_number_of_record_sets()):
+        record_set = message.get_record_set(i)
+        for j in range(record_set.get_number_of_entries()):
+            entry = record_set.get_entry(j)
+            entry_type = entry.get_entry_type()
+            if entry_type == PR_MESSAGE_CLASS and message_class is None:
+                message_class = _entry_string(entry)
+            elif entry_type == PR_MESSAGE_SIZE and entry.get_value_type() in INTEGER_VALUE_TYPES:
+                data = entry.get_data()
+                size = int.from_bytes(data, 'little') if data else None
+            if message_class is not None and size is not None:
+                return message_class, size
+    return message_class, size
+
+def _matches(value, patterns):
+    value = (value or "").lower()
+    return any(fnmatch.fnmatchcase(value, pattern.lower()) for pattern in patterns)
+
+class PstItemFilter:
+    """
+    Which PST folders and message classes to extract, decided before any
+    message of a skipped folder is opened and before any header or body of
+    a skipped message is read. Counts what it skipped, so the filter can be
+    tuned from the run report.
+
+    Folders are skipped by container class (IPF.*) or by their path, as
+    built during traversal (e.g. "/Top of Personal Folders/Junk E-mail"),
+    both matched against case-insensitive globs; a skipped folder's
+    sub-folders are skipped with it. With message_classes, only messages
+    whose class matches one of those globs are extracted; skip_message_classes
+    then removes classes from what is left.
+
+    With window (a TimeWindow), messages delivered outside it are skipped
+    right after their delivery time is read, and the newest delivery time
+    of the emails extracted per PST is tracked in latest, to advance the
+    window's watermarks.
+    """
+
+    def __init__(self, skip_folders=DEFAULT_SKIP_FOLDERS, skip_container_classes=DEFAULT_SKIP_CONTAINER_CLASSES,
+                 message_classes=None, skip_message_classes=(), window=None):
+        self.skip_folders = tuple(skip_folders or ())
+        self.skip_container_classes = tuple(skip_container_classes or ())
+        self.message_classes = tuple(message_classes) if message_classes else None
+        self.skip_message_classes = tuple(skip_message_classes or ())
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.skipped = {"folders": 0, "items": 0, "bytes": 0, "out_of_window": 0}
+        self.latest = {}
+        self._mailbox = None
+        self._since = None
+        self._resumed = False
+
+    def add(self, skipped, latest=None):
+        """Add the counts and newest delivery times of a copy of this filter that ran in a worker process"""
+        for key, value in skipped.items():
+            self.skipped[key] = self.skipped.get(key, 0) + value
+        for mailbox, sent in (latest or {}).items():
+            if sent > self.latest.get(mailbox, sent - 1):
+                self.latest[mailbox] = sent
+
+    def open_mailbox(self, pst_path):
+        """Apply the window bounds of the PST whose messages are read next"""
+        self._mailbox = str(pst_path)
+        if self.window:
+            self._since, self._resumed = self.window.since_for(pst_path)
+
+    def folder_allowed(self, folder, folder_name):
+        skip = _matches(folder_name, self.skip_folders)
+        if not skip and self.skip_container_classes:
+            try:
+                container_class = item_string_properties(folder).get(PR_CONTAINER_CLASS)
+            except Exception as e:
+                logger.warning(f"Error reading the container class of {folder_name}: {str(e)}")
+                container_class = None
+            skip = _matches(container_class, self.skip_container_classes)
+        if skip:
+            self._count_skipped_tree(folder, folder_name)
+        return not skip
+
+    def _count_skipped_tree(self, folder, folder_name):
+        """Count the items and, where folders record it, the size of a skipped sub-tree without opening messages"""
+        for subfolder, _, _ in iter_pst_folders(folder, root_name=folder_name):
+            self.skipped["folders"] += 1
+            try:
+                self.skipped["items"] += subfolder.get_number_of_sub_messages()
+                self.skipped["bytes"] += _item_integer(subfolder, PR_MESSAGE_SIZE) or 0
+            except Exception as e:
+                logger.warning(f"Error counting skipped folder {folder_name}: {str(e)}")
+
+    def filters_messages(self):
+        return bool(self.message_classes or self.skip_message_classes)
+
+    def filters_time(self):
+        return bool(self.window)
+
+    def message_in_window(self, message):
+        try:
+            delivery_time = message.get_delivery_time() if hasattr(message, 'get_delivery_time') else None
+        except Exception:
+            delivery_time = None
+        sent = encode_date(delivery_time)[0]
+        if not self.window.contains(sent, self._since, self._resumed):
+            self.skipped["out_of_window"] += 1
+            return False
+        return True
+
+    def extracted(self, email_data):
+        """
+        Track the delivery time of an email extracted from the current PST.
+        Items skipped later, by class or for lack of a sender, leave the
+        watermark alone, so mail delivered before them is read next time.
+        """
+        sent = email_data.sent
+        if not self.window or sent is None or self._mailbox is None:
+            return
+        if sent > self.latest.get(self._mailbox, sent - 1):
+            self.latest[self._mailbox] = sent
+
+    def message_allowed(self, message):
+        message_class, size = _message_class_and_size(message)
+        allowed = not _matches(message_class, self.skip_message_classes)
+        if allowed and self.message_classes:
+            allowed = _matches(message_class, self.message_classes)
+        if not allowed:
+            self.skipped["items"] += 1
+            self.skipped["bytes"] += size or 0
+        return allowed
+
+    def log_summary(self):
+        if self.skipped["folders"] or self.skipped["items"]:
+            logger.info(f"Skipped {self.skipped['folders']} folders and {self.skipped['items']} items "
+                        f"({self.skipped['bytes'] / (1024 * 1024):.1f} MB) by folder and message class")
+        if self.skipped["out_of_window"]:
+            logger.info(f"Skipped {self.skipped['out_of_window']} messages delivered outside the window "
+                        f"({self.window.describe()})")
+
+def _claim(message_index, email_data):
+    """
+    Claim an email in message_index, False for a duplicate. An email still
+    waiting for its body and without a Message-ID cannot be fingerprinted
+    yet; it is claimed once its body is fetched.
+    """
+    if "locator" in email_data and not email_data.get("messageId"):
+        return True
+    return message_index.claim(email_data)
+
+def _locate(email_data, pst_path, folder_path, index):
+    """Attach where a message lives so its body can be fetched in a second pass"""
+    email_data["locator"] = {"file": str(pst_path), "folder": list(folder_path), "index": index}
+    return email_data
+
+def iter_pst_folders(root, item_filter=None, root_name=""):
+    """
+    Yield (folder, folder_path, folder_name) for root and every folder below
+    it, depth first in sub-folder order, using an explicit stack instead of
+    recursion. Only the folders on the path to the current one are held.
+    Folders rejected by item_filter (a PstItemFilter) are left out with
+    their sub-folders.
+    """
+    yield root, (), root_name
+    # [folder, folder_path, folder_name, next sub-folder index, sub-folder count]
+    stack = [[root, (), root_name, 0, None]]
+    
+    while stack:
+        entry = stack[-1]
+        folder, folder_path, folder_name, index, count = entry
+        if count is None:
+            try:
+                count = entry[4] = folder.get_number_of_sub_folders()
+            except Exception as e:
+                logger.error(f"Error processing folder {folder_name or '/'}: {str(e)}")
+                count = entry[4] = 0
+        if index >= count:
+            stack.pop()
+            continue
+        entry[3] = index + 1
+        
+        try:
+            subfolder = folder.get_sub_folder(index)
+            subfolder_name = subfolder.get_name() or f"folder_{index}"
+        except Exception as e:
+            logger.warning(f"Error processing subfolder {index} of {folder_name or '/'}: {str(e)}")
+            continue
+        
+        subfolder_path = folder_path + (index,)
+        subfolder_name = f"{folder_name}/{subfolder_name}"
+        if item_filter is not None and not item_filter.folder_allowed(subfolder, subfolder_name):
+            continue
+        yield subfolder, subfolder_path, subfolder_name
+        stack.append([subfolder, subfolder_path, subfolder_name, 0, None])
+
+def iter_folder_messages(folder, folder_name="", start=0, end=None, include_body=True, on_contact=None,
+                         item_filter=None, resolver=None, message_index=None):
+    """
+    Yield (index, email_data) for messages [start, end) of a folder that have
+    a sender email. Each message handle is released before its email is yielded.
+    With on_contact, contact items and vCard attachments are passed to it as
+    structured contact records. Messages whose class item_filter (a
+    PstItemFilter) rejects are skipped before their headers are read, and
+    so are messages delivered outside its time window, checked first.
+    resolver (a SenderResolver of the PST) resolves Exchange senders to SMTP.
+    Messages already claimed in message_index (a MessageIndex) are skipped.
+    """
+    check_class = item_filter is not None and item_filter.filters_messages()
+    check_time = item_filter is not None and item_filter.filters_time()
+    if end is None:
+        try:
+            end = folder.get_number_of_sub_messages()
+        except Exception as e:
+            logger.error(f"Error processing folder {folder_name or '/'}: {str(e)}")
+            return
+    
+    for i in range(start, end):
+        message = None
+        try:
+            message = folder.get_sub_message(i)
+            if check_time and not item_filter.message_in_window(message):
+                continue
+            if check_class and not item_filter.message_allowed(message):
+                continue
+            email_data = extract_message(message, include_body, resolver, message_index)
+            if on_contact:
+                try:
+                    for record in extract_structured_contacts(message, email_data is not None):
+                        on_contact(record)
+                except Exception as e:
+                    logger.warning(f"Error harvesting contacts from message {i} in {folder_name or '/'}: {str(e)}")
+        except DuplicateMessage:
+            continue
+        except Exception as e:
+            logger.warning(f"Error processing message {i} in {folder_name or '/'}: {str(e)}")
+            continue
+        finally:
+            message = None
+        if email_data:
+            if item_filter is not None:
+                item_filter.extracted(email_data)
+            yield i, email_data
+
+def iter_pst_file(pst_path, include_body=True, on_contact=None, item_filter=None, message_index=None):
+    """
+    Yield the emails of a PST one at a time, in folder order. The PST is
+    closed when the generator is exhausted or closed, so consumers can stop
+    early. With include_body=False only headers are read and each email
+    carries a "locator" for fetch_pst_bodies. Structured contacts are passed
+    to on_contact if given, and item_filter (a PstItemFilter) selects the
+    folders and messages read. Messages already claimed in message_index
+    (a MessageIndex) are skipped.
+    """
+    pst_file = pypff.file()
+    pst_file.open(str(pst_path))
+    if item_filter is not None:
+        item_filter.open_mailbox(pst_path)
+    source_file = str(pst_path)
+    
+    try:
+        root = pst_file.get_root_folder()
+        resolver = SenderResolver(root)
+        for folder, folder_path, folder_name in iter_pst_folders(root, item_filter):
+            for i, email_data in iter_folder_messages(folder, folder_name, include_body=include_body,
+                                                      on_contact=on_contact, item_filter=item_filter,
+                                                      resolver=resolver, message_index=message_index):
+                email_data.source_file = source_file
+                if not include_body:
+                    _locate(email_data, pst_path, folder_path, i)
+                yield email_data
+    finally:
+        pst_file.close()
+
+def process_pst_file(pst_path, on_email=None, include_body=True, on_contact=None, item_filter=None,
+                     message_index=None, strict=False):
+    """
+    Process a single PST file and extract email information.
+    If on_email is given, each email is passed to it instead of being collected.
+    With include_body=False only headers are read and each email carries a
+    "locator" for fetch_pst_bodies. With on_contact, contact items and vCard
+    attachments are harvested and passed to it. item_filter (a PstItemFilter)
+    selects the folders and messages read, and messages already claimed in
+    message_index (a MessageIndex) are skipped. Errors are logged, and with
+    strict=True raised again so the caller knows the file failed.
+    """
     emails = []
+    if on_email is None:
+        on_email = emails.append
+    email_count = 0
     
     try:
         logger.info(f"Processing PST file: {pst_path}")
         
-        # Open the PST file
-        pst_file = pypff.file()
-        pst_file.open(str(pst_path))
+        for email_data in iter_pst_file(pst_path, include_body, on_contact, item_filter, message_index):
+            on_email(email_data)
+            email_count += 1
         
-        # Get the root folder
-        root = pst_file.get_root_folder()
+        logger.info(f"Extracted {email_count} emails from {pst_path.name}")
         
-        def process_folder(folder, folder_name=""):
-            """Recursively process folders and extract emails"""
+    except Exception as e:
+        logger.error(f"Error processing PST file {pst_path}: {str(e)}")
+        if strict:
+            raise
+    
+    return emails
+
+def plan_pst_shards(pst_path, shard_size, item_filter=None):
+    """
+    Enumerate the folder tree of a PST and split it into shards. Returns
+    (shards, addresses), addresses being the DN -> SMTP sender table of the
+    PST, scanned once here so that shards do not each scan the whole PST.
+
+    Each shard is (folder_path, folder_name, start, end) where folder_path is the
+    list of sub-folder indexes leading from the root to the folder, and
+    [start, end) is a range of message indexes inside it. Folders larger than
+    shard_size are split into several ranges. Shards are listed in the same
+    order the serial traversal visits messages. Folders rejected by
+    item_filter (a PstItemFilter) get no shards.
+    """
+    shards = []
+    pst_file = pypff.file()
+    pst_file.open(str(pst_path))
+    
+    try:
+        root = pst_file.get_root_folder()
+        for folder, folder_path, folder_name in iter_pst_folders(root, item_filter):
             try:
-                # Process messages in current folder
-                for i in range(folder.get_number_of_sub_messages()):
-                    try:
-                        message = folder.get_sub_message(i)
-                        
-                        # Extract email information using correct method names
-                        subject = message.get_subject() if hasattr(message, 'get_subject') else ""
-                        sender_name = message.get_sender_name() if hasattr(message, 'get_sender_name') else ""
-                        delivery_time = message.get_delivery_time() if hasattr(message, 'get_delivery_time') else None
-                        
-                        # Get message ID from transport headers if available
-                        message_id = ""
-                        if hasattr(message, 'get_transport_headers'):
-                            headers = message.get_transport_headers()
-                            if headers and 'Message-ID' in str(headers):
-                                import re
-                                id_match = re.search(r'Message-ID:\s*([^\r\n]+)', str(headers))
-                                if id_match:
-                                    message_id = id_match.group(1).strip()
-                        
-                        # Extract sender email from transport headers or other sources
-                        sender_email = ""
-                        if hasattr(message, 'get_transport_headers'):
-                            headers = message.get_transport_headers()
-                            if headers:
-                                # Look for From field in headers
-                                import re
-                                from_match = re.search(r'From:\s*([^\r\n]+)', str(headers))
-                                if from_match:
-                                    from_field = from_match.group(1).strip()
-                                    # Extract email from From field
-                                    email_match = re.search(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', from_field)
-                                    if email_match:
-                                        sender_email = email_match.group()
-                        
-                        email_data = {
-                            "subject": subject or "",
-                            "messageId": message_id,
-                            "senderName": sender_name or "",
-                            "senderEmail": sender_email,
-                            "body": extract_email_body(message),
-                            "sentAt": format_date(delivery_time)
-                        }
-                        
-                        # Only add emails with valid sender email
-                        if email_data["senderEmail"]:
-                            emails.append(email_data)
-                            
-                    except Exception as e:
-                        logger.warning(f"Error processing message {i}: {str(e)}")
-                        continue
-                
-                # Process subfolders recursively
-                for i in range(folder.get_number_of_sub_folders()):
-                    try:
-                        subfolder = folder.get_sub_folder(i)
-                        subfolder_name = subfolder.get_name() or f"folder_{i}"
-                        process_folder(subfolder, f"{folder_name}/{subfolder_name}")
-                    except Exception as e:
-                        logger.warning(f"Error processing subfolder {i}: {str(e)}")
-                        continue
-                        
+                message_count = folder.get_number_of_sub_messages()
             except Exception as e:
-                logger.error(f"Error processing folder {folder_name}: {str(e)}")
-        
-        # Start processing from root
-        process_folder(root)
-        
-        # Close the PST file
+                logger.warning(f"Error enumerating messages of {folder_name or '/'}: {str(e)}")
+                continue
+            for start in range(0, message_count, shard_size):
+                shards.append((list(folder_path), folder_name, start, min(start + shard_size, message_count)))
+        resolver = SenderResolver(root)
+        if shards:
+            resolver.scan()
+    finally:
         pst_file.close()
+    
+    return shards, resolver.addresses
+
+def _plan_shards_task(pst_path, shard_size, on_email, item_filter=None):
+    """Worker task emitting the (shards, addresses) plan of a PST through the same channel as emails"""
+    on_email(plan_pst_shards(pst_path, shard_size, item_filter))
+
+def process_pst_shard(pst_path, folder_path, folder_name, start, end, on_email, include_body=True, on_contact=None,
+                      item_filter=None, message_index=None, addresses=None):
+    """
+    Open a PST read-only and extract messages [start, end) of the folder at
+    folder_path. addresses is the sender table planned for the PST; without
+    it, the shard scans the PST itself if it meets an unknown Exchange DN.
+    """
+    pst_file = pypff.file()
+    pst_file.open(str(pst_path))
+    if item_filter is not None:
+        item_filter.open_mailbox(pst_path)
+    source_file = str(pst_path)
+    
+    try:
+        root = pst_file.get_root_folder()
+        folder = root
+        for i in folder_path:
+            folder = folder.get_sub_folder(i)
         
-        logger.info(f"Extracted {len(emails)} emails from {pst_path.name}")
+        for i, email_data in iter_folder_messages(folder, folder_name, start, end, include_body, on_contact,
+                                                  item_filter, SenderResolver(root, addresses), message_index):
+            email_data.source_file = source_file
+            if not include_body:
+                _locate(email_data, pst_path, folder_path, i)
+            on_email(email_data)
+    finally:
+        pst_file.close()
+
+def fetch_pst_bodies(pst_path, emails, on_email):
+    """
+    Reopen a PST and fill in the bodies of header-only emails using their
+    locators, passing each completed email to on_email in the given order.
+    """
+    pst_file = pypff.file()
+    pst_file.open(str(pst_path))
+    
+    try:
+        root = pst_file.get_root_folder()
+        folders = {(): root}
         
+        for email_data in emails:
+            locator = email_data.pop("locator")
+            folder_path = tuple(locator["folder"])
+            try:
+                folder = folders.get(folder_path)
+                if folder is None:
+                    folder = root
+                    for i in folder_path:
+                        folder = folder.get_sub_folder(i)
+                    folders[folder_path] = folder
+                email_data["body"] = extract_email_body(folder.get_sub_message(locator["index"]))
+            except Exception as e:
+                logger.warning(f"Error fetching body of message {locator['index']} in {pst_path}: {str(e)}")
+            on_email(email_data)
+    finally:
+        pst_file.close()
+
+def _mp_context():
+    """Use fork where available so workers inherit this module even when it was loaded by path"""
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+def _pst_worker(index, task, args, result_queue, chunk_size, harvest=False, item_filter=None, message_index=None):
+    """
+    Worker process entry point: run task(*args, on_email=...) with its own
+    pypff handle and stream extracted emails back to the parent in chunks.
+    With harvest, the task also gets an on_contact callback whose structured
+    contacts are sent back as they are found. item_filter is this process's
+    copy of the filter bound to the task; what it skipped is sent back once
+    the task is done. Messages are only checked against message_index here,
+    the parent claims them as they are emitted; the duplicates found are
+    reported to it.
+    """
+    if item_filter is not None:
+        item_filter.reset()
+    if message_index is not None:
+        message_index.defer_claims()
+    chunk = []
+    options = {}
+    if harvest:
+        options["on_contact"] = lambda record: result_queue.put(("contacts", index, [record]))
+
+    def send(email_data):
+        chunk.append(email_data)
+        if len(chunk) >= chunk_size:
+            result_queue.put(("emails", index, list(chunk)))
+            chunk.clear()
+
+    try:
+        task(*args, on_email=send, **options)
+        if chunk:
+            result_queue.put(("emails", index, list(chunk)))
+        if item_filter is not None:
+            result_queue.put(("skipped", index, (item_filter.skipped, item_filter.latest)))
+        if message_index is not None:
+            message_index.report()
+        result_queue.put(("done", index, None))
     except Exception as e:
-        logger.error(f"Error processing PST file {pst_path}: {str(e)}")
+        result_queue.put(("error", index, str(e)))
+
+def _run_parallel(tasks, labels, workers, on_email, timeout=None, chunk_size=500, on_task_done=None,
+                  ordered=True, max_queued_chunks=None, on_contact=None, item_filter=None, message_index=None):
+    """
+    Run (task, args) pairs in separate worker processes, passing their emails to on_email.
+
+    Each task runs in its own process so a crash or hang in libpff only affects
+    that task. Tasks exceeding timeout (seconds) are terminated and reported as
+    failed. Emails are emitted in task order, as soon as every earlier task has
+    completed, so the output matches a serial run. on_task_done(index, ok) is
+    called after each task's emails have been emitted. Returns the number of
+    emails emitted.
+
+    With ordered=False emails are passed on as soon as they arrive instead of
+    being buffered per task, so partial emails of a failed task are not
+    discarded. max_queued_chunks bounds the chunks waiting in the result queue:
+    workers then block while on_email blocks, and time spent blocked in
+    on_email does not count towards the timeout.
+
+    With on_contact, tasks must accept an on_contact callback; the structured
+    contacts they report are passed on as they arrive, in any order.
+    item_filter is the PstItemFilter the tasks were bound to: the workers'
+    skip counts are added to it. Likewise, the workers report the duplicates
+    found by message_index, the MessageIndex the tasks were bound to. Emails
+    are claimed in it as they are emitted, so the emails of a failed task
+    that are discarded leave no claims behind.
+    """
+    ctx = _mp_context()
+    result_queue = ctx.Queue(max_queued_chunks or 0)
+    pending = list(enumerate(tasks))
+    pending.reverse()
+    running = {}
+    results = {}
+    finished = set()
+    failed = []
+    failed_indexes = set()
+    next_index = 0
+    email_count = 0
+
+    def emit(emails):
+        nonlocal email_count
+        started = time.monotonic()
+        for email_data in emails:
+            if message_index is not None and not _claim(message_index, email_data):
+                continue
+            on_email(email_data)
+            email_count += 1
+        # Workers wait on us while on_email blocks; do not count it against them
+        blocked = time.monotonic() - started
+        for index, (process, started_at) in running.items():
+            running[index] = (process, started_at + blocked)
+
+    def handle(message):
+        kind, index, payload = message
+        if kind == "emails":
+            if ordered:
+                results.setdefault(index, []).extend(payload)
+            else:
+                emit(payload)
+                results[index] = results.get(index, 0) + len(payload)
+        elif kind == "contacts":
+            for record in payload:
+                on_contact(record)
+        elif kind == "skipped":
+            item_filter.add(*payload)
+        elif kind == "done":
+            finished.add(index)
+        elif kind == "error":
+            logger.error(f"Worker failed on {labels[index]}: {payload}")
+            failed_indexes.add(index)
+            finished.add(index)
+
+    def drain(wait=0.0):
+        try:
+            handle(result_queue.get(timeout=wait) if wait else result_queue.get_nowait())
+            while True:
+                handle(result_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+    def discard(index, reason):
+        failed.append(labels[index])
+        failed_indexes.add(index)
+        if ordered:
+            dropped = len(results.pop(index, []))
+            logger.error(f"{reason} for {labels[index]}, discarding {dropped} partial emails")
+        else:
+            logger.error(f"{reason} for {labels[index]}, {results.pop(index, 0)} partial emails already passed on")
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index, (task, args) = pending.pop()
+            process = ctx.Process(target=_pst_worker, daemon=True,
+                                  args=(index, task, args, result_queue, chunk_size, on_contact is not None,
+                                        item_filter, message_index))
+            process.start()
+            running[index] = (process, time.monotonic())
+
+        drain(wait=0.5)
+
+        for index, (process, started_at) in list(running.items()):
+            if index in finished:
+                process.join()
+                del running[index]
+            elif not process.is_alive():
+                # The process may have exited right after its last message was queued
+                drain(wait=0.1)
+                if index not in finished:
+                    discard(index, f"Worker exited with code {process.exitcode}")
+                    finished.add(index)
+                del running[index]
+            elif timeout and time.monotonic() - started_at > timeout:
+                process.terminate()
+                process.join()
+                drain()
+                discard(index, f"Timed out after {timeout}s")
+                finished.add(index)
+                del running[index]
+
+        # Emit completed tasks in order and release their buffers
+        while next_index in finished and next_index not in running:
+            if ordered:
+                emit(results.pop(next_index, []))
+            else:
+                results.pop(next_index, None)
+            if on_task_done:
+                on_task_done(next_index, next_index not in failed_indexes)
+            next_index += 1
+
+    if failed:
+        logger.warning(f"{len(failed)} tasks failed: {', '.join(failed)}")
+
+    return email_count
+
+def process_pst_files_parallel(pst_files, workers, timeout=None, chunk_size=500, on_email=None, on_file_done=None,
+                               include_body=True, ordered=True, max_queued_chunks=None, on_contact=None,
+                               item_filter=None, message_index=None):
+    """
+    Process PST files in parallel, one worker process per file.
+    Returns the emails, or passes them to on_email if given.
+    on_file_done(pst_path, ok) is called once all emails of a file were emitted.
+    ordered, max_queued_chunks, on_contact, item_filter and message_index are
+    passed to _run_parallel.
+    """
+    emails = []
+    logger.info(f"Processing {len(pst_files)} PST files with {workers} workers")
+    task = functools.partial(process_pst_file, include_body=include_body, item_filter=item_filter,
+                             message_index=message_index, strict=True)
+    tasks = [(task, (pst_path,)) for pst_path in pst_files]
+    labels = [pst_path.name for pst_path in pst_files]
+    
+    def task_done(index, ok):
+        if on_file_done:
+            on_file_done(pst_files[index], ok)
+    
+    _run_parallel(tasks, labels, workers, on_email or emails.append, timeout=timeout,
+                  chunk_size=chunk_size, on_task_done=task_done, ordered=ordered,
+                  max_queued_chunks=max_queued_chunks, on_contact=on_contact, item_filter=item_filter,
+                  message_index=message_index)
+    return emails
+
+def process_pst_files_sharded(pst_files, workers, shard_size, timeout=None, chunk_size=500, on_email=None, on_file_done=None,
+                              include_body=True, ordered=True, max_queued_chunks=None, on_contact=None,
+                              item_filter=None, message_index=None):
+    """
+    Process PST files in parallel at folder/message-range granularity, so a
+    single huge PST is spread across all workers. The timeout applies per shard.
+    Returns the emails, or passes them to on_email if given.
+    on_file_done(pst_path, ok) is called once all shards of a file were emitted.
+    ordered, max_queued_chunks, on_contact, item_filter and message_index are
+    passed to _run_parallel; skipped folders are left out when planning shards.
+    """
+    emails = []
+    tasks = []
+    labels = []
+    task_files = []
+    shard_task = functools.partial(process_pst_shard, include_body=include_body, item_filter=item_filter,
+                                   message_index=message_index)
+    
+    # Enumerate folder trees in workers too, so a hanging PST cannot stall planning
+    planned = []
+    plans = {}
+    
+    def plan_done(index, ok):
+        if ok and planned:
+            plans[index] = planned[0]
+        planned.clear()
+    
+    plan_task = functools.partial(_plan_shards_task, item_filter=item_filter)
+    plan_tasks = [(plan_task, (pst_path, shard_size)) for pst_path in pst_files]
+    plan_labels = [f"{pst_path.name} (planning)" for pst_path in pst_files]
+    _run_parallel(plan_tasks, plan_labels, workers, planned.append, timeout=timeout, on_task_done=plan_done,
+                  item_filter=item_filter)
+    
+    for index, pst_path in enumerate(pst_files):
+        if index not in plans:
+            logger.error(f"Could not enumerate PST file {pst_path}")
+            if on_file_done:
+                on_file_done(pst_path, False)
+            continue
+        
+        shards, addresses = plans.pop(index)
+        logger.info(f"Planned {len(shards)} shards for {pst_path.name}")
+        if not shards and on_file_done:
+            on_file_done(pst_path, True)
+        shard_task_of_file = functools.partial(shard_task, addresses=addresses)
+        for folder_path, folder_name, start, end in shards:
+            tasks.append((shard_task_of_file, (pst_path, folder_path, folder_name, start, end)))
+            labels.append(f"{pst_path.name}:{folder_name or '/'}[{start}:{end}]")
+            task_files.append(pst_path)
+    
+    file_ok = {}
+    
+    def task_done(index, ok):
+        pst_path = task_files[index]
+        file_ok[pst_path] = file_ok.get(pst_path, True) and ok
+        is_last_shard = index + 1 == len(task_files) or task_files[index + 1] != pst_path
+        if is_last_shard and on_file_done:
+            on_file_done(pst_path, file_ok.pop(pst_path))
     
+    logger.info(f"Processing {len(tasks)} shards with {workers} workers")
+    _run_parallel(tasks, labels, workers, on_email or emails.append, timeout=timeout,
+                  chunk_size=chunk_size, on_task_done=task_done, ordered=ordered,
+                  max_queued_chunks=max_queued_chunks, on_contact=on_contact, item_filter=item_filter,
+                  message_index=message_index)
     return emails
 
-def process_all_pst_files():
-    """Process all PST files in the input directory"""
+def extract_pst_files(pst_files, workers=1, shard_size=None, timeout=None, on_email=None, on_file_done=None,
+                      include_body=True, ordered=True, max_queued_chunks=None, on_contact=None, item_filter=None,
+                      message_index=None):
+    """
+    Extract emails from PST files serially, per file in parallel, or per shard
+    in parallel. Structured contacts are passed to on_contact if given, and
+    item_filter (a PstItemFilter) selects the folders and messages read and
+    counts what was skipped, including in worker processes. Messages already
+    claimed in message_index (a MessageIndex), by any file or source of the
+    run, are skipped.
+    """
+    if workers and workers > 1 and shard_size:
+        process_pst_files_sharded(pst_files, workers, shard_size, timeout=timeout, on_email=on_email,
+                                  on_file_done=on_file_done, include_body=include_body, ordered=ordered,
+                                  max_queued_chunks=max_queued_chunks, on_contact=on_contact,
+                                  item_filter=item_filter, message_index=message_index)
+    elif workers and workers > 1:
+        process_pst_files_parallel(pst_files, min(workers, len(pst_files)), timeout=timeout, on_email=on_email,
+                                   on_file_done=on_file_done, include_body=include_body, ordered=ordered,
+                                   max_queued_chunks=max_queued_chunks, on_contact=on_contact,
+                                   item_filter=item_filter, message_index=message_index)
+    else:
+        # Process each PST file
+        for pst_file in pst_files:
+            try:
+                process_pst_file(pst_file, on_email=on_email, include_body=include_body, on_contact=on_contact,
+                                 item_filter=item_filter, message_index=message_index, strict=True)
+                ok = True
+            except Exception:
+                ok = False
+            if on_file_done:
+                on_file_done(pst_file, ok)
+
+def process_pst_files_lazy(pst_files, workers=1, shard_size=None, timeout=None, on_email=None, on_file_done=None,
+                           on_contact=None, item_filter=None, message_index=None):
+    """
+    Two-pass extraction that only decodes bodies that survive deduplication.
+
+    Pass 1 reads headers only and keeps the first email per normalized sender,
+    exactly like the deduplicator would. Pass 2 reopens each PST and fetches
+    the bodies of those representatives by folder/index locator. Emails are
+    emitted per file in the original traversal order. Structured contacts are
+    harvested, and item_filter and message_index are applied, in pass 1;
+    representatives without a Message-ID are only checked against
+    message_index in pass 2, once their body is read.
+    """
+    winners = {}
+    header_count = 0
+    failed_files = set()
+    
+    def select(email_data):
+        nonlocal header_count
+        header_count += 1
+        winners.setdefault(normalize_sender(email_data), email_data)
+    
+    def headers_done(pst_path, ok):
+        if not ok:
+            failed_files.add(str(pst_path))
+    
+    logger.info(f"Pass 1: reading headers of {len(pst_files)} PST files")
+    extract_pst_files(pst_files, workers, shard_size=shard_size, timeout=timeout,
+                      on_email=select, on_file_done=headers_done, include_body=False, on_contact=on_contact,
+                      item_filter=item_filter, message_index=message_index)
+    
+    by_file = {str(pst_path): [] for pst_path in pst_files}
+    for email_data in winners.values():
+        by_file[email_data["locator"]["file"]].append(email_data)
+    winners.clear()
+    
+    selected = sum(len(emails) for emails in by_file.values())
+    logger.info(f"Pass 1 done: {header_count} emails, {selected} sender representatives to fetch bodies for")
+    
+    def emit(email_data):
+        if message_index is not None and not email_data.get("messageId") and not message_index.claim(email_data):
+            return
+        on_email(email_data)
+    
+    def file_done(pst_path, ok):
+        # Files that failed in pass 1 still emit what was read, but are reported as failed
+        if on_file_done:
+            on_file_done(pst_path, ok and str(pst_path) not in failed_files)
+    
+    tasks = []
+    task_files = []
+    for pst_path in pst_files:
+        emails = by_file.pop(str(pst_path))
+        if emails:
+            tasks.append((fetch_pst_bodies, (pst_path, emails)))
+            task_files.append(pst_path)
+        else:
+            file_done(pst_path, True)
+    
+    logger.info(f"Pass 2: fetching {selected} bodies from {len(tasks)} PST files")
+    if workers and workers > 1 and tasks:
+        labels = [f"{pst_path.name} (bodies)" for pst_path in task_files]
+        _run_parallel(tasks, labels, min(workers, len(tasks)), emit, timeout=timeout,
+                      on_task_done=lambda index, ok: file_done(task_files[index], ok))
+    else:
+        for (task, args), pst_path in zip(tasks, task_files):
+            try:
+                task(*args, on_email=emit)
+                ok = True
+            except Exception as e:
+                logger.error(f"Error fetching bodies from {pst_path}: {str(e)}")
+                ok = False
+            file_done(pst_path, ok)
+
+def process_all_pst_files(workers=1, timeout=None, shard_size=None,
+                          output_format="json", compression=None, max_shard_bytes=None,
+                          incremental=False, lazy_bodies=False, metrics=None, harvest_contacts=True,
+                          item_filter=None, store=None, message_index=None, dedup_messages=True, window=None):
+    """
+    Process all PST files in the input directory.
+    With workers > 1, files are processed in parallel worker processes.
+    With shard_size set, each PST is further split into folder/message-range
+    shards of at most shard_size messages.
+    With output_format="jsonl", emails are streamed to disk one per line as
+    they are extracted instead of being collected into a single JSON array.
+    With incremental=True (implies JSONL), files already recorded in the
+    ingestion manifest with the same size, mtime and content are skipped.
+    With lazy_bodies=True, only the first email per sender is kept and only
+    its body is decoded (see process_pst_files_lazy).
+    With metrics (a RunMetrics), messages and decoded body bytes are counted
+    under the "pst" stage.
+    With harvest_contacts=True, contact items and vCard attachments are
+    written as structured contacts to contacts/structured_contacts_pst_*.jsonl,
+    replacing those of earlier runs unless only part of the files or
+    messages were read (incremental, window or a failed file).
+    item_filter (a PstItemFilter, by default skipping calendar, task, note,
+    journal and junk folders) selects the folders and message classes read;
+    the folders, items and bytes it skipped are logged and counted.
+    With store (an EmailStore), emails are inserted into it instead of being
+    written to output/, replacing those of earlier runs over the same files.
+    With dedup_messages=True, copies of a message already read in this run
+    (same Message-ID, or same sender, date, subject and body) are skipped
+    before their body is decoded. Pass a message_index (a MessageIndex) to
+    share this across the PST and MSG processors; by default the index only
+    spans this call's files.
+    With window (a TimeWindow, applied through item_filter), only messages
+    delivered in it are extracted. If it has watermarks, a PST read past its
+    watermark adds to the output of earlier runs instead of replacing it,
+    and the watermarks are advanced and saved once the output is written.
+    """
     # Define paths
     input_dir = Path("input")
     output_dir = Path("output")
+    contacts_dir = Path("contacts")
     
     # Ensure output directory exists
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -162,12 +1219,144 @@ def process_all_pst_files():
     
     logger.info(f"Found {len(pst_files)} PST files to process")
     
+    manifest = None
+    if incremental:
+        output_format = "jsonl"
+        manifest = IngestionManifest(MANIFEST_FILE)
+        pst_files = manifest.pending(pst_files)
+        manifest.save()
+        if not pst_files:
+            logger.info("No new or changed PST files")
+            return 0
+    
+    if item_filter is None:
+        item_filter = PstItemFilter()
+    item_filter.reset()
+    if window is not None:
+        item_filter.window = window
+    window = item_filter.window
+    watermarks = window.watermarks if window else None
+    resumed = {str(pst_path) for pst_path in pst_files if watermarks and window.resumes(pst_path)}
+    if resumed:
+        logger.info(f"Reading {len(resumed)} PST files past their watermark")
+    completed = []
+    
     all_emails = []
+    writer = None
+    store_writer = None
+    # Held until the end of the run, so their bodies are kept compressed
+    on_email = lambda email_data: all_emails.append(email_data.compact())
+    if store:
+        store.forget_files("pst", [pst_path for pst_path in pst_files if str(pst_path) not in resumed])
+        store_writer = store.writer("pst")
+        on_email = store_writer.write
+    elif output_format == "jsonl":
+        writer = JsonlShardWriter(output_dir, "pst_emails", compression=compression, max_shard_bytes=max_shard_bytes)
+        on_email = writer.write
+    if metrics:
+        on_email = metrics.counting("pst", on_email)
     
-    # Process each PST file
-    for pst_file in pst_files:
-        emails = process_pst_file(pst_file)
-        all_emails.extend(emails)
+    own_index = dedup_messages and message_index is None
+    if own_index:
+        message_index = MessageIndex()
+    elif not dedup_messages:
+        message_index = None
+    duplicates_before = message_index.total_duplicates() if message_index else 0
+    
+    contact_writer = None
+    on_contact = None
+    if harvest_contacts:
+        contact_writer = JsonlShardWriter(contacts_dir, "structured_contacts_pst")
+        on_contact = contact_writer.write
+    
+    file_start = 0
+    
+    def record(pst_path, outputs, count):
+        previous = manifest.inputs.get(str(pst_path)) if str(pst_path) in resumed else None
+        if previous:
+            # Only newer messages were read, the earlier ones are still current
+            outputs = previous["outputs"] + outputs
+            count += previous["emails"]
+        manifest.record(pst_path, outputs, count)
+        manifest.save()
+    
+    def file_done(pst_path, ok):
+        nonlocal file_start
+        if ok:
+            completed.append(pst_path)
+        if store_writer:
+            store_writer.file_done(pst_path)
+            if manifest and ok:
+                record(pst_path, [], store_writer.count - file_start)
+            file_start = store_writer.count
+            return
+        if not writer:
+            return
+        if manifest and ok:
+            record(pst_path, writer.ranges_since(file_start), writer.count - file_start)
+        file_start = writer.count
+    
+    def save_watermarks():
+        """Advance the watermarks of the PSTs read to the end, once their emails are written"""
+        if watermarks is None:
+            return
+        for pst_path in completed:
+            watermarks.advance(pst_path, item_filter.latest.get(str(pst_path)))
+        watermarks.save()
+    
+    try:
+        if lazy_bodies:
+            process_pst_files_lazy(pst_files, workers, shard_size=shard_size, timeout=timeout,
+                                   on_email=on_email, on_file_done=file_done, on_contact=on_contact,
+                                   item_filter=item_filter, message_index=message_index)
+        else:
+            extract_pst_files(pst_files, workers, shard_size=shard_size, timeout=timeout,
+                              on_email=on_email, on_file_done=file_done, on_contact=on_contact,
+                              item_filter=item_filter, message_index=message_index)
+        if message_index:
+            duplicates = message_index.total_duplicates() - duplicates_before
+            if duplicates:
+                logger.info(f"Skipped {duplicates} copies of messages already read in this run")
+            if metrics:
+                metrics.count("pst", "duplicate_messages", duplicates)
+    finally:
+        if own_index:
+            message_index.close()
+        if writer:
+            writer.close()
+        if store_writer:
+            store_writer.close()
+        if contact_writer:
+            contact_writer.close()
+    
+    item_filter.log_summary()
+    if metrics:
+        for key, value in item_filter.skipped.items():
+            metrics.count("pst", f"skipped_{key}", value)
+    
+    if contact_writer and contact_writer.count:
+        logger.info(f"Harvested {contact_writer.count} structured contacts to {contacts_dir}")
+        if metrics:
+            metrics.count("pst", "structured_contacts", contact_writer.count)
+    if contact_writer and not incremental and not window and len(completed) == len(pst_files):
+        # Every PST was read again in full, the contacts of earlier runs are superseded
+        prune_structured_contacts(contacts_dir, "pst", contact_writer.paths)
+    
+    if store_writer:
+        if store_writer.count:
+            logger.info(f"Stored {store_writer.count} emails in {store.path}")
+        else:
+            logger.warning("No emails were extracted from PST files")
+        save_watermarks()
+        return store_writer.count
+    
+    if writer:
+        if writer.count:
+            logger.info(f"Streamed {writer.count} emails to {len(writer.paths)} JSONL shards in {output_dir}")
+        else:
+            logger.warning("No emails were extracted from PST files")
+        save_watermarks()
+        return writer.count
     
     # Save all emails to JSON file
     if all_emails:
@@ -176,17 +1365,97 @@ def process_all_pst_files():
         
         try:
             with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(all_emails, f, indent=2, ensure_ascii=False)
+                json.dump(all_emails, f, indent=2, ensure_ascii=False, default=json_default)
             
             logger.info(f"Saved {len(all_emails)} emails to {output_file}")
             
         except Exception as e:
             logger.error(f"Error saving emails to JSON: {str(e)}")
+            return len(all_emails)
     
     else:
         logger.warning("No emails were extracted from PST files")
     
+    save_watermarks()
     return len(all_emails)
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract emails from PST files")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (0 = one per CPU core)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Per-file (or per-shard) timeout in seconds when running in parallel")
+    parser.add_argument("--shard-size", type=int, default=None,
+                        help="Split each PST into shards of at most this many messages")
+    parser.add_argument("--format", dest="output_format", choices=["json", "jsonl"], default="json",
+                        help="Output a single JSON array or stream JSONL shards")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None,
+                        help="Compress JSONL shards")
+    parser.add_argument("--max-shard-mb", type=float, default=None,
+                        help="Rotate JSONL output to a new shard after this many MB")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip PST files already recorded in the ingestion manifest (implies --format jsonl)")
+    parser.add_argument("--lazy-bodies", action="store_true",
+                        help="Read headers first and only decode bodies of the first email per sender")
+    parser.add_argument("--no-contacts", dest="harvest_contacts", action="store_false",
+                        help="Do not harvest contact items and vCard attachments as structured contacts")
+    parser.add_argument("--store", nargs="?", const=str(DEFAULT_STORE_PATH), default=None,
+                        help="Insert emails into the SQLite email store (optionally at this path) instead of output/")
+    parser.add_argument("--no-message-dedup", dest="dedup_messages", action="store_false",
+                        help="Keep every copy of a message found in several PST files")
+    parser.add_argument("--message-index", default=None,
+                        help="Message dedup index database to share with an MSG processor run (default: temporary)")
+    parser.add_argument("--skip-folders", default="",
+                        help="Comma-separated folder path globs to skip, in addition to the defaults "
+                             "(e.g. '*/Deleted Items,*/Archive/*')")
+    parser.add_argument("--all-folders", action="store_true",
+                        help="Do not skip junk, calendar, task, note and journal folders by default")
+    parser.add_argument("--message-classes", default="",
+                        help="Comma-separated message class globs to extract, e.g. 'IPM.Note*' (default: all)")
+    parser.add_argument("--skip-message-classes", default="",
+                        help="Comma-separated message class globs to skip, e.g. 'IPM.Schedule.Meeting*'")
+    parser.add_argument("--since", type=parse_time, default=None,
+                        help="Only extract messages delivered since this ISO date or time ago (e.g. 2024-01-01, 6m)")
+    parser.add_argument("--until", type=parse_time, default=None,
+                        help="Only extract messages delivered before this ISO date or time ago")
+    parser.add_argument("--watermarks", nargs="?", const=WATERMARKS_FILE, default=None,
+                        help="Only extract messages newer than each PST's watermark from earlier runs, and advance "
+                             "the watermarks in this file (default: watermarks.json)")
+    return parser.parse_args(argv)
+
+def _globs(text):
+    return [pattern.strip() for pattern in (text or "").split(",") if pattern.strip()]
+
+def item_filter_from_args(args):
+    skip_folders = () if args.all_folders else DEFAULT_SKIP_FOLDERS
+    return PstItemFilter(
+        skip_folders=tuple(skip_folders) + tuple(_globs(args.skip_folders)),
+        skip_container_classes=() if args.all_folders else DEFAULT_SKIP_CONTAINER_CLASSES,
+        message_classes=_globs(args.message_classes),
+        skip_message_classes=_globs(args.skip_message_classes),
+        window=TimeWindow(args.since, args.until, Watermarks(args.watermarks) if args.watermarks else None)
+    )
+
 if __name__ == "__main__":
-    process_all_pst_files()
\ No newline at end of file
+    args = parse_args()
+    store = EmailStore(args.store) if args.store else None
+    message_index = MessageIndex(args.message_index) if args.message_index and args.dedup_messages else None
+    process_all_pst_files(
+        workers=args.workers or os.cpu_count(),
+        timeout=args.timeout,
+        shard_size=args.shard_size,
+        output_format=args.output_format,
+        compression=args.compression,
+        max_shard_bytes=int(args.max_shard_mb * 1024 * 1024) if args.max_shard_mb else None,
+        incremental=args.incremental,
+        lazy_bodies=args.lazy_bodies,
+        harvest_contacts=args.harvest_contacts,
+        item_filter=item_filter_from_args(args),
+        store=store,
+        message_index=message_index,
+        dedup_messages=args.dedup_messages
+    )
+    if store:
+        store.close()
+    if message_index:
+        message_index.close()
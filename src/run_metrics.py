@@ -0,0 +1,293 @@
+"""
+Run instrumentation: wall time, CPU time and peak RSS per stage, stage
+counters and latency histograms, written as a JSON run report and
+optionally as a Prometheus textfile (node_exporter textfile collector).
+"""
+
+import os
+import glob
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "email_processing"
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000]
+TOKENS_PER_SECOND_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+# How often the resident set size of worker processes is sampled during a stage
+RSS_SAMPLE_SECONDS = 0.2
+
+def _cpu_seconds():
+    """CPU time of this process and of its terminated children"""
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def _status_kb(pid, field):
+    """A size field of /proc/<pid>/status (e.g. VmRSS) in KB, None where unavailable"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def _child_pids():
+    pids = []
+    for path in glob.glob(f"/proc/{os.getpid()}/task/*/children"):
+        try:
+            with open(path, 'r') as f:
+                pids.extend(f.read().split())
+        except OSError:
+            pass
+    return pids
+
+def _children_maxrss_kb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if resource is not None else 0
+
+class RssSampler:
+    """
+    Peak resident set size of this process and of its largest child process
+    over one stage, on Linux. ru_maxrss only holds the peak over the whole
+    process lifetime, so this process's high-water mark (VmHWM) is reset when
+    the stage starts, and live children are sampled every RSS_SAMPLE_SECONDS
+    by a background thread. A child reaped during the stage that raised the
+    children's ru_maxrss is counted exactly; otherwise a spike shorter than
+    the sampling interval can be missed.
+    """
+
+    def __init__(self):
+        self.own_kb = 0
+        self.child_kb = 0
+        self._children_before = _children_maxrss_kb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        try:
+            with open("/proc/self/clear_refs", 'w') as f:
+                f.write("5")
+            self._hwm_reset = True
+        except OSError:
+            self._hwm_reset = False
+
+    def _sample(self):
+        self.own_kb = max(self.own_kb, _status_kb("self", "VmRSS") or 0)
+        for pid in _child_pids():
+            self.child_kb = max(self.child_kb, _status_kb(pid, "VmRSS") or 0)
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self._sample()
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return (this process, largest child) peak RSS in MB, None where unknown"""
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        if self._hwm_reset:
+            self.own_kb = max(self.own_kb, _status_kb("self", "VmHWM") or 0)
+        children_after = _children_maxrss_kb()
+        if children_after > self._children_before:
+            self.child_kb = max(self.child_kb, children_after)
+        return (round(self.own_kb / 1024, 1) if self.own_kb else None,
+                round(self.child_kb / 1024, 1) if self.child_kb else None)
+
+def _max(current, value):
+    return value if current is None else current if value is None else max(current, value)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.values = []
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.values.append(value)
+
+    def quantile(self, q):
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": max(self.values) if self.values else None,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ["+Inf"], self.counts)}
+        }
+
+class RunMetrics:
+    """
+    Collects per-stage resource usage and counters for one run.
+
+        metrics = RunMetrics()
+        with metrics.stage("pst"):
+            ...
+            metrics.count("pst", "messages", 1200)
+        metrics.write_json("run_report.json")
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.stages = {}
+        self.histograms = {}
+
+    @contextmanager
+    def stage(self, name):
+        wall = time.perf_counter()
+        cpu = _cpu_seconds()
+        sampler = RssSampler().start()
+        stage = self.stages.setdefault(name, {"counters": {}})
+        try:
+            yield stage
+        finally:
+            stage["wall_seconds"] = round(stage.get("wall_seconds", 0) + time.perf_counter() - wall, 3)
+            stage["cpu_seconds"] = round(stage.get("cpu_seconds", 0) + _cpu_seconds() - cpu, 3)
+            own, child = sampler.stop()
+            stage["peak_rss_mb"] = _max(stage.get("peak_rss_mb"), own)
+            stage["peak_child_rss_mb"] = _max(stage.get("peak_child_rss_mb"), child)
+
+    def finish(self, stage, wall_seconds):
+        """Record the wall time of a stage that overlapped with others (pipeline mode)"""
+        stage = self.stages.setdefault(stage, {"counters": {}})
+        stage["wall_seconds"] = round(wall_seconds, 3)
+
+    def count(self, stage, name, value=1):
+        counters = self.stages.setdefault(stage, {"counters": {}})["counters"]
+        counters[name] = counters.get(name, 0) + value
+
+    def counting(self, stage, on_email):
+        """Wrap an on_email callback to count messages and decoded body bytes"""
+        def wrapper(email_data):
+            self.count(stage, "messages")
+            self.count(stage, "body_bytes", len((email_data.get("body") or "").encode("utf-8")))
+            return on_email(email_data)
+        return wrapper
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS_MS):
+        self.histograms.setdefault(name, Histogram(buckets)).observe(value)
+
+    def observe_llm_calls(self, calls, stage="extraction"):
+        """Record the per-call timings kept by OllamaClient.calls"""
+        for call in calls:
+            self.count(stage, "llm_requests")
+            self.observe("llm_request_latency_ms", call["elapsed_ms"])
+            if call.get("eval_count") and call.get("eval_duration_ms"):
+                self.count(stage, "llm_eval_tokens", call["eval_count"])
+                self.observe("llm_eval_duration_ms", call["eval_duration_ms"])
+                self.observe("llm_eval_tokens_per_second",
+                             round(call["eval_count"] / (call["eval_duration_ms"] / 1000), 2),
+                             TOKENS_PER_SECOND_BUCKETS)
+
+    def _derive(self):
+        """Rates and ratios from the raw counters"""
+        for stage in self.stages.values():
+            counters = stage["counters"]
+            if counters.get("messages") and stage.get("wall_seconds"):
+                stage["messages_per_second"] = round(counters["messages"] / stage["wall_seconds"], 1)
+            if counters.get("input_emails"):
+                stage["dedup_ratio"] = round(counters.get("duplicates", 0) / counters["input_emails"], 4)
+
+    def report(self):
+        self._derive()
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "wall_seconds": round(time.time() - self.started_at, 3),
+            "stages": self.stages,
+            "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        logger.info(f"Run report saved to {path}")
+
+    def prometheus_text(self):
+        self._derive()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{full_name}{{{label_text}}} {value}" if label_text else f"{full_name} {value}")
+
+        for key, help_text in (("wall_seconds", "Wall time per stage"),
+                               ("cpu_seconds", "CPU time per stage, including worker processes"),
+                               ("peak_rss_mb", "Peak resident set size of the main process during the stage"),
+                               ("messages_per_second", "Messages extracted per second"),
+                               ("dedup_ratio", "Share of emails removed as duplicate senders")):
+            samples = [({"stage": name}, stage[key]) for name, stage in self.stages.items()
+                       if stage.get(key) is not None]
+            if samples:
+                metric(f"stage_{key}", "gauge", help_text, samples)
+
+        counter_names = sorted({counter for stage in self.stages.values() for counter in stage["counters"]})
+        for counter in counter_names:
+            samples = [({"stage": name}, stage["counters"][counter]) for name, stage in self.stages.items()
+                       if counter in stage["counters"]]
+            # Gauges rather than counters: each run overwrites the textfile
+            metric(counter, "gauge", f"{counter.replace('_', ' ').capitalize()} in the last run", samples)
+
+        for name, histogram in self.histograms.items():
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {full_name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{full_name}_sum {round(histogram.sum, 3)}")
+            lines.append(f"{full_name}_count {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write atomically, as the textfile collector may read at any time"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        logger.info(f"Prometheus metrics saved to {path}")
@@ -0,0 +1,251 @@
+import re
+import json
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+from jsonl_stream import iter_email_file
+from email_deduplicator import write_json_array
+from email_store import EmailStore, DEFAULT_STORE_PATH
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Rough average for French/English text with the Qwen/Mistral tokenizers
+CHARS_PER_TOKEN = 4
+
+# Maximum size of the text kept for the LLM
+MAX_SIGNATURE_CHARS = 1200
+# Lines kept from the end of the message when no sign-off or delimiter is found
+FALLBACK_LINES = 12
+
+# Start of quoted history: reply/forward separators in the languages we see
+QUOTE_MARKERS = re.compile(
+    r"^\s*("
+    r"-{2,}\s*(Original Message|Message d'origine|Message original|Forwarded message|Message transféré)\s*-{2,}"
+    r"|_{10,}"
+    r"|D[ée]but du message (r[ée]exp[ée]di[ée]|transf[ée]r[ée])\s*:"
+    r"|Begin forwarded message\s*:"
+    r"|Le .{0,120}a [ée]crit\s*:"
+    r"|On .{0,120}wrote\s*:"
+    r")",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Outlook inline reply header: "De :" / "From:" followed shortly by "Envoyé :" / "Sent:"
+OUTLOOK_HEADER = re.compile(
+    r"^\s*\*?(De|From)\s*:\*?.*\n(.*\n){0,2}?\s*\*?(Envoy[ée]|Sent|Date)\s*:",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Lines quoted with ">"
+QUOTED_LINE = re.compile(r"^\s*>", re.MULTILINE)
+
+# Standard signature delimiter line ("-- ")
+SIGNATURE_DELIMITER = re.compile(r"^\s*--\s*$", re.MULTILINE)
+
+# Sign-off lines after which the signature usually starts
+SIGN_OFF = re.compile(
+    r"^\s*("
+    r"(bien |tr[èe]s )?cordialement|bien [àa] (vous|toi)|sinc[èe]res salutations|salutations( distingu[ée]es)?"
+    r"|bonne (journ[ée]e|soir[ée]e|fin de journ[ée]e)|[àa] bient[ôo]t|merci( beaucoup| d'avance| par avance)?"
+    r"|(best|kind|warm)( regards)?|regards|best wishes|thanks( and regards)?|thank you|cheers"
+    r")[ ,.!]*$",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Legal disclaimers and mobile client footers appended after the signature
+DISCLAIMER = re.compile(
+    r"^\s*("
+    r"ce (message|courriel|e-?mail)( et (toutes )?les pi[èe]ces jointes)?.{0,40}(confidentiel|destin[ée])"
+    r"|this (e-?mail|message)( and any attachments)?.{0,40}(confidential|intended)"
+    r"|(pensez|merci de penser) [àa] l'environnement"
+    r"|please consider the environment"
+    r"|(envoy[ée] de|sent from) mon (iphone|ipad|smartphone|android)"
+    r"|sent from my (iphone|ipad|android|mobile)"
+    r")",
+    re.IGNORECASE | re.MULTILINE
+)
+
+BLANK_LINES = re.compile(r"\n\s*\n+")
+
+def strip_quoted_history(body):
+    """Cut the body at the first reply/forward marker and drop ">" quoted lines"""
+    text = body.replace("\r\n", "\n").replace("\r", "\n")
+
+    cut = len(text)
+    for pattern in (QUOTE_MARKERS, OUTLOOK_HEADER):
+        match = pattern.search(text)
+        if match and match.start() < cut:
+            cut = match.start()
+    text = text[:cut]
+
+    return "\n".join(line for line in text.split("\n") if not QUOTED_LINE.match(line))
+
+def extract_signature(body):
+    """
+    Isolate the sender's signature block from a message without quoted history.
+
+    Looks for the "-- " delimiter first, then for the last sign-off line
+    ("Cordialement", "Best regards", ...), and otherwise falls back to the
+    last lines of the message. Disclaimers after the signature are dropped.
+    """
+    text = body.strip()
+    if not text:
+        return ""
+
+    delimiter = None
+    for delimiter in SIGNATURE_DELIMITER.finditer(text):
+        pass
+    sign_off = None
+    for sign_off in SIGN_OFF.finditer(text):
+        pass
+
+    if delimiter:
+        signature = text[delimiter.end():]
+    elif sign_off:
+        signature = text[sign_off.start():]
+    else:
+        lines = [line for line in text.split("\n") if line.strip()]
+        signature = "\n".join(lines[-FALLBACK_LINES:])
+
+    disclaimer = DISCLAIMER.search(signature)
+    if disclaimer:
+        signature = signature[:disclaimer.start()]
+
+    signature = BLANK_LINES.sub("\n", signature).strip()
+    return signature[:MAX_SIGNATURE_CHARS]
+
+def reduce_body(body):
+    """Reduce an email body to the part the LLM needs: the sender's signature"""
+    return extract_signature(strip_quoted_history(body or ""))
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+class ReductionStats:
+    """Character and estimated token savings of the signature stage"""
+
+    def __init__(self):
+        self.emails = 0
+        self.original_chars = 0
+        self.reduced_chars = 0
+        self.original_tokens = 0
+        self.reduced_tokens = 0
+        self.empty_signatures = 0
+
+    def add(self, original, reduced):
+        self.emails += 1
+        self.original_chars += len(original)
+        self.reduced_chars += len(reduced)
+        self.original_tokens += estimate_tokens(original)
+        self.reduced_tokens += estimate_tokens(reduced)
+        if not reduced:
+            self.empty_signatures += 1
+
+    def to_dict(self):
+        saved = self.original_chars - self.reduced_chars
+        return {
+            "emails": self.emails,
+            "original_chars": self.original_chars,
+            "reduced_chars": self.reduced_chars,
+            "chars_saved": saved,
+            "original_tokens_estimate": self.original_tokens,
+            "reduced_tokens_estimate": self.reduced_tokens,
+            "tokens_saved_estimate": self.original_tokens - self.reduced_tokens,
+            "reduction_percent": round(100 * saved / self.original_chars, 1) if self.original_chars else 0.0,
+            "empty_signatures": self.empty_signatures
+        }
+
+def reduce_emails(emails, stats=None):
+    """Yield emails with their body replaced by the reduced signature text"""
+    for email in emails:
+        original = email.get("body") or ""
+        reduced = reduce_body(original)
+        if stats is not None:
+            stats.add(original, reduced)
+        yield {**email, "body": reduced}
+
+def latest_file(directory, pattern):
+    files = sorted(Path(directory).glob(pattern), key=lambda x: x.stat().st_mtime)
+    return files[-1] if files else None
+
+def write_summary(stats, contacts_dir, timestamp):
+    summary = stats.to_dict()
+    summary["timestamp"] = timestamp
+    summary_file = contacts_dir / f"signature_summary_{timestamp}.json"
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    logger.info(
+        f"Body size reduced from {summary['original_chars']} to {summary['reduced_chars']} chars "
+        f"({summary['reduction_percent']}%), about {summary['tokens_saved_estimate']} prompt tokens saved"
+    )
+
+def reduce_store(store, contacts_dir):
+    """Store the reduced signature of every deduplicated sender of an EmailStore"""
+    stats = ReductionStats()
+    signatures = []
+    for sender, email in store.iter_senders():
+        original = email.get("body") or ""
+        reduced = reduce_body(original)
+        stats.add(original, reduced)
+        signatures.append((sender, reduced))
+    if not signatures:
+        logger.warning(f"No deduplicated senders found in {store.path}")
+        return 0
+
+    store.set_signatures(signatures)
+    logger.info(f"Stored {len(signatures)} reduced emails in {store.path}")
+    write_summary(stats, contacts_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    return len(signatures)
+
+def process_signature_extraction(store=None):
+    """
+    Reduce the bodies of the latest deduplicated emails to their signature
+    block and save them for contact extraction, with a savings summary.
+    With store (an EmailStore), the signatures of its deduplicated senders
+    are stored in it instead.
+    """
+    contacts_dir = Path("src/contacts-extractor")
+    if store:
+        contacts_dir.mkdir(parents=True, exist_ok=True)
+        return reduce_store(store, contacts_dir)
+    input_file = latest_file(contacts_dir, "deduplicated_emails_*.json")
+
+    if not input_file:
+        logger.warning(f"No deduplicated emails found in {contacts_dir}")
+        return 0
+
+    logger.info(f"Reducing email bodies from {input_file}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = contacts_dir / f"signature_emails_{timestamp}.json"
+    stats = ReductionStats()
+
+    try:
+        count = write_json_array(reduce_emails(iter_email_file(input_file), stats), output_file)
+    except Exception as e:
+        logger.error(f"Error reducing email bodies: {str(e)}")
+        return 0
+
+    logger.info(f"Saved {count} reduced emails to {output_file}")
+    write_summary(stats, contacts_dir, timestamp)
+
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reduce deduplicated email bodies to their signature block")
+    parser.add_argument("--store", nargs="?", const=str(DEFAULT_STORE_PATH), default=None,
+                        help="Reduce the senders of the SQLite email store (optionally at this path)")
+    args = parser.parse_args()
+
+    store = EmailStore(args.store) if args.store else None
+    result = process_signature_extraction(store)
+    if store:
+        store.close()
+    print(f"Reduced {result} email bodies")
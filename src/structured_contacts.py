@@ -0,0 +1,273 @@
+"""
+Structured contacts: Outlook contact items (IPM.Contact) and vCard (.vcf)
+attachments already hold names, companies, phones and addresses as fields.
+The processors harvest them into the ExtractedContactInfo schema, and the
+contact extractor uses them instead of asking the LLM for those senders.
+"""
+
+import re
+import copy
+import quopri
+import logging
+from pathlib import Path
+
+from jsonl_stream import iter_email_file, list_email_files
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CONTACT_MESSAGE_CLASS = "IPM.Contact"
+VCARD_MIME_TYPES = ("text/vcard", "text/x-vcard", "text/directory")
+
+# Where the processors write structured contacts, next to their email output
+STRUCTURED_CONTACT_DIRS = (Path("src/pst-processor/contacts"), Path("src/msg-processor/contacts"))
+
+EMAIL = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+
+# vCard line: [group.]NAME[;PARAM...]:VALUE
+VCARD_LINE = re.compile(r"^(?:[\w-]+\.)?([\w-]+)((?:;[^:]*)?):(.*)$")
+
+def is_contact_class(message_class):
+    """IPM.Contact and its custom form subclasses (IPM.Contact.*), but not distribution lists"""
+    message_class = (message_class or "").strip()
+    return message_class == CONTACT_MESSAGE_CLASS or message_class.startswith(CONTACT_MESSAGE_CLASS + ".")
+
+def is_vcard_name(filename):
+    return (filename or "").strip().lower().endswith((".vcf", ".vcard"))
+
+def is_vcard_attachment(filename, mime_type=None):
+    """Whether an attachment's file name or MIME type shows a vCard, without reading its content"""
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    return is_vcard_name(filename) or mime_type in VCARD_MIME_TYPES
+
+def contact_record(emails, first_name=None, last_name=None, full_name=None, company=None, department=None,
+                   landline_phone=None, mobile_phone=None, street=None, city=None, postal_code=None,
+                   country=None, source=None):
+    """
+    Build an ExtractedContactInfo object from structured fields, plus the
+    list of all its "emails" and its "source". Returns None without a valid
+    email address, as the record could not be matched to a sender.
+    """
+    addresses = []
+    for email in emails:
+        match = EMAIL.search(email or "")
+        if match and match.group().lower() not in (address.lower() for address in addresses):
+            addresses.append(match.group())
+    if not addresses:
+        return None
+
+    def clean(value):
+        value = (value or "").strip()
+        return value or None
+
+    first_name, last_name = clean(first_name), clean(last_name)
+    full_name = clean(full_name) or " ".join(part for part in (first_name, last_name) if part) or None
+    street, city, postal_code, country = clean(street), clean(city), clean(postal_code), clean(country)
+    city_line = " ".join(part for part in (postal_code, city) if part)
+    full_address = ", ".join(part for part in (street, city_line, country) if part) or None
+
+    return {
+        "contact": {
+            "first_name": first_name,
+            "last_name": last_name,
+            "full_name": full_name,
+            "department": clean(department)
+        },
+        "company": clean(company),
+        "contact_info": {
+            "primary_email": addresses[0],
+            "landline_phone": clean(landline_phone),
+            "mobile_phone": clean(mobile_phone)
+        },
+        "address": {
+            "street": street,
+            "city": city,
+            "postal_code": postal_code,
+            "country": country,
+            "full_address": full_address
+        },
+        "emails": addresses,
+        "source": source
+    }
+
+def decode_text(data):
+    """Decode attachment bytes, as UTF-8 when valid and as Windows-1252 (Outlook) otherwise"""
+    if isinstance(data, str):
+        return data
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+def _unfold(text):
+    """Join vCard continuation lines: folded lines and quoted-printable soft breaks"""
+    lines = []
+    for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        if lines and line[:1] in (" ", "\t"):
+            lines[-1] += line[1:]
+        elif lines and lines[-1].endswith("=") and "QUOTED-PRINTABLE" in lines[-1].split(":", 1)[0].upper():
+            lines[-1] = lines[-1][:-1] + line
+        else:
+            lines.append(line)
+    return lines
+
+def _parameters(text):
+    """Upper-cased vCard parameters: ;TYPE=WORK,VOICE;PREF and 2.1-style ;WORK;VOICE"""
+    parameters = {}
+    for parameter in text.split(";"):
+        if not parameter:
+            continue
+        name, _, value = parameter.partition("=")
+        if value:
+            parameters.setdefault(name.upper(), set()).update(v.strip('"').upper() for v in value.split(","))
+        else:
+            parameters.setdefault("TYPE", set()).add(name.upper())
+    return parameters
+
+def _components(value):
+    """Split a structured value on unescaped ';' and unescape each component"""
+    parts = re.split(r"(?<!\\);", value)
+    return [re.sub(r"\\([\\,;])", r"\1", part).replace("\\n", "\n").replace("\\N", "\n").strip()
+            for part in parts]
+
+def parse_vcards(data, source="vcard"):
+    """Contact records of every vCard (2.1, 3.0 or 4.0) in a .vcf payload"""
+    records = []
+    card = None
+
+    for line in _unfold(decode_text(data)):
+        match = VCARD_LINE.match(line.strip())
+        if not match:
+            continue
+        name, parameter_text, value = match.group(1).upper(), match.group(2), match.group(3)
+
+        if name == "BEGIN" and value.strip().upper() == "VCARD":
+            card = {"emails": [], "phones": [], "addresses": []}
+            continue
+        if card is None:
+            continue
+        if name == "END":
+            record = _vcard_record(card, source)
+            if record:
+                records.append(record)
+            card = None
+            continue
+
+        parameters = _parameters(parameter_text)
+        if "QUOTED-PRINTABLE" in parameters.get("ENCODING", ()):
+            charset = next(iter(parameters.get("CHARSET", ())), "UTF-8")
+            try:
+                value = quopri.decodestring(value.encode("latin-1", errors="ignore")).decode(charset, errors="replace")
+            except LookupError:
+                value = quopri.decodestring(value.encode("latin-1", errors="ignore")).decode("utf-8", errors="replace")
+        types = parameters.get("TYPE", set())
+
+        if name == "EMAIL":
+            # Preferred address first
+            card["emails"].insert(0 if "PREF" in types or "PREF" in parameters else len(card["emails"]), value)
+        elif name == "FN":
+            card["full_name"] = _components(value)[0]
+        elif name == "N":
+            parts = _components(value) + [""] * 2
+            card["last_name"], card["first_name"] = parts[0], parts[1]
+        elif name == "ORG":
+            parts = _components(value) + [""]
+            card["company"], card["department"] = parts[0], parts[1]
+        elif name == "TEL" and "FAX" not in types:
+            card["phones"].append((types, value.replace("tel:", "").strip()))
+        elif name == "ADR":
+            card["addresses"].append((types, _components(value) + [""] * 7))
+
+    return records
+
+def _vcard_record(card, source):
+    mobile = next((number for types, number in card["phones"] if types & {"CELL", "MOBILE"}), None)
+    landlines = [(types, number) for types, number in card["phones"] if not types & {"CELL", "MOBILE"}]
+    landline = next((number for types, number in landlines if "WORK" in types), None) or \
+        next((number for _, number in landlines), None)
+    # Post office box, extended address, street, city, region, postal code, country
+    address = next((parts for types, parts in card["addresses"] if "WORK" in types), None) or \
+        next((parts for _, parts in card["addresses"]), [""] * 7)
+    street = " ".join(part for part in (address[2], address[1]) if part)
+
+    return contact_record(
+        card["emails"], first_name=card.get("first_name"), last_name=card.get("last_name"),
+        full_name=card.get("full_name"), company=card.get("company"), department=card.get("department"),
+        landline_phone=landline, mobile_phone=mobile, street=street, city=address[3],
+        postal_code=address[5], country=address[6], source=source
+    )
+
+def merge_records(record, other):
+    """Copy of record with its empty fields filled from other, and the email addresses of both"""
+    merged = copy.deepcopy(record)
+    for key, value in other.items():
+        if isinstance(value, dict):
+            section = merged.setdefault(key, {}) or {}
+            for field, field_value in value.items():
+                if field_value and not section.get(field):
+                    section[field] = field_value
+            merged[key] = section
+        elif key == "emails":
+            known = {email.lower() for email in merged.get("emails", [])}
+            merged["emails"] = merged.get("emails", []) + [email for email in value if email.lower() not in known]
+        elif value and not merged.get(key):
+            merged[key] = value
+    return merged
+
+class StructuredContactIndex:
+    """Structured contact records by lowercased email address, merged when several share an address"""
+
+    def __init__(self):
+        self.records = {}
+
+    def add(self, record):
+        for email in record.get("emails") or [(record.get("contact_info") or {}).get("primary_email")]:
+            if not email:
+                continue
+            key = email.strip().lower()
+            existing = self.records.get(key)
+            self.records[key] = merge_records(existing, record) if existing else record
+
+    def get(self, email):
+        return self.records.get((email or "").strip().lower())
+
+    def __len__(self):
+        return len(self.records)
+
+def prune_structured_contacts(directory, source, current):
+    """
+    Delete the structured contacts written to directory by earlier runs of
+    the source processor ("pst" or "msg"), keeping the files in current.
+    Only called after a run that read every input file, as the files it
+    replaces may hold contacts of files it skipped.
+    """
+    current = {Path(path) for path in current}
+    removed = 0
+    for path in Path(directory).glob(f"structured_contacts_{source}_*.jsonl*"):
+        if path not in current:
+            path.unlink()
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} structured contact files of earlier runs from {directory}")
+    return removed
+
+def load_structured_contacts(directories=STRUCTURED_CONTACT_DIRS):
+    """Index the structured contacts written by the processors"""
+    index = StructuredContactIndex()
+    for directory in directories:
+        if not Path(directory).exists():
+            continue
+        # Newest first, so values harvested again win over those of earlier runs
+        for path in sorted(list_email_files(directory), key=lambda path: path.stat().st_mtime, reverse=True):
+            try:
+                for record in iter_email_file(path):
+                    index.add(record)
+            except Exception as e:
+                logger.error(f"Error loading structured contacts from {path}: {str(e)}")
+    if len(index):
+        logger.info(f"Loaded structured contacts for {len(index)} email addresses")
+    return index
@@ -0,0 +1,145 @@
+"""
+Delivery-time window of a run and per-mailbox watermarks.
+
+--since/--until bound the delivery times of the messages extracted, so the
+processors can drop a message as soon as its delivery time is read, before
+its headers and body. A watermark is the newest delivery time extracted
+from a mailbox (PST file) so far; with watermarks applied, a rerun only
+extracts what arrived in the mailbox since.
+"""
+
+import os
+import re
+import json
+import calendar
+import logging
+from pathlib import Path
+from datetime import datetime, timezone
+
+from email_record import encode_date
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+WATERMARKS_FILE = "watermarks.json"
+
+RELATIVE_TIME = re.compile(r"^(\d+)\s*([dwmy])$", re.IGNORECASE)
+
+def _months_ago(now, months):
+    month = now.year * 12 + now.month - 1 - months
+    year, month = divmod(month, 12)
+    day = min(now.day, calendar.monthrange(year, month + 1)[1])
+    return now.replace(year=year, month=month + 1, day=day)
+
+def parse_time(text, now=None):
+    """
+    Epoch seconds of a --since/--until value: an ISO date or date-time (UTC
+    unless it has an offset), or a time ago such as 90d, 12w, 6m or 1y.
+    """
+    text = text.strip()
+    match = RELATIVE_TIME.match(text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2).lower()
+        now = now or datetime.now(timezone.utc)
+        if unit == "d":
+            return int(now.timestamp()) - count * 86400
+        if unit == "w":
+            return int(now.timestamp()) - count * 7 * 86400
+        return int(_months_ago(now, count * 12 if unit == "y" else count).timestamp())
+    try:
+        value = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid time {text!r}: expected an ISO date such as 2024-01-31 or a time ago "
+                         f"such as 90d, 12w, 6m or 1y")
+    return encode_date(value)[0]
+
+def file_key(path):
+    return str(Path(path).resolve())
+
+class TimeWindow:
+    """
+    Delivery times [since, until) to extract, as epoch seconds; either bound
+    may be None. With watermarks (a Watermarks), each mailbox's watermark
+    raises since for that mailbox: only messages delivered after it are
+    extracted. Messages without a readable delivery time are kept, except
+    when a mailbox is read past its watermark, as they were kept before.
+    """
+
+    def __init__(self, since=None, until=None, watermarks=None):
+        self.since = since
+        self.until = until
+        self.watermarks = watermarks
+
+    def __bool__(self):
+        return self.since is not None or self.until is not None or self.watermarks is not None
+
+    def since_for(self, mailbox):
+        """Lower bound for a mailbox, and whether it comes from its watermark"""
+        watermark = self.watermarks.get(mailbox) if self.watermarks is not None and mailbox else None
+        if watermark is not None and (self.since is None or watermark >= self.since):
+            # Strictly after the newest message already extracted
+            return watermark + 1, True
+        return self.since, False
+
+    def resumes(self, mailbox):
+        """True if the mailbox is only read past its watermark, so earlier output of it stays current"""
+        return self.since_for(mailbox)[1]
+
+    def contains(self, sent, since=None, resumed=False):
+        """Whether epoch seconds sent are in the window, with since as given by since_for()"""
+        if sent is None:
+            return not resumed
+        since = self.since if since is None else since
+        if since is not None and sent < since:
+            return False
+        return self.until is None or sent < self.until
+
+    def describe(self):
+        bounds = []
+        if self.since is not None:
+            bounds.append(f"since {datetime.fromtimestamp(self.since, timezone.utc):%Y-%m-%d %H:%M} UTC")
+        if self.until is not None:
+            bounds.append(f"until {datetime.fromtimestamp(self.until, timezone.utc):%Y-%m-%d %H:%M} UTC")
+        if self.watermarks is not None:
+            bounds.append(f"past the watermarks in {self.watermarks.path}")
+        return ", ".join(bounds)
+
+class Watermarks:
+    """
+    Newest delivery time extracted per mailbox, persisted as JSON next to the
+    processor's output. advance() only ever moves a watermark forward and
+    save() writes atomically, like the ingestion manifest.
+    """
+
+    def __init__(self, path=WATERMARKS_FILE):
+        self.path = Path(path)
+        self.mailboxes = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.mailboxes = json.load(f).get("mailboxes", {})
+
+    def get(self, mailbox):
+        entry = self.mailboxes.get(file_key(mailbox))
+        return entry["latest"] if entry else None
+
+    def advance(self, mailbox, latest):
+        if latest is None:
+            return
+        key = file_key(mailbox)
+        entry = self.mailboxes.get(key)
+        if entry is None or latest > entry["latest"]:
+            self.mailboxes[key] = {
+                "latest": latest,
+                "latest_utc": datetime.fromtimestamp(latest, timezone.utc).isoformat(timespec="seconds"),
+                "updated_at": datetime.now().isoformat(timespec="seconds")
+            }
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"mailboxes": self.mailboxes}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
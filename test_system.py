@@ -67,8 +67,8 @@ def test_script_files():
     
     script_files = [
         "src/file_sorter.py",
-        "src/pst-processor/processor.py",
-        "src/msg-processor/processor.py", 
+        "src/pst-processor/pst.processor.py",
+        "src/msg-processor/msg.processor.py",
         "src/email_deduplicator.py",
         "src/contacts-extractor/contact_extractor.py",
         "src/contacts-extractor/csv_converter.py",
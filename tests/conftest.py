@@ -0,0 +1,35 @@
+"""
+Shared fixtures. The modules under test live in src/ and its tool folders,
+which the scripts themselves put on sys.path; the processors are loaded by
+path like the orchestrator does, and skipped where pypff or extract_msg is
+not installed.
+"""
+
+import os
+import sys
+
+import pytest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+src_dir = os.path.join(repo_dir, 'src')
+for path in (src_dir, os.path.join(src_dir, 'contacts-extractor'), os.path.join(src_dir, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.append(path)
+
+@pytest.fixture(scope="session")
+def pst_processor():
+    pytest.importorskip("pypff")
+    from pipeline import load_processor
+    return load_processor('pst-processor', 'pst.processor.py', "pst_processor")
+
+@pytest.fixture(scope="session")
+def msg_processor():
+    pytest.importorskip("extract_msg")
+    from pipeline import load_processor
+    return load_processor('msg-processor', 'msg.processor.py', "msg_processor")
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, as the steps read and write paths relative to it"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import asyncio
+
+from prompt import BATCH_PROMPT
+from ollama_client import OllamaError
+from signature_extractor import estimate_tokens
+from contact_extractor import (
+    OUTPUT_TOKENS_PER_CONTACT, build_object_to_analyze, extract_batch, latest_input_file,
+    pack_batches, parse_batch_json
+)
+
+def write_emails(path, mtime):
+    path.write_text(json.dumps([]), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+    return path
+
+def test_latest_input_file_prefers_current_signatures(tmp_path):
+    write_emails(tmp_path / "deduplicated_emails_20240101_000000.json", 1000)
+    signatures = write_emails(tmp_path / "signature_emails_20240101_000001.json", 1001)
+    assert latest_input_file(tmp_path) == signatures
+
+def test_latest_input_file_ignores_stale_signatures(tmp_path):
+    write_emails(tmp_path / "signature_emails_20240101_000001.json", 1001)
+    deduplicated = write_emails(tmp_path / "deduplicated_emails_20240201_000000.json", 2000)
+    assert latest_input_file(tmp_path) == deduplicated
+
+def test_latest_input_file_without_input(tmp_path):
+    assert latest_input_file(tmp_path) is None
+
+def sender(name, body="Bonjour"):
+    return {"senderEmail": f"{name}@acme.fr", "senderName": name.capitalize(), "subject": "Devis", "body": body}
+
+def email_cost(email):
+    return estimate_tokens(build_object_to_analyze(email)) + OUTPUT_TOKENS_PER_CONTACT
+
+def test_parse_batch_json_array():
+    answer = json.dumps([
+        {"senderEmail": "Jean@ACME.fr", "company": "ACME"},
+        {"contact_info": {"primary_email": "marie@acme.fr"}, "company": "ACME"},
+        {"company": "no sender"},
+        "not an object"
+    ])
+    assert parse_batch_json(answer) == {
+        "jean@acme.fr": {"company": "ACME"},
+        "marie@acme.fr": {"contact_info": {"primary_email": "marie@acme.fr"}, "company": "ACME"}
+    }
+
+def test_parse_batch_json_object_keyed_by_email():
+    answer = json.dumps({"jean@acme.fr": {"company": "ACME"}, "marie@acme.fr": "unusable"})
+    assert parse_batch_json(answer) == {"jean@acme.fr": {"company": "ACME"}}
+
+def test_parse_batch_json_contacts_wrapper():
+    answer = json.dumps({"contacts": [{"senderEmail": "jean@acme.fr", "company": "ACME"}]})
+    assert parse_batch_json(answer) == {"jean@acme.fr": {"company": "ACME"}}
+
+def test_parse_batch_json_text_around_answer():
+    array = 'Voici le résultat :\n[{"senderEmail": "jean@acme.fr", "company": "ACME"}]\nBonne journée'
+    assert parse_batch_json(array) == {"jean@acme.fr": {"company": "ACME"}}
+    wrapped = 'Sure! {"contacts": [{"senderEmail": "jean@acme.fr"}]} Hope this helps'
+    assert parse_batch_json(wrapped) == {"jean@acme.fr": {}}
+    # The first sender wins when the model repeats one
+    repeated = '[{"senderEmail": "jean@acme.fr", "company": "A"}, {"senderEmail": "JEAN@acme.fr", "company": "B"}]'
+    assert parse_batch_json(repeated) == {"jean@acme.fr": {"company": "A"}}
+    assert parse_batch_json("no JSON here") == {}
+    assert parse_batch_json(None) == {}
+
+def test_pack_batches_respects_batch_size():
+    emails = list(enumerate(sender(f"s{number}") for number in range(5)))
+    batches = list(pack_batches(emails, batch_size=2, num_ctx=100000))
+    assert [[index for index, _ in batch] for batch in batches] == [[0, 1], [2, 3], [4]]
+
+def test_pack_batches_respects_num_ctx():
+    emails = list(enumerate(sender(f"s{number}", "x" * 400) for number in range(5)))
+    num_ctx = estimate_tokens(BATCH_PROMPT) + 2 * email_cost(emails[0][1]) + 1
+    batches = list(pack_batches(emails, batch_size=8, num_ctx=num_ctx))
+    assert [[index for index, _ in batch] for batch in batches] == [[0, 1], [2, 3], [4]]
+
+    # An email larger than the budget gets a batch of its own
+    emails.insert(1, (9, sender("huge", "x" * 40000)))
+    batches = list(pack_batches(emails, batch_size=8, num_ctx=num_ctx))
+    assert [[index for index, _ in batch] for batch in batches] == [[0], [9], [1, 2], [3, 4]]
+
+def test_pack_batches_splits_duplicate_senders():
+    emails = list(enumerate([sender("jean"), sender("marie"), dict(sender("jean"), senderEmail="JEAN@acme.fr")]))
+    batches = list(pack_batches(emails, batch_size=8, num_ctx=100000))
+    assert [[index for index, _ in batch] for batch in batches] == [[0, 1], [2]]
+
+class FakeClient:
+    """Answers batched prompts with batch_answer and single prompts with a company per sender"""
+    model = "fake"
+    num_predict = 100
+
+    def __init__(self, batch_answer=None, batch_error=None):
+        self.batch_answer = batch_answer
+        self.batch_error = batch_error
+        self.prompts = []
+
+    async def generate(self, prompt, json_format=True, **kwargs):
+        self.prompts.append((prompt, kwargs))
+        if not json_format:
+            if self.batch_error:
+                raise self.batch_error
+            return {"response": self.batch_answer}
+        # The instructions carry an example sender; the email comes last
+        address = re.findall(r'"senderEmail": "([^"]+)"', prompt)[-1]
+        return {"response": json.dumps({"company": f"single {address}"})}
+
+def test_extract_batch_retries_missing_senders():
+    batch = [(0, sender("jean")), (1, sender("marie")), (2, sender("paul"))]
+    answer = json.dumps([{"senderEmail": "JEAN@acme.fr", "company": "ACME"},
+                         {"senderEmail": "paul@acme.fr", "company": "ACME"}])
+    client = FakeClient(answer)
+    contacts = asyncio.run(extract_batch(client, batch, num_ctx=8192))
+
+    assert {index: contact["company"] for index, contact in contacts.items()} == {
+        0: "ACME", 1: "single marie@acme.fr", 2: "ACME"
+    }
+    assert len(client.prompts) == 2
+    assert client.prompts[0][1] == {"num_predict": 300, "options": {"num_ctx": 8192}}
+
+def test_extract_batch_retries_all_senders_after_failure():
+    batch = [(0, sender("jean")), (1, sender("marie"))]
+    client = FakeClient(batch_error=OllamaError("connection refused"))
+    contacts = asyncio.run(extract_batch(client, batch, num_ctx=8192))
+    assert {index: contact["company"] for index, contact in contacts.items()} == {
+        0: "single jean@acme.fr", 1: "single marie@acme.fr"
+    }
+    assert len(client.prompts) == 3
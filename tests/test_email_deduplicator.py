@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from email_record import EmailRecord
+from ingestion_manifest import IngestionManifest, MANIFEST_FILE
+from jsonl_stream import JsonlShardWriter
+from email_deduplicator import StreamingDeduplicator, iter_json_files, process_deduplication
+from synthetic_mailbox import generate_records
+
+# Legacy output, written before sentTimestamp existed
+EMAILS = [
+    {"subject": "a1", "senderEmail": "a@x.fr", "sentAt": "01/01/2024 - 10h00"},
+    {"subject": "b1", "senderEmail": "b@x.fr", "sentAt": None},
+    {"subject": "a2", "senderEmail": "A@x.fr ", "sentAt": "05/01/2024 - 10h00"},
+    {"subject": "a0", "senderEmail": "a@x.fr", "sentAt": "02/01/2023 - 10h00"},
+    {"subject": "b2", "senderEmail": "b@x.fr", "sentAt": "03/01/2024 - 10h00"},
+    {"subject": "none", "senderEmail": "", "sentAt": "03/01/2024 - 10h00"},
+    {"subject": "c1", "senderEmail": "c@x.fr", "sentAt": "03/01/2024 - 10h00"},
+]
+
+def deduplicate(emails, **options):
+    deduplicator = StreamingDeduplicator(partitions=4, **options)
+    for email in emails:
+        deduplicator.add(email)
+    spilled = deduplicator.spilled
+    subjects = [email["subject"] for email in deduplicator.results()]
+    return subjects, deduplicator, spilled
+
+@pytest.mark.parametrize("max_senders", [0, 1])
+def test_keep_first(max_senders, tmp_path):
+    subjects, deduplicator, spilled = deduplicate(EMAILS, max_senders=max_senders, spill_dir=tmp_path)
+    assert subjects == ["a1", "b1", "c1"]
+    assert spilled == (max_senders == 1)
+    assert deduplicator.without_sender == 1
+    assert deduplicator.duplicates_removed == 3
+
+@pytest.mark.parametrize("max_senders", [0, 1])
+def test_keep_latest_falls_back_to_sent_at(max_senders, tmp_path):
+    subjects, _, _ = deduplicate(EMAILS, max_senders=max_senders, spill_dir=tmp_path, keep="latest")
+    # Senders keep the position of their first email
+    assert subjects == ["a2", "b2", "c1"]
+
+def test_keep_latest_uses_sent_timestamp():
+    first = EmailRecord(subject="first", sender_email="a@x.fr", sent="01/01/2024 - 10h00").to_dict()
+    # Same minute in sentAt, a few seconds later
+    later = dict(first, subject="later", sentTimestamp=first["sentTimestamp"] + 30)
+    assert deduplicate([first, later], keep="latest")[0] == ["later"]
+    assert deduplicate([later, first], keep="latest")[0] == ["later"]
+
+def test_spilled_partitions_match_in_memory_result(tmp_path):
+    emails = list(generate_records(300, duplicate_ratio=0.8, body_length=300))
+    in_memory, _, _ = deduplicate(emails, max_senders=0)
+    subjects, deduplicator, spilled = deduplicate(emails, max_senders=10, workers=2, spill_dir=tmp_path)
+    assert spilled
+    assert subjects == in_memory
+    assert deduplicator.unique_senders == 60
+    assert not list(tmp_path.iterdir())
+
+def write_shard(manifest, output_dir, source, subjects):
+    with JsonlShardWriter(output_dir, "pst_emails") as writer:
+        for subject in subjects:
+            writer.write({"subject": subject, "senderEmail": f"{subject[0]}@x.fr"})
+    manifest.record(source, writer.ranges_since(0), writer.count)
+    manifest.save()
+
+def incremental_output(processor_dir):
+    """
+    Output of incremental runs where a.pst was re-processed twice after
+    sharing a shard with b.pst, next to a file the manifest does not track
+    """
+    output_dir = processor_dir / "output"
+    sources = [processor_dir / "a.pst", processor_dir / "b.pst"]
+    processor_dir.mkdir(parents=True, exist_ok=True)
+    for source in sources:
+        source.write_text(source.name)
+    manifest = IngestionManifest(processor_dir / MANIFEST_FILE)
+    with JsonlShardWriter(output_dir, "pst_emails") as writer:
+        for subject in ("a1", "b1", "b2"):
+            writer.write({"subject": subject, "senderEmail": f"{subject[0]}@x.fr"})
+    [shared] = writer.ranges_since(0)
+    manifest.record(sources[0], [dict(shared, end=1)], 1)
+    manifest.record(sources[1], [dict(shared, start=1)], 2)
+    for subjects in (["a2"], ["a3", "c1"]):
+        sources[0].write_text(sources[0].read_text() + "+")
+        write_shard(manifest, output_dir, sources[0], subjects)
+    (output_dir / "legacy.json").write_text(json.dumps([{"subject": "d1", "senderEmail": "d@x.fr"}]))
+    return output_dir, IngestionManifest(processor_dir / MANIFEST_FILE)
+
+def test_iter_json_files_follows_manifest(tmp_path):
+    output_dir, manifest = incremental_output(tmp_path)
+    assert len(manifest.retired) == 1
+    every = [email["subject"] for email in iter_json_files(output_dir)]
+    assert sorted(every) == ["a1", "a2", "a3", "b1", "b2", "c1", "d1"]
+    current = [email["subject"] for email in iter_json_files(output_dir, manifest)]
+    assert sorted(current) == ["a3", "b1", "b2", "c1", "d1"]
+
+def test_process_deduplication_reads_live_records(tmp_path, monkeypatch):
+    incremental_output(tmp_path / "src" / "pst-processor")
+    monkeypatch.chdir(tmp_path)
+    assert process_deduplication() == 4
+
+    [output_file] = (tmp_path / "src" / "contacts-extractor").glob("deduplicated_emails_*.json")
+    subjects = sorted(email["subject"] for email in json.loads(output_file.read_text()))
+    assert subjects == ["a3", "b1", "c1", "d1"]
@@ -0,0 +1,124 @@
+import json
+import pickle
+import calendar
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from email_record import COMPRESS_BODY_CHARS, FIELDS, EmailRecord, json_default
+
+PARIS = timezone(timedelta(hours=2))
+BODY = "Bonjour,\n\nVeuillez trouver ci-joint le devis. " * 20
+
+def format_date(date_obj):
+    """The processors' sentAt formatting before EmailRecord"""
+    if date_obj is None:
+        return None
+    try:
+        if hasattr(date_obj, 'strftime'):
+            return date_obj.strftime("%d/%m/%Y - %Hh%M")
+        else:
+            return str(date_obj)
+    except:
+        return str(date_obj)
+
+def old_email_dict(subject, message_id, sender_name, sender_email, body, sent):
+    return {
+        "subject": subject or "",
+        "messageId": message_id or "",
+        "senderName": sender_name or "",
+        "senderEmail": sender_email,
+        "body": body or "",
+        "sentAt": format_date(sent)
+    }
+
+def test_mapping_contract():
+    record = EmailRecord("Devis", "<1@x.fr>", "Élodie Huet", "ehuet@x.fr", "Bonjour", datetime(2024, 3, 1, 9, 30))
+    assert list(record) == list(FIELDS) and len(record) == len(FIELDS)
+    assert record["senderName"] == "Élodie Huet"
+    assert record.get("sentAt") == "01/03/2024 - 09h30"
+    assert record.get("bodyLocator") is None and "bodyLocator" not in record
+    with pytest.raises(KeyError):
+        record["bodyLocator"]
+
+    record["bodyLocator"] = [3, 17]
+    record["senderEmail"] = "elodie.huet@x.fr"
+    record["body"] = None
+    assert record.sender_email == "elodie.huet@x.fr" and record["body"] == ""
+    assert list(record) == list(FIELDS) + ["bodyLocator"] and len(record) == len(FIELDS) + 1
+    assert dict(record.items())["bodyLocator"] == [3, 17]
+
+    del record["bodyLocator"]
+    assert list(record) == list(FIELDS)
+    with pytest.raises(KeyError):
+        del record["bodyLocator"]
+    with pytest.raises(KeyError):
+        del record["subject"]
+    assert not hasattr(record, "__dict__")
+
+def test_sender_is_interned():
+    first = EmailRecord(sender_email="".join(["ehuet", "@x.fr"]))
+    second = EmailRecord.from_dict({"senderEmail": "".join(["ehuet@", "x.fr"])})
+    assert first.sender_email is second.sender_email
+    restored = pickle.loads(pickle.dumps(first))
+    assert restored.sender_email is first.sender_email
+
+def test_compressed_body_round_trip():
+    record = EmailRecord(subject="Devis", sender_email="a@x.fr", body=BODY)
+    assert record.compact() is record
+    assert isinstance(record._body, bytes) and len(record._body) < len(BODY)
+    assert record.body == record["body"] == BODY
+    assert json.loads(json.dumps(record, default=json_default))["body"] == BODY
+    assert pickle.loads(pickle.dumps(record)).body == BODY
+
+    record.body = "Merci"
+    assert record._body == "Merci"
+    short = EmailRecord(body="x" * (COMPRESS_BODY_CHARS - 1)).compact()
+    assert isinstance(short._body, str)
+
+@pytest.mark.parametrize("sent, timestamp, sent_at", [
+    (datetime(2024, 3, 1, 9, 30, 45), calendar.timegm((2024, 3, 1, 9, 30, 45)), "01/03/2024 - 09h30"),
+    (datetime(2024, 3, 1, 9, 30, tzinfo=PARIS), calendar.timegm((2024, 3, 1, 7, 30, 0)), "01/03/2024 - 09h30"),
+    ("01/03/2024 - 09h30", calendar.timegm((2024, 3, 1, 9, 30, 0)), "01/03/2024 - 09h30"),
+    ("mardi dernier", None, "mardi dernier"),
+    (None, None, None),
+])
+def test_epoch_and_sent_at_agree(sent, timestamp, sent_at):
+    record = EmailRecord(sent=sent)
+    assert record.sent == record["sentTimestamp"] == timestamp
+    assert record["sentAt"] == sent_at
+
+    # Reading the JSON back keeps both, the sender's offset included
+    reread = EmailRecord.from_dict(json.loads(json.dumps(record, default=json_default)))
+    assert (reread["sentTimestamp"], reread["sentAt"]) == (timestamp, sent_at)
+
+def test_sent_at_follows_timestamp_updates():
+    record = EmailRecord(sent=datetime(2024, 3, 1, 9, 30, tzinfo=PARIS))
+    record["sentTimestamp"] += 3600
+    assert record["sentAt"] == "01/03/2024 - 10h30"
+    record["sentAt"] = "02/03/2024 - 08h00"
+    assert record["sentTimestamp"] == calendar.timegm((2024, 3, 2, 8, 0, 0))
+
+@pytest.mark.parametrize("fields", [
+    ("Devis n°42", "<42@x.fr>", "Élodie Huet", "ehuet@x.fr", BODY, datetime(2024, 3, 1, 9, 30, 12)),
+    ("Re: ", "<1@x.fr>", "", "a@x.fr", "« Merci » 😀\r\n", datetime(2023, 12, 31, 23, 59, tzinfo=PARIS)),
+    (None, None, None, "a@x.fr", None, None),
+    ("", "", "A", "a@x.fr", "", "mardi dernier"),
+])
+def test_json_matches_old_dict_output(fields):
+    record = EmailRecord(*fields)
+    compacted = EmailRecord(*fields).compact()
+    # sentTimestamp is the only addition, after the fields the dicts had
+    expected = dict(old_email_dict(*fields), sentTimestamp=record.sent)
+    for options in ({"indent": 2, "ensure_ascii": False}, {"ensure_ascii": False}, {}):
+        old_output = json.dumps(expected, **options)
+        assert json.dumps(record, default=json_default, **options) == old_output
+        assert json.dumps([compacted], default=json_default, **options) == json.dumps([expected], **options)
+
+    extra = {"bodyLocator": [1, 2]}
+    located = EmailRecord(*fields, extra=extra)
+    assert json.dumps(located, default=json_default) == json.dumps(dict(expected, **extra))
+
+def test_json_default_rejects_other_objects():
+    with pytest.raises(TypeError):
+        json.dumps({"when": datetime(2024, 1, 1)}, default=json_default)
@@ -0,0 +1,48 @@
+from email_record import EmailRecord
+from email_store import EmailStore, DEFAULT_STORE_PATH, file_key
+
+EMAILS = [
+    ("pst", {"subject": "a-old", "senderEmail": "a@x.fr", "sentAt": "01/01/2024 - 10h00"}),
+    ("pst", {"subject": "a-new", "senderEmail": "A@x.fr", "sentAt": "05/01/2024 - 10h00"}),
+    ("pst", {"subject": "b-undated", "senderEmail": "b@x.fr", "sentAt": None}),
+    ("msg", {"subject": "b-msg", "senderEmail": "b@x.fr", "sentAt": "03/01/2024 - 10h00"}),
+    ("pst", {"subject": "none", "senderEmail": "", "sentAt": None}),
+]
+
+def fill(store):
+    for source, email in EMAILS:
+        with store.writer(source) as writer:
+            writer.write(email, source_file=f"{source}.file")
+
+def winners(store):
+    return {sender: email["subject"] for sender, email in store.iter_senders()}
+
+def test_default_path_does_not_depend_on_working_directory(workdir):
+    assert DEFAULT_STORE_PATH.is_absolute()
+    assert DEFAULT_STORE_PATH.name == "email_store.db"
+
+def test_deduplicate_keeps_first_msg_before_pst(tmp_path):
+    with EmailStore(tmp_path / "store.db") as store:
+        fill(store)
+        assert store.deduplicate() == (4, 2)
+        assert winners(store) == {"a@x.fr": "a-old", "b@x.fr": "b-msg"}
+
+def test_deduplicate_keeps_latest_from_sent_at(tmp_path):
+    with EmailStore(tmp_path / "store.db") as store:
+        fill(store)
+        store.deduplicate(keep="latest")
+        assert winners(store) == {"a@x.fr": "a-new", "b@x.fr": "b-msg"}
+
+def test_rows_keep_their_file_when_files_interleave(tmp_path):
+    first, second = tmp_path / "first.pst", tmp_path / "second.pst"
+    with EmailStore(tmp_path / "store.db") as store:
+        with store.writer("pst") as writer:
+            for i, source_file in enumerate([first, second, first]):
+                record = EmailRecord(subject=str(i), sender_email=f"{i}@x.fr")
+                record.source_file = str(source_file)
+                writer.write(record)
+            writer.file_done(second)
+        rows = store.db.execute("SELECT source_file, COUNT(*) FROM messages GROUP BY source_file").fetchall()
+        assert dict(rows) == {file_key(first): 2, file_key(second): 1}
+        assert store.forget_files("pst", [second]) == 1
+        assert store.count("messages") == 2
@@ -0,0 +1,52 @@
+import time
+
+from extraction_cache import ExtractionCache, cache_key
+
+EMAIL = {"senderEmail": "Jean.Dupont@X.fr", "senderName": "Jean  Dupont", "body": "Bonjour,\n  Jean"}
+CONTACT = {"company": "X"}
+
+def test_cache_key_normalizes_input():
+    same = {"senderEmail": "jean.dupont@x.fr", "senderName": "Jean Dupont", "body": "Bonjour, Jean"}
+    assert cache_key(EMAIL, "qwen", "v1") == cache_key(same, "qwen", "v1")
+    assert cache_key(EMAIL, "qwen", "v1") != cache_key(EMAIL, "qwen", "v2")
+    assert cache_key(EMAIL, "qwen", "v1") != cache_key(EMAIL, "mistral", "v1")
+
+def test_hit_and_miss(tmp_path):
+    key = cache_key(EMAIL, "qwen", "v1")
+    with ExtractionCache(tmp_path / "cache.db") as cache:
+        assert cache.get(key) is None
+        cache.put(key, CONTACT, "qwen", "v1")
+    with ExtractionCache(tmp_path / "cache.db") as cache:
+        assert cache.get("other", key) == CONTACT
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 0
+
+def test_refresh_and_off_modes(tmp_path):
+    key = cache_key(EMAIL, "qwen", "v1")
+    with ExtractionCache(tmp_path / "cache.db") as cache:
+        cache.put(key, {"company": "old"}, "qwen", "v1")
+    with ExtractionCache(tmp_path / "cache.db", mode="refresh") as cache:
+        assert cache.get(key) is None and cache.misses == 1
+        cache.put(key, CONTACT, "qwen", "v1")
+    with ExtractionCache(tmp_path / "off.db", mode="off") as cache:
+        cache.put(key, CONTACT, "qwen", "v1")
+        assert cache.get(key) is None and cache.stats()["misses"] == 0
+    assert not (tmp_path / "off.db").exists()
+    with ExtractionCache(tmp_path / "cache.db") as cache:
+        assert cache.get(key) == CONTACT
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    with ExtractionCache(tmp_path / "cache.db", max_entries=2) as cache:
+        for key in ("a", "b", "c"):
+            cache.put(key, CONTACT, "qwen", "v1")
+            time.sleep(0.01)
+        cache.get("a")
+        assert cache.prune() == 1
+        assert cache.get("b") is None and cache.get("a") == CONTACT
+
+def test_expired_entries_are_ignored_and_pruned(tmp_path):
+    with ExtractionCache(tmp_path / "cache.db") as cache:
+        cache.put("a", CONTACT, "qwen", "v1")
+    time.sleep(0.01)
+    with ExtractionCache(tmp_path / "cache.db", max_age_days=0.01 / 86400) as cache:
+        assert cache.get("a") is None
+        assert cache.prune() == 1
@@ -0,0 +1,119 @@
+import os
+
+import ingestion_manifest
+from ingestion_manifest import IngestionManifest, iter_ranges
+from jsonl_stream import JsonlShardWriter, iter_jsonl, list_email_files
+
+def process(manifest, output_dir, source, subjects):
+    """Write one email per subject for source and record it like an incremental run"""
+    with JsonlShardWriter(output_dir, "pst_emails") as writer:
+        for subject in subjects:
+            writer.write({"subject": subject, "senderEmail": f"{subject[0]}@x.fr"})
+    manifest.record(source, writer.ranges_since(0), writer.count)
+    manifest.save()
+    return writer.paths
+
+def shard_subjects(output_dir):
+    return [record["subject"] for path in list_email_files(output_dir) for record in iter_jsonl(path)]
+
+def touch(path, seconds):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+def test_change_detection(tmp_path, monkeypatch):
+    source = tmp_path / "a.pst"
+    source.write_bytes(b"aaaa")
+    manifest = IngestionManifest(tmp_path / "manifest.json")
+    assert manifest.pending([source]) == [source]
+    manifest.record(source, [], 0)
+    manifest.save()
+
+    hashed = []
+    file_sha256 = ingestion_manifest.file_sha256
+    monkeypatch.setattr(ingestion_manifest, "file_sha256", lambda path: hashed.append(path) or file_sha256(path))
+    manifest = IngestionManifest(tmp_path / "manifest.json")
+    # Same size and mtime: not even hashed
+    assert manifest.pending([source]) == [] and hashed == []
+
+    # Touched but unchanged: hashed once, then known by its new mtime
+    touch(source, 10)
+    assert not manifest.needs_processing(source) and hashed == [source]
+    assert manifest.inputs[str(source)]["mtime_ns"] == os.stat(source).st_mtime_ns
+    assert not manifest.needs_processing(source) and len(hashed) == 1
+
+    # Same size, other content
+    mtime_ns = os.stat(source).st_mtime_ns
+    source.write_bytes(b"bbbb")
+    os.utime(source, ns=(mtime_ns, mtime_ns))
+    assert not manifest.needs_processing(source)
+    touch(source, 10)
+    assert manifest.needs_processing(source)
+
+    source.write_bytes(b"aaaaa")
+    assert manifest.needs_processing(source)
+
+def test_copies_are_recorded_as_duplicates(tmp_path):
+    source = tmp_path / "a.pst"
+    copy = tmp_path / "copy.pst"
+    source.write_bytes(b"aaaa")
+    copy.write_bytes(b"aaaa")
+    manifest = IngestionManifest(tmp_path / "manifest.json")
+    manifest.record(source, [], 0)
+
+    assert manifest.pending([source, copy]) == []
+    assert manifest.inputs[str(copy)]["duplicate_of"] == str(source)
+
+def test_gc_deletes_retired_shards(tmp_path):
+    output_dir = tmp_path / "output"
+    source = tmp_path / "a.pst"
+    other = tmp_path / "b.pst"
+    source.write_bytes(b"a")
+    other.write_bytes(b"b")
+    manifest = IngestionManifest(tmp_path / "manifest.json")
+    old = process(manifest, output_dir, source, ["a1", "a2"])
+    kept = process(manifest, output_dir, other, ["b1"])
+
+    # Re-processing a.pst retires its old shard
+    source.write_bytes(b"aa")
+    new = process(manifest, output_dir, source, ["a3"])
+    assert manifest.retired == [old[0].name]
+
+    manifest = IngestionManifest(tmp_path / "manifest.json")
+    assert manifest.gc(output_dir) == 1
+    assert not old[0].exists() and kept[0].exists() and new[0].exists()
+    assert IngestionManifest(tmp_path / "manifest.json").retired == []
+    assert shard_subjects(output_dir) == ["b1", "a3"]
+
+def test_compact_keeps_only_live_records(tmp_path):
+    output_dir = tmp_path / "output"
+    source = tmp_path / "a.pst"
+    other = tmp_path / "b.pst"
+    source.write_bytes(b"a")
+    other.write_bytes(b"b")
+    manifest = IngestionManifest(tmp_path / "manifest.json")
+
+    # a.pst and b.pst share a shard; re-processing a.pst leaves it half stale
+    with JsonlShardWriter(output_dir, "pst_emails") as writer:
+        for subject in ("a1", "a2", "b1"):
+            writer.write({"subject": subject})
+    [shared] = writer.ranges_since(0)
+    manifest.record(source, [dict(shared, end=2)], 2)
+    manifest.record(other, [dict(shared, start=2)], 1)
+    source.write_bytes(b"aa")
+    process(manifest, output_dir, source, ["a3", "a4"])
+    old_files = {path.name for path in list_email_files(output_dir)}
+
+    assert manifest.compact(output_dir, "pst_emails") == 3
+    [compacted] = list_email_files(output_dir)
+    assert compacted.name not in old_files
+    # Shards are compacted in name order
+    assert shard_subjects(output_dir) == ["b1", "a3", "a4"]
+
+    manifest = IngestionManifest(tmp_path / "manifest.json")
+    assert manifest.retired == []
+    assert manifest.inputs[str(other)]["outputs"] == [{"file": compacted.name, "start": 0, "end": 1}]
+    assert manifest.inputs[str(source)]["outputs"] == [{"file": compacted.name, "start": 1, "end": 3}]
+
+def test_iter_ranges():
+    assert list(iter_ranges(range(10), [(1, 3), (5, 6), (8, 20)])) == [1, 2, 5, 8, 9]
+    assert list(iter_ranges(range(10), [])) == []
@@ -0,0 +1,116 @@
+import os
+import functools
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from email_record import EmailRecord
+from message_index import MessageIndex, DuplicateMessage, message_key
+from synthetic_mailbox import generate_records, SyntheticMsg, SyntheticPstMessage
+
+def records(count, seed=0, source="msg"):
+    return list(generate_records(count, duplicate_ratio=0, body_length=200, seed=seed, source=source))
+
+def test_message_key_normalizes_message_id():
+    first = {"messageId": " <ABC@Example.org>", "senderEmail": "a@x.fr"}
+    second = {"messageId": "abc@example.org", "senderEmail": "b@x.fr"}
+    assert message_key(first) == message_key(second)
+
+def test_fingerprint_covers_body():
+    record = dict(records(1)[0], messageId="")
+    assert message_key(record) != message_key(dict(record, body="autre texte"))
+    assert message_key(record) == message_key(dict(record, body="  " + record["body"] + "\n"))
+
+def test_claim_and_shared_duplicate_count(tmp_path):
+    record = records(1)[0]
+    with MessageIndex(tmp_path / "index.db") as index:
+        assert index.claim(record)
+        assert not index.claim(dict(record))
+        with pytest.raises(DuplicateMessage):
+            index.check(record)
+        assert index.total_duplicates() == 2
+
+def test_deferred_claims_only_check(tmp_path):
+    first, second = records(2)
+    with MessageIndex(tmp_path / "index.db") as index:
+        index.claim(first)
+        index.defer_claims()
+        assert not index.claim(first)
+        assert index.claim(second)
+        assert index.claim(second)
+
+def test_msg_chunk_retried_after_worker_crash(tmp_path, monkeypatch, msg_processor):
+    emails = records(10)
+    by_name = {f"m{i:02d}.msg": record for i, record in enumerate(emails)}
+    by_name["m10_copy.msg"] = emails[0]
+    paths = []
+    for name in sorted(by_name):
+        (tmp_path / name).touch()
+        paths.append(tmp_path / name)
+
+    class Message(SyntheticMsg):
+        def __init__(self, path):
+            name = Path(path).name
+            if name == "m05.msg":
+                os._exit(1)
+            super().__init__(by_name[name])
+
+    monkeypatch.setattr(msg_processor, "extract_msg", SimpleNamespace(Message=Message))
+    with MessageIndex() as index:
+        results = list(msg_processor.iter_msg_files_parallel(paths, workers=2, chunk_size=10, message_index=index))
+        duplicates = index.total_duplicates()
+
+    statuses = {Path(msg_path).name: status for msg_path, _, status, _ in results}
+    assert len(results) == len(paths)
+    assert statuses["m05.msg"].startswith("error")
+    # Files parsed before the crash are kept on retry, only the copy is a duplicate
+    assert [status for name, status in statuses.items() if name != "m05.msg"].count("ok") == 9
+    assert [statuses["m00.msg"], statuses["m10_copy.msg"]].count("duplicate") == 1
+    assert duplicates == 1
+
+def _emit_task(emails, crash, on_email, message_index):
+    for record in emails:
+        email_data = EmailRecord.from_dict(record)
+        try:
+            message_index.check(email_data)
+        except DuplicateMessage:
+            continue
+        on_email(email_data)
+    if crash:
+        os._exit(1)
+
+def test_discarded_pst_task_leaves_no_claims(pst_processor):
+    emails = records(5, source="pst")
+    kept = []
+    with MessageIndex() as index:
+        task = functools.partial(_emit_task, message_index=index)
+        tasks = [(task, (emails, True)), (task, (emails, False))]
+        pst_processor._run_parallel(tasks, ["crashing.pst", "copy.pst"], 1, kept.append, message_index=index)
+    # The copies in the second PST are not hidden by claims of the discarded task
+    assert [email["messageId"] for email in kept] == [record["messageId"] for record in emails]
+
+def test_header_only_message_is_fingerprinted_once_its_body_is_read(pst_processor):
+    record = dict(records(1, source="pst")[0], messageId="")
+    with MessageIndex() as index:
+        header_only = pst_processor.extract_message(SyntheticPstMessage(record), include_body=False,
+                                                    message_index=index)
+        assert header_only is not None and header_only["body"] == ""
+        # The header-only read claimed no fingerprint of the empty body
+        assert index.claim(dict(record, body=""))
+        # The full read claims the key the MSG side computes
+        email_data = pst_processor.extract_message(SyntheticPstMessage(record), message_index=index)
+        assert email_data["body"] == record["body"]
+        assert not index.claim(record)
+
+def test_fingerprint_matches_across_sources_and_time_zones(pst_processor, msg_processor):
+    record = dict(records(1, source="pst")[0], messageId="", sentAt="15/03/2024 - 08h30")
+    msg = SyntheticMsg(record)
+    # The .msg copy carries the sender's offset, the PST delivery time is naive UTC
+    msg.date = datetime(2024, 3, 15, 10, 30, tzinfo=timezone(timedelta(hours=2)))
+    with MessageIndex() as index:
+        email_data = pst_processor.extract_message(SyntheticPstMessage(record), message_index=index)
+        assert email_data["sentAt"] != msg_processor.extract_message(msg)["sentAt"]
+        with pytest.raises(DuplicateMessage):
+            msg_processor.extract_message(msg, message_index=index)
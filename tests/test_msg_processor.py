@@ -0,0 +1,22 @@
+import time
+from types import SimpleNamespace
+
+from synthetic_mailbox import generate_records, SyntheticMsg
+
+def test_timeout_is_not_swallowed_by_extract_msg(tmp_path, monkeypatch, msg_processor):
+    record = next(generate_records(1, source="msg"))
+
+    class HungMessage(SyntheticMsg):
+        def __init__(self, path):
+            # extract_msg catches Exception broadly while parsing
+            try:
+                time.sleep(5)
+            except Exception:
+                pass
+            super().__init__(record)
+
+    monkeypatch.setattr(msg_processor, "extract_msg", SimpleNamespace(Message=HungMessage))
+    started = time.monotonic()
+    email_data, status, _ = msg_processor.parse_msg_file(tmp_path / "hung.msg", file_timeout=0.2)
+    assert (email_data, status) == (None, "timeout")
+    assert time.monotonic() - started < 2
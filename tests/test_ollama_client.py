@@ -0,0 +1,52 @@
+import json
+import asyncio
+
+from ollama_client import OllamaClient, OllamaError
+
+async def serve_stream(failures, responses):
+    """Server streaming an error message for the first `failures` generations, then a complete one"""
+    async def handle(reader, writer):
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(next(line.split(b":")[1] for line in head.split(b"\r\n")
+                              if line.lower().startswith(b"content-length")))
+            await reader.readexactly(length)
+            responses.append(None)
+            if len(responses) <= failures:
+                lines = [{"error": "model runner has unexpectedly stopped"}]
+            else:
+                lines = [{"response": "{}", "done": False}, {"response": "", "done": True}]
+            body = b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+            writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+                         + f"{len(body):x}\r\n".encode() + body + b"\r\n0\r\n\r\n")
+            await writer.drain()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+async def generate(failures, retries):
+    responses = []
+    server = await serve_stream(failures, responses)
+    port = server.sockets[0].getsockname()[1]
+    client = OllamaClient(f"http://127.0.0.1:{port}", stream=True, early_stop=False, retries=retries,
+                          backoff=0.01, adaptive=True, max_in_flight=4)
+    client.limiter.limit = 4.0
+    try:
+        return await client.generate("prompt"), client, len(responses)
+    except OllamaError as e:
+        return e, client, len(responses)
+    finally:
+        await client.close()
+        server.close()
+
+def test_stream_error_is_retried():
+    response, client, requests = asyncio.run(generate(failures=2, retries=3))
+    assert response["response"] == "{}"
+    assert requests == 3
+
+def test_stream_error_counts_as_failure():
+    error, client, requests = asyncio.run(generate(failures=5, retries=1))
+    assert isinstance(error, OllamaError) and "unexpectedly stopped" in str(error)
+    assert requests == 2
+    assert client.failures == 1
+    # Each failed attempt halved the concurrency limit
+    assert client.limiter.limit == 1
@@ -0,0 +1,115 @@
+from pathlib import Path
+
+from synthetic_mailbox import (generate_records, SyntheticEntry, SyntheticRecordSet, SyntheticPstMessage,
+                               SyntheticPstFolder, SyntheticPstFile)
+from time_window import TimeWindow, Watermarks
+
+DN = "/o=Org/ou=Exchange/cn=Recipients/cn=anne"
+
+class ExchangeMessage(SyntheticPstMessage):
+    """Internal mail naming its sender only by legacy DN, the last one also by SMTP address"""
+
+    def __init__(self, record, learn=False):
+        super().__init__(record)
+        self.learn = learn
+
+    def get_record_set(self, index):
+        entries = [SyntheticEntry(0x001A, "IPM.Note"), SyntheticEntry(0x0064, "EX"), SyntheticEntry(0x0065, DN),
+                   SyntheticEntry(0x1035, self.record["messageId"])]
+        if self.learn:
+            entries.append(SyntheticEntry(0x5D02, "anne@x.fr"))
+        return SyntheticRecordSet(entries)
+
+    def get_transport_headers(self):
+        return None
+
+def test_shards_share_the_sender_table_of_their_pst(tmp_path, monkeypatch, pst_processor):
+    records = list(generate_records(6, duplicate_ratio=0, source="pst"))
+    messages = [ExchangeMessage(record, learn=i == 5) for i, record in enumerate(records)]
+    root = SyntheticPstFolder("", folders=[SyntheticPstFolder("Inbox", messages)])
+    monkeypatch.setattr(pst_processor.pypff, "file", lambda: SyntheticPstFile(root))
+    scans = tmp_path / "scans"
+    scan = pst_processor.SenderResolver.scan
+
+    def counted_scan(resolver):
+        with open(scans, "a") as f:
+            f.write("scan\n")
+        scan(resolver)
+
+    monkeypatch.setattr(pst_processor.SenderResolver, "scan", counted_scan)
+    emails = pst_processor.process_pst_files_sharded([Path("a.pst")], workers=2, shard_size=2)
+    assert [email["senderEmail"] for email in emails] == ["anne@x.fr"] * 6
+    assert scans.read_text().count("scan") == 1
+
+class CalendarItem(SyntheticPstMessage):
+    def get_message_class(self):
+        return "IPM.Appointment"
+
+def test_skipped_items_do_not_advance_the_watermark(tmp_path, monkeypatch, pst_processor):
+    mail, meeting = generate_records(2, duplicate_ratio=0, source="pst")
+    mail["sentAt"], meeting["sentAt"] = "01/03/2024 - 10h00", "01/03/2024 - 12h00"
+    root = SyntheticPstFolder("", folders=[SyntheticPstFolder("Inbox", [SyntheticPstMessage(mail),
+                                                                         CalendarItem(meeting)])])
+    monkeypatch.setattr(pst_processor.pypff, "file", lambda: SyntheticPstFile(root))
+    item_filter = pst_processor.PstItemFilter(skip_message_classes=["IPM.Appointment*"],
+                                              window=TimeWindow(watermarks=Watermarks(tmp_path / "w.json")))
+    emails = list(pst_processor.iter_pst_file(Path("a.pst"), item_filter=item_filter))
+    assert [email["subject"] for email in emails] == [mail["subject"]]
+    assert item_filter.latest == {"a.pst": emails[0].sent}
+
+VCARD = b"BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Paul Martin\r\nEMAIL:paul.martin@batiplus.fr\r\nEND:VCARD\r\n"
+
+class IntegerEntry(SyntheticEntry):
+    def get_value_type(self):
+        return 0x0003
+
+    def get_data(self):
+        return self.value.to_bytes(4, "little")
+
+class Attachment:
+    def __init__(self, name, mime_type, data):
+        self.properties = SyntheticRecordSet([SyntheticEntry(0x3707, name), SyntheticEntry(0x370E, mime_type)])
+        self.data = data
+
+    def get_number_of_record_sets(self):
+        return 1
+
+    def get_record_set(self, index):
+        return self.properties
+
+    def get_size(self):
+        return len(self.data)
+
+    def read_buffer(self, size):
+        if self.data != VCARD:
+            raise AssertionError("read an attachment that is not a vCard")
+        return self.data
+
+class MessageWithAttachments(SyntheticPstMessage):
+    def __init__(self, record, flags, attachments=()):
+        super().__init__(record)
+        self.flags = flags
+        self.attachments = list(attachments)
+
+    def get_record_set(self, index):
+        record_set = super().get_record_set(index)
+        return SyntheticRecordSet(record_set.entries + [IntegerEntry(0x0E07, self.flags)])
+
+    def get_number_of_attachments(self):
+        if not self.flags & 0x10:
+            raise AssertionError("opened the attachments of a message flagged without any")
+        return len(self.attachments)
+
+    def get_attachment(self, index):
+        return self.attachments[index]
+
+def test_only_vcard_attachments_are_read(pst_processor):
+    record = next(generate_records(1, source="pst"))
+    with_card = MessageWithAttachments(record, 0x10, [
+        Attachment("devis.pdf", "application/pdf", b"%PDF"),
+        # Outlook may name a forwarded card after the contact, without an extension
+        Attachment("Paul Martin", "text/x-vcard; charset=utf-8", VCARD),
+    ])
+    records = pst_processor.extract_structured_contacts(with_card)
+    assert [contact["contact_info"]["primary_email"] for contact in records] == ["paul.martin@batiplus.fr"]
+    assert pst_processor.extract_structured_contacts(MessageWithAttachments(record, 0x01)) == []
@@ -0,0 +1,87 @@
+import pytest
+
+from rule_extractor import (
+    extract_address, extract_company, extract_phones, missing_fields, split_name
+)
+
+def test_extract_phones_mobile_and_landline():
+    signature = "Tél : 01 23 45 67 89\nMobile : 06.12.34.56.78"
+    assert extract_phones(signature) == ("+33 1 23 45 67 89", "+33 6 12 34 56 78")
+    # 06/07 numbers are mobiles whatever their label says
+    assert extract_phones("Tél. 0712345678") == (None, "+33 7 12 34 56 78")
+    # A landline prefix under a mobile label still counts as the mobile
+    assert extract_phones("Portable : 09 87 65 43 21") == (None, "+33 9 87 65 43 21")
+
+def test_extract_phones_skips_fax_lines():
+    assert extract_phones("Fax : 01 23 45 67 00") == (None, None)
+    assert extract_phones("Télécopie 01 23 45 67 00\nTél 01 23 45 67 89") == ("+33 1 23 45 67 89", None)
+    # On a shared line only the number after the fax label is skipped
+    assert extract_phones("Tél 01 23 45 67 89 - Fax 01 23 45 67 00") == ("+33 1 23 45 67 89", None)
+
+@pytest.mark.parametrize("number", [
+    "+33 1 23 45 67 89",
+    "+33123456789",
+    "0033 1 23 45 67 89",
+    "+33 (0)1 23 45 67 89",
+    "0033 (0) 1-23-45-67-89",
+    "01.23.45.67.89",
+])
+def test_extract_phones_international_forms(number):
+    assert extract_phones(f"Tél : {number}") == ("+33 1 23 45 67 89", None)
+
+def test_extract_phones_ignores_longer_digit_runs():
+    assert extract_phones("Réf. 012345678901") == (None, None)
+    assert extract_phones("+44 20 7946 0958") == (None, None)
+
+def test_extract_address_cedex():
+    address = extract_address("ACME SAS\n12 rue de la Paix\n75002 Paris Cedex 02\nFrance")
+    assert address == {
+        "street": "12 rue de la Paix",
+        "city": "Paris",
+        "postal_code": "75002",
+        "country": None,
+        "full_address": "12 rue de la Paix, 75002 Paris"
+    }
+    same_line = extract_address("3 bis, avenue Foch 69006 LYON CEDEX, France")
+    assert same_line["street"] == "3 bis, avenue Foch"
+    assert (same_line["postal_code"], same_line["city"], same_line["country"]) == ("69006", "LYON", "France")
+
+def test_extract_address_overseas_postcodes():
+    assert extract_address("97400 Saint-Denis")["postal_code"] == "97400"
+    assert extract_address("98800 Nouméa")["city"] == "Nouméa"
+    # 96xxx and 99xxx are not French postcodes
+    assert extract_address("96000 Nowhere") is None
+    assert extract_address("F-20000 Ajaccio")["postal_code"] == "20000"
+
+def test_extract_company_from_domain_and_legal_form():
+    signature = "Jean Dupont\nACME Industries SAS\nwww.acme.fr"
+    assert extract_company(signature, "jean.dupont@acme.fr") == "ACME Industries SAS"
+    assert extract_company("Acme\n", "jean@acme.fr") == "Acme"
+    # Without a matching line the domain label names the company
+    assert extract_company("Jean Dupont", "jean@bureau-veritas.com") == "BUREAU VERITAS"
+
+def test_extract_company_ignores_free_mail_domains():
+    assert extract_company("Jean Dupont", "jean.dupont@gmail.com") is None
+    assert extract_company("Jean Dupont", "jean.dupont@orange.fr") is None
+    # The signature URL stands in for a free mailbox
+    signature = "Jean Dupont\nDurand SARL\nhttps://www.durand.com"
+    assert extract_company(signature, "jean.dupont@wanadoo.fr") == "Durand SARL"
+
+def test_split_name():
+    assert split_name("HUET Elodie", "elodie.huet@acme.fr") == ("Elodie", "HUET")
+    assert split_name("Huet, Elodie", None) == ("Elodie", "Huet")
+    assert split_name("Elodie Huet", None) == ("Elodie", "Huet")
+    assert split_name("Jean-Pierre DE LA FONTAINE", None) == ("Jean-Pierre", "DE LA FONTAINE")
+    assert split_name("'Elodie'", None) == ("Elodie", None)
+    # Without a display name the mailbox supplies first.last
+    assert split_name("", "elodie.huet@acme.fr") == ("Elodie", "Huet")
+    assert split_name("elodie.huet@acme.fr", "elodie.huet@acme.fr") == ("Elodie", "Huet")
+    assert split_name(None, "contact@acme.fr") == (None, None)
+
+def test_missing_fields_phone_pseudo_field():
+    contact = {"full_name": "Elodie Huet", "company": "ACME", "landline_phone": None, "mobile_phone": None}
+    assert missing_fields(contact) == ["phone"]
+    assert missing_fields(dict(contact, mobile_phone="+33 6 12 34 56 78")) == []
+    assert missing_fields(dict(contact, landline_phone="+33 1 23 45 67 89")) == []
+    assert missing_fields({}) == ["full_name", "company", "phone"]
+    assert missing_fields(contact, required_fields=("full_name",)) == []
@@ -0,0 +1,39 @@
+import os
+import time
+import multiprocessing
+
+import pytest
+
+from run_metrics import RunMetrics
+
+pytestmark = pytest.mark.skipif(not os.access("/proc/self/clear_refs", os.W_OK),
+                                reason="per-stage peak RSS needs Linux /proc")
+
+MB = 1024 * 1024
+
+def _hold_memory(size, seconds):
+    block = bytearray(size)
+    time.sleep(seconds)
+    del block
+
+def test_peak_rss_is_per_stage():
+    metrics = RunMetrics()
+    with metrics.stage("heavy"):
+        block = bytearray(200 * MB)
+        del block
+    with metrics.stage("light"):
+        pass
+    stages = metrics.report()["stages"]
+    assert stages["heavy"]["peak_rss_mb"] >= stages["light"]["peak_rss_mb"] + 150
+
+def test_peak_child_rss_is_per_stage():
+    metrics = RunMetrics()
+    with metrics.stage("workers"):
+        process = multiprocessing.get_context("fork").Process(target=_hold_memory, args=(150 * MB, 0.5))
+        process.start()
+        process.join()
+    with metrics.stage("serial"):
+        pass
+    stages = metrics.report()["stages"]
+    assert stages["workers"]["peak_child_rss_mb"] >= 150
+    assert stages["serial"]["peak_child_rss_mb"] is None
@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import runpy
+
+import pytest
+
+import conftest
+from jsonl_stream import JsonlShardWriter
+from structured_contacts import contact_record, load_structured_contacts, prune_structured_contacts
+from synthetic_mailbox import generate_records, build_pst_tree, SyntheticMsg, SyntheticPstFile
+
+def harvest(directory, source, mtime, *records):
+    with JsonlShardWriter(directory, f"structured_contacts_{source}") as writer:
+        for record in records:
+            writer.write(record)
+    for path in writer.paths:
+        os.utime(path, (mtime, mtime))
+    return writer.paths
+
+def test_newest_run_wins_when_loading(tmp_path):
+    harvest(tmp_path, "pst", 1000, contact_record(["a@x.fr"], company="Old", city="Lyon"))
+    harvest(tmp_path, "msg", 2000, contact_record(["a@x.fr"], company="New"))
+    record = load_structured_contacts([tmp_path]).get("a@x.fr")
+    assert record["company"] == "New"
+    # Fields the newer run left empty are still filled from the older one
+    assert record["address"]["city"] == "Lyon"
+
+def test_prune_keeps_current_run_and_other_processor(tmp_path):
+    harvest(tmp_path, "pst", 1000, contact_record(["a@x.fr"]))
+    msg = harvest(tmp_path, "msg", 1500, contact_record(["c@x.fr"]))
+    current = harvest(tmp_path, "pst", 2000, contact_record(["b@x.fr"]))
+    assert prune_structured_contacts(tmp_path, "pst", current) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted(path.name for path in current + msg)
+    index = load_structured_contacts([tmp_path])
+    assert index.get("a@x.fr") is None and index.get("b@x.fr") and index.get("c@x.fr")
+
+def run_script(monkeypatch, folder, script, *args):
+    monkeypatch.setattr(sys, "argv", [script, *args])
+    runpy.run_path(os.path.join(conftest.src_dir, folder, script), run_name="__main__")
+
+def stale_contacts(workdir, source):
+    stale = workdir / "contacts" / f"structured_contacts_{source}_20200101_000000_0000.jsonl"
+    stale.parent.mkdir()
+    stale.write_text(json.dumps(contact_record(["old@x.fr"])) + "\n", encoding="utf-8")
+    return stale
+
+@pytest.mark.parametrize("args, pruned", [((), True), (("--since", "2000-01-01"), False)])
+def test_msg_cli_prunes_earlier_contacts(args, pruned, workdir, monkeypatch, msg_processor):
+    record = next(generate_records(1, source="msg"))
+    (workdir / "input").mkdir()
+    (workdir / "input" / "a.msg").touch()
+    stale = stale_contacts(workdir, "msg")
+    monkeypatch.setattr(sys.modules["extract_msg"], "Message", lambda path: SyntheticMsg(record))
+    run_script(monkeypatch, "msg-processor", "msg.processor.py", *args)
+    assert stale.exists() != pruned
+
+@pytest.mark.parametrize("files, pruned", [(["a.pst"], True), (["a.pst", "broken.pst"], False)])
+def test_pst_cli_prunes_earlier_contacts_unless_a_file_failed(files, pruned, workdir, monkeypatch, pst_processor):
+    records = list(generate_records(3, source="pst"))
+    (workdir / "input").mkdir()
+    for name in files:
+        (workdir / "input" / name).touch()
+    stale = stale_contacts(workdir, "pst")
+    monkeypatch.setattr(sys.modules["pypff"], "file", lambda: SyntheticPstFile(build_pst_tree(records), ["broken.pst"]))
+    run_script(monkeypatch, "pst-processor", "pst.processor.py")
+    assert stale.exists() != pruned
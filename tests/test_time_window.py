@@ -0,0 +1,56 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from time_window import TimeWindow, Watermarks, parse_time
+
+NOW = datetime(2024, 3, 31, 12, 0, tzinfo=timezone.utc)
+
+def epoch(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+def test_parse_time():
+    assert parse_time("2024-01-31") == epoch(2024, 1, 31)
+    assert parse_time("2024-01-31T10:00+02:00") == epoch(2024, 1, 31, 8)
+    assert parse_time("2w", now=NOW) == epoch(2024, 3, 17, 12)
+    # Months keep the day where they can, or end on the last one
+    assert parse_time("1m", now=NOW) == epoch(2024, 2, 29, 12)
+    assert parse_time("1y", now=NOW) == epoch(2023, 3, 31, 12)
+    with pytest.raises(ValueError):
+        parse_time("last week")
+
+def test_contains_bounds():
+    window = TimeWindow(since=epoch(2024, 1, 1), until=epoch(2024, 2, 1))
+    assert window.contains(epoch(2024, 1, 1))
+    assert not window.contains(epoch(2024, 2, 1))
+    assert not window.contains(epoch(2023, 12, 31))
+    assert window.contains(None)
+
+def test_watermark_resumes_mailbox(tmp_path):
+    mailbox = tmp_path / "a.pst"
+    watermarks = Watermarks(tmp_path / "watermarks.json")
+    watermarks.advance(mailbox, epoch(2024, 2, 1))
+    window = TimeWindow(since=epoch(2024, 1, 1), watermarks=watermarks)
+
+    since, resumed = window.since_for(mailbox)
+    assert (since, resumed) == (epoch(2024, 2, 1) + 1, True)
+    assert not window.contains(epoch(2024, 2, 1), since, resumed)
+    assert window.contains(epoch(2024, 2, 2), since, resumed)
+    # Undated messages were already kept by the earlier run
+    assert not window.contains(None, since, resumed)
+    assert not window.resumes(tmp_path / "new.pst")
+
+    # A since past the watermark reads the mailbox again from since
+    assert TimeWindow(since=epoch(2024, 3, 1), watermarks=watermarks).since_for(mailbox) == (epoch(2024, 3, 1), False)
+
+def test_watermarks_only_advance_and_reload(tmp_path):
+    path = tmp_path / "watermarks.json"
+    watermarks = Watermarks(path)
+    watermarks.advance(tmp_path / "a.pst", epoch(2024, 2, 1))
+    watermarks.advance(tmp_path / "a.pst", epoch(2024, 1, 1))
+    watermarks.advance(tmp_path / "a.pst", None)
+    watermarks.save()
+    assert not path.with_suffix(".tmp").exists()
+    assert json.loads(path.read_text())["mailboxes"][str((tmp_path / "a.pst").resolve())]["latest"] == epoch(2024, 2, 1)
+    assert Watermarks(path).get(tmp_path / "a.pst") == epoch(2024, 2, 1)